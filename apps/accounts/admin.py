@@ -1,10 +1,14 @@
 from django.contrib import admin
 
+from apps.services.admin import ScalableAdminMixin
 from .models import Profile
 
 
 @admin.register(Profile)
-class ProfileAdmin(admin.ModelAdmin):
+class ProfileAdmin(ScalableAdminMixin, admin.ModelAdmin):
     """Админ-панель модели профиля"""
     list_display = ('user', 'birth_date', 'slug')
     list_display_links = ('user', 'slug')
+    list_select_related = ('user',)
+    search_fields = ('user__username', '=slug')
+    autocomplete_fields = ('user',)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.accounts import presence
+
+
+class Command(BaseCommand):
+    """Запись накопленных в кэше отметок активности пользователей в БД.
+    Запускается периодически (например, cron раз в минуту): python manage.py flush_presence"""
+    help = 'Сохраняет время последней активности пользователей из кэша в БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество отметок в одном UPDATE')
+
+    def handle(self, *args, **options):
+        updated = presence.flush(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Обновлено пользователей: {updated}'))
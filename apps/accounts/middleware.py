@@ -1,16 +1,10 @@
-from django.contrib.auth.models import User
-from django.core.cache import cache
-from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 
+from . import presence
+
 
 class ActiveUserMiddleware(MiddlewareMixin):
     def process_request(self, request):
         if request.user.is_authenticated and request.session.session_key:
-            cache_key = f'last-seen-{request.user.id}'
-            last_login = cache.get(cache_key)
-
-            if not last_login:
-                User.objects.filter(id=request.user.id).update(last_login=timezone.now())
-                # Устанавливаем кэширование на 300 секунд с текущей датой по ключу last-seen-id-пользователя
-                cache.set(cache_key, timezone.now(), 300)
+            # Активность отмечается только в кэше, запись в БД выполняется пачками командой flush_presence
+            presence.touch(request.user.id)
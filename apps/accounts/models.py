@@ -3,8 +3,7 @@ from django.core.validators import FileExtensionValidator
 from django.contrib.auth.models import User
 from django.urls import reverse
 from apps.services.utils import unique_slugify      # Генератор уникальных SLUG для моделей, в случае существования такого SLUG.
-from django.utils import timezone
-from django.core.cache import cache
+from .presence import get_online_user_ids
 
 
 class Profile(models.Model):
@@ -41,8 +40,6 @@ class Profile(models.Model):
 
     def is_online(self):
         """Метод is_online(), который проверяет,
-        был ли пользователь онлайн в течение последних 5 минут"""
-        last_seen = cache.get(f'last-seen-{self.user.id}')
-        if last_seen is not None and timezone.now() < last_seen +timezone.timedelta(seconds=300):
-            return True
-        return False
+        был ли пользователь онлайн в течение последних 5 минут.
+        Для списков пользователей статус загружается одним запросом: presence.get_online_user_ids()"""
+        return self.user_id in get_online_user_ids([self.user_id])
@@ -0,0 +1,125 @@
+"""Отметки активности пользователей в кэше с записью в БД пачками.
+
+Время последней активности хранится в кэше ключом на пользователя. Отметки, еще не записанные в БД,
+каждый процесс накапливает в своем буфере и сохраняет в кэш ключом процесса: ключ пишет только
+процесс-владелец, поэтому параллельные запросы не перезаписывают отметки друг друга
+(общий кэш - файловый, атомарных incr и add у него нет).
+
+Команда flush_presence читает буферы процессов из реестра, записывает отметки одним UPDATE на пачку
+и сохраняет для каждого процесса номер последней записанной отметки. Записанные отметки удаляет
+из буфера сам процесс при следующем обновлении, поэтому отметка, добавленная во время flush, не теряется."""
+import os
+import socket
+import threading
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Case, When, Value
+from django.utils import timezone
+
+# Время (в секундах), в течение которого пользователь считается онлайн после последнего запроса
+PRESENCE_TIMEOUT = 300
+# Время жизни буфера процесса: должно быть больше интервала запуска flush_presence
+BUFFER_TIMEOUT = 60 * 60 * 24
+# Максимальное количество незаписанных отметок в буфере процесса. При переполнении новые отметки
+# не попадают в БД до следующего обновления, статус онлайн по кэшу сохраняется
+MAX_PENDING = 10000
+PROCESSES_KEY = 'presence-processes'
+
+_lock = threading.Lock()
+# id пользователя -> (номер отметки в процессе, время активности)
+_pending = {}
+_sequence = 0
+# (pid, ключ буфера процесса)
+_process = None
+
+
+def last_seen_key(user_id):
+    return f'last-seen-{user_id}'
+
+
+def get_process_key():
+    """Ключ буфера текущего процесса. После fork буфер родителя сбрасывается, случайная часть ключа
+    не дает новому процессу с тем же pid унаследовать номер записанной отметки завершенного процесса.
+    Вызывается под _lock."""
+    global _process
+    pid = os.getpid()
+    if _process is None or _process[0] != pid:
+        _pending.clear()
+        _process = (pid, f'presence-pending-{socket.gethostname()}-{pid}-{uuid.uuid4().hex[:8]}')
+    return _process[1]
+
+
+def flushed_key(process_key):
+    return f'{process_key}-flushed'
+
+
+def touch(user_id):
+    """Отметка активности пользователя в кэше.
+    Раз в PRESENCE_TIMEOUT отметка попадает в буфер процесса, который записывается в БД командой flush_presence."""
+    global _sequence
+    key = last_seen_key(user_id)
+    if cache.get(key):
+        return
+    with _lock:
+        process_key = get_process_key()
+        now = timezone.now()
+        cache.set(key, now, PRESENCE_TIMEOUT)
+        flushed = cache.get(flushed_key(process_key), 0)
+        for pending_id, (sequence, _) in list(_pending.items()):
+            if sequence <= flushed:
+                del _pending[pending_id]
+        if user_id in _pending or len(_pending) < MAX_PENDING:
+            _sequence += 1
+            _pending[user_id] = (_sequence, now)
+        cache.set(process_key, dict(_pending), BUFFER_TIMEOUT)
+    # Процесс добавляет себя в реестр, если его там нет (в том числе, если запись потерялась при
+    # одновременной регистрации нескольких процессов): отметки буфера сохраняются до регистрации
+    processes = cache.get(PROCESSES_KEY) or set()
+    if process_key not in processes:
+        cache.set(PROCESSES_KEY, processes | {process_key}, None)
+
+
+def flush(batch_size=1000):
+    """Запись накопленных отметок активности в User.last_login: один UPDATE на пачку пользователей.
+    Возвращает количество обновленных пользователей."""
+    process_keys = cache.get(PROCESSES_KEY) or set()
+    buffers = cache.get_many(list(process_keys))
+    flushed = cache.get_many([flushed_key(process_key) for process_key in buffers])
+    last_seen, marks = {}, {}
+    for process_key, entries in buffers.items():
+        mark = flushed.get(flushed_key(process_key), 0)
+        for user_id, (sequence, value) in entries.items():
+            if sequence > mark:
+                last_seen[user_id] = max(value, last_seen.get(user_id, value))
+        marks[process_key] = max((sequence for sequence, _ in entries.values()), default=mark)
+
+    updated = 0
+    user_ids = list(last_seen)
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        updated += User.objects.filter(id__in=batch).update(last_login=Case(
+            *[When(id=user_id, then=Value(last_seen[user_id])) for user_id in batch],
+        ))
+    # Отметки с номером не больше записанного удалит из буфера процесс-владелец
+    cache.set_many({flushed_key(process_key): mark for process_key, mark in marks.items()}, BUFFER_TIMEOUT)
+
+    # Буферы завершенных процессов истекают, их ключи удаляются из реестра
+    expired = process_keys - buffers.keys()
+    if expired:
+        cache.set(PROCESSES_KEY, (cache.get(PROCESSES_KEY) or set()) - expired, None)
+    return updated
+
+
+def get_last_seen(user_ids):
+    """Время последней активности для множества пользователей одним запросом к кэшу (get_many)"""
+    keys = {last_seen_key(user_id): user_id for user_id in user_ids}
+    values = cache.get_many(list(keys))
+    return {user_id: values.get(key) for key, user_id in keys.items()}
+
+
+def get_online_user_ids(user_ids):
+    """id пользователей, которые были активны в течение последних PRESENCE_TIMEOUT секунд"""
+    threshold = timezone.now() - timezone.timedelta(seconds=PRESENCE_TIMEOUT)
+    return {user_id for user_id, value in get_last_seen(user_ids).items() if value is not None and value > threshold}
@@ -1,6 +1,7 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from apps.services.images import schedule_variants
 from .models import Profile
 
 
@@ -10,3 +11,9 @@ def create_user_profile(sender, instance, created, **kwargs):
     Пользователь является отправителем, который несет ответственность за отправку уведомления."""
     if created:
         Profile.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Profile)
+def create_avatar_variants(sender, instance, **kwargs):
+    """Уменьшенные копии и WebP аватара создаются в фоне, если еще не готовы"""
+    schedule_variants(instance.avatar.name, 'avatar')
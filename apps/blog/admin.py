@@ -1,13 +1,41 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
+from django.utils.text import Truncator
 
 # Приложение для улучшения визуального вида категорий со вложенностью
 from django_mptt_admin.admin import DjangoMpttAdmin
+from apps.services.admin import InputFilter, IdInputFilter, ScalableAdminMixin
 from .models import (Category,
                      Post,
                      Comment,
                      Rating,
                      )
 
+# Тяжелые поля записи не нужны в списках комментариев и рейтинга, где запись показывается названием
+POST_CONTENT_FIELDS = ('description', 'text', 'description_html', 'text_html', 'excerpt')
+
+
+class PostIdFilter(IdInputFilter):
+    title = 'ID записи'
+    parameter_name = 'post'
+    lookup = 'post_id'
+
+
+class AuthorFilter(InputFilter):
+    title = 'автору (логин)'
+    parameter_name = 'author'
+    lookup = 'author__username'
+
+
+class RatingUserFilter(InputFilter):
+    title = 'пользователю (логин)'
+    parameter_name = 'user'
+    lookup = 'user__username'
+
 
 @admin.register(Category)
 class CategoryAdmin(DjangoMpttAdmin):
@@ -16,18 +44,89 @@ class CategoryAdmin(DjangoMpttAdmin):
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(ScalableAdminMixin, admin.ModelAdmin):
     """Админ-панель модели записей"""
     prepopulated_fields = {'slug': ('title',)}
+    list_display = ('title', 'author', 'category', 'status', 'fixed', 'create', 'rating_sum', 'comments_tree_link')
+    list_select_related = ('author', 'category')
+    list_filter = ('status', 'fixed', AuthorFilter, ('create', admin.DateFieldListFilter))
+    search_fields = ('title', '=id')
+    autocomplete_fields = ('author', 'updater')
+
+    @admin.display(description='Комментарии')
+    def comments_tree_link(self, obj):
+        return format_html('<a href="{}">Дерево</a>', reverse('admin:blog_comment_post_tree', args=[obj.pk]))
 
 
 @admin.register(Comment)
-class CommentAdminPage(DjangoMpttAdmin):
-    """Админ-панель модели комментариев"""
-    pass
+class CommentAdminPage(ScalableAdminMixin, admin.ModelAdmin):
+    """Админ-панель модели комментариев.
+    Вместо общего дерева всех комментариев - список с фильтрами и дерево комментариев одной записи
+    постранично по корневым комментариям (post_tree_view)"""
+    list_display = ('id', 'short_content', 'author', 'post', 'status', 'time_create')
+    list_display_links = ('id', 'short_content')
+    list_select_related = ('author', 'post')
+    list_filter = ('status', PostIdFilter, AuthorFilter, ('time_create', admin.DateFieldListFilter))
+    search_fields = ('=id',)
+    autocomplete_fields = ('post', 'author')
+    raw_id_fields = ('parent',)
+    # Количество корневых комментариев на странице дерева и глубина ответов, показываемых сразу
+    tree_page_size = 20
+    tree_depth = 5
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer(*(f'post__{name}' for name in POST_CONTENT_FIELDS))
+
+    @admin.display(description='Комментарий')
+    def short_content(self, obj):
+        return Truncator(obj.content).chars(80)
+
+    def get_urls(self):
+        return [
+            path('post/<int:post_id>/tree/', self.admin_site.admin_view(self.post_tree_view),
+                 name='blog_comment_post_tree'),
+        ] + super().get_urls()
+
+    def post_tree_view(self, request, post_id):
+        """Дерево комментариев записи: страница корней (?after=<tree_id>) или ветка ответа (?node=<id>)"""
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        post = get_object_or_404(Post.objects.only('pk', 'title', 'slug'), pk=post_id)
+        node = request.GET.get('node')
+        after = request.GET.get('after')
+        if node and node.isdigit():
+            node = get_object_or_404(Comment.objects.only('post_id', 'tree_id', 'lft', 'rght', 'level'),
+                                     pk=node, post_id=post.pk)
+            page = Comment.objects.get_subtree_page(node, depth=self.tree_depth)
+        else:
+            node = None
+            page = Comment.objects.get_root_page(post.pk, after=int(after) if after and after.isdigit() else None,
+                                                 limit=self.tree_page_size, depth=self.tree_depth)
+        base_level = node.level + 1 if node else 0
+        # Ответы глубже max_level не загружены, их количество известно из границ lft/rght без запроса
+        rows = [{'comment': comment, 'indent': (comment.level - base_level) * 24,
+                 'hidden_replies': comment.get_descendant_count() if comment.level >= page.max_level else 0}
+                for comment in page.nodes]
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f'Комментарии к записи: {post.title}',
+            'post': post,
+            'node': node,
+            'rows': rows,
+            'next_cursor': page.next_cursor,
+        }
+        return TemplateResponse(request, 'admin/blog/comment/post_tree.html', context)
 
 
 @admin.register(Rating)
-class RatingAdmin(admin.ModelAdmin):
+class RatingAdmin(ScalableAdminMixin, admin.ModelAdmin):
     """Админ-панель модели рейтинга"""
-    pass
+    list_display = ('id', 'post', 'user', 'value', 'ip_address', 'time_create')
+    list_select_related = ('post', 'user')
+    list_filter = ('value', PostIdFilter, RatingUserFilter, ('time_create', admin.DateFieldListFilter))
+    search_fields = ('=ip_address',)
+    autocomplete_fields = ('post', 'user')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer(*(f'post__{name}' for name in POST_CONTENT_FIELDS))
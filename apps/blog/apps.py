@@ -5,3 +5,9 @@ class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.blog'
     verbose_name = 'Блог'
+
+    def ready(self):
+        """Регистрация сигналов приложения (сброс кэша при изменении данных)
+        и настройки новых соединений с БД"""
+        import apps.blog.signals
+        import apps.services.database
@@ -1,22 +1,127 @@
+import hashlib
+from contextvars import ContextVar
+
 from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import HttpResponse, Http404
+from django.shortcuts import get_object_or_404
 from django.urls import reverse
-from .models import Post
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from taggit.models import Tag
 
+from apps.services.cache import get_cache_version
+from .models import Post, Category
 
-class LatestPostFeed(Feed):
-    """Класс RSS ленты"""
-    title = 'Мой блог на Django - последние записи'
-    link = '/feeds/'
-    description = 'Новые записи на моем сайте.'
+# Объект ленты текущего запроса: загружается один раз в CachedPostFeed.__call__.
+# Экземпляр Feed общий для всех запросов, поэтому объект хранится не в атрибуте экземпляра
+_feed_object = ContextVar('feed_object')
+
+class CachedPostFeed(Feed):
+    """Базовый класс RSS ленты записей.
+    Поддерживает условные GET (ETag/Last-Modified по самой свежей дате обновления записи),
+    готовый XML хранится в кэше до изменения записей (версия контента)."""
+    items_limit = 5
+    cache_timeout = 60 * 60
+
+    def load_object(self, request, *args, **kwargs):
+        """Объект ленты (категория, тег) по параметрам URL, переопределяется вместо get_object()"""
+        return None
+
+    def get_object(self, request, *args, **kwargs):
+        """Объект, уже загруженный для ETag в __call__, повторно не запрашивается"""
+        try:
+            return _feed_object.get()
+        except LookupError:
+            return self.load_object(request, *args, **kwargs)
 
-    def items(self):
-        return Post.objects.order_by('-update')[:5]
+    def get_posts(self, obj):
+        """Опубликованные записи ленты (с автором и категорией в одном запросе)"""
+        return Post.custom.all()
+
+    def items(self, obj):
+        return self.get_posts(obj).order_by('-update')[:self.items_limit]
 
     def item_title(self, item):
         return item.title
 
     def item_description(self, item):
-        return item.description
+        return item.description_html
 
     def item_link(self, item):
         return reverse('post_detail', args=[item.slug])
+
+    def __call__(self, request, *args, **kwargs):
+        obj = self.load_object(request, *args, **kwargs)
+        last_modified = self.get_posts(obj).aggregate(last=Max('update'))['last']
+        content_version = get_cache_version('content')
+        etag = '"{}"'.format(hashlib.md5(
+            f'{request.path}:{last_modified}:{content_version}'.encode()).hexdigest())
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            cache_key = f'feed-{content_version}-{hashlib.md5(request.path.encode()).hexdigest()}'
+            cached = cache.get(cache_key)
+            if cached is None:
+                token = _feed_object.set(obj)
+                try:
+                    response = super().__call__(request, *args, **kwargs)
+                finally:
+                    _feed_object.reset(token)
+                cache.set(cache_key, (response.content, response['Content-Type']), self.cache_timeout)
+            else:
+                response = HttpResponse(cached[0], content_type=cached[1])
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
+
+
+class LatestPostFeed(CachedPostFeed):
+    """Класс RSS ленты"""
+    title = 'Мой блог на Django - последние записи'
+    link = '/feeds/'
+    description = 'Новые записи на моем сайте.'
+
+
+class CategoryPostFeed(CachedPostFeed):
+    """RSS лента записей категории (включая дочерние категории)"""
+
+    def load_object(self, request, slug):
+        category = Category.objects.get_cached_by_slug(slug)
+        if category is None:
+            raise Http404('Категория не найдена')
+        return category
+
+    def get_posts(self, obj):
+        return obj.get_posts()
+
+    def title(self, obj):
+        return f'Мой блог на Django - записи из категории: {obj.title}'
+
+    def link(self, obj):
+        return obj.get_absolute_url()
+
+    def description(self, obj):
+        return obj.description
+
+
+class TagPostFeed(CachedPostFeed):
+    """RSS лента записей по тегу"""
+
+    def load_object(self, request, tag):
+        return get_object_or_404(Tag, slug=tag)
+
+    def get_posts(self, obj):
+        return Post.custom.filter(tags__slug=obj.slug)
+
+    def title(self, obj):
+        return f'Мой блог на Django - записи по тегу: {obj.name}'
+
+    def link(self, obj):
+        return reverse('post_by_tags', args=[obj.slug])
+
+    def description(self, obj):
+        return f'Новые записи по тегу {obj.name}.'
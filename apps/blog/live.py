@@ -0,0 +1,16 @@
+"""События записи для SSE (PostEventsView): новые комментарии и итог рейтинга.
+Данные комментария совпадают с ответом CommentCreateView (Comment.get_json_data())."""
+from apps.services.pubsub import publish
+
+
+def get_channel(post_id):
+    return f'post-{post_id}'
+
+
+def publish_comment(comment):
+    publish(get_channel(comment.post_id), 'comment', comment.get_json_data())
+
+
+def publish_rating(post_id, rating_sum):
+    """Итоги рейтинга объединяются: медленный подписчик получит только последнее значение"""
+    publish(get_channel(post_id), 'rating', {'post_id': int(post_id), 'rating_sum': rating_sum}, coalesce='rating')
@@ -0,0 +1,362 @@
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager, ExitStack
+from io import StringIO
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, reset_queries
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import (CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases,
+                               teardown_test_environment)
+from django.urls import get_resolver, reverse, URLPattern, URLResolver
+from django.utils import timezone
+
+from apps.accounts.models import Profile
+from apps.blog.models import Category, Comment, Post
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json')
+# Маршруты, которые должны быть покрыты замерами (проверяется при каждом запуске)
+COVERED_URLCONFS = ('apps.blog.urls', 'apps.accounts.urls', 'apps.search.urls')
+COVERED_FEEDS = ('latest_post_feed', 'category_post_feed', 'tag_post_feed')
+# Маршруты, которые нельзя замерить синхронным тестовым клиентом
+SKIPPED_ROUTES = {'post_events': 'поток SSE работает только под ASGI'}
+# Изолированный кэш той же структуры, что и в настройках проекта: замер не затрагивает рабочий кэш
+BENCHMARK_CACHES = {
+    'default': {'BACKEND': 'apps.services.cache_backends.TwoTierCache', 'LOCATION': 'shared',
+                'OPTIONS': {'L1_MAX_ENTRIES': 1000, 'L1_TIMEOUT': 5}},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'},
+}
+
+
+@contextmanager
+def capture_queries():
+    """Запросы ко всем алиасам БД (чтение может идти в реплику), итог - в списке после выхода"""
+    counter = []
+    with ExitStack() as stack:
+        contexts = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+        yield counter
+    counter.append(sum(len(context) for context in contexts))
+
+
+class Command(BaseCommand):
+    """Воспроизводимый замер всех маршрутов блога, аккаунтов, поиска и RSS лент.
+
+    Во временной тестовой БД создается набор данных (генератор со своим seed, загрузка через import_blog),
+    затем для каждого маршрута фиксируются: количество запросов к БД на пустом и прогретом кэше,
+    задержка p50/p95 и пик выделенной памяти (tracemalloc). Результат сохраняется в JSON и сравнивается
+    с базовым замером: рост числа запросов, задержки или памяти сверх порогов завершает команду с ошибкой.
+
+    python manage.py benchmark_urls --output result.json
+    python manage.py benchmark_urls --save-baseline"""
+    help = 'Замер производительности всех маршрутов на сгенерированном наборе данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42, help='Seed генератора данных')
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--categories', type=int, default=15)
+        parser.add_argument('--category-depth', type=int, default=3, help='Глубина дерева категорий')
+        parser.add_argument('--posts', type=int, default=300)
+        parser.add_argument('--tags', type=int, default=40)
+        parser.add_argument('--tags-per-post', type=int, default=3)
+        parser.add_argument('--comments-per-post', type=int, default=10)
+        parser.add_argument('--comment-depth', type=int, default=8, help='Глубина самой длинной ветки комментариев')
+        parser.add_argument('--ratings-per-post', type=int, default=20)
+        parser.add_argument('--iterations', type=int, default=20, help='Количество замеров каждого маршрута')
+        parser.add_argument('--warmup', type=int, default=2, help='Количество прогревочных запросов')
+        parser.add_argument('--output', help='Файл для результата в JSON')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Базовый замер для сравнения')
+        parser.add_argument('--save-baseline', action='store_true', help='Сохранить результат как базовый замер')
+        parser.add_argument('--latency-threshold', type=float, default=0.5,
+                            help='Допустимый относительный рост p50 (0.5 = +50%%)')
+        parser.add_argument('--p95-threshold', type=float, default=2.0,
+                            help='Допустимый относительный рост p95 (хвост распределения шумнее медианы)')
+        parser.add_argument('--latency-floor', type=float, default=5.0,
+                            help='Рост задержки меньше этого значения (мс) не считается регрессией')
+        parser.add_argument('--alloc-threshold', type=float, default=0.25, help='Допустимый рост пика памяти')
+        parser.add_argument('--query-threshold', type=int, default=0, help='Допустимый рост количества запросов')
+
+    def handle(self, *args, **options):
+        self.options = options
+        setup_test_environment()
+        # Тестовые БД для всех алиасов, реплика (TEST MIRROR) подключается к тестовой основной БД
+        old_config = setup_databases(verbosity=0, interactive=False, serialized_aliases=())
+        try:
+            # Повторные POST одного клиента не должны упираться в ограничение частоты
+            with override_settings(CACHES=BENCHMARK_CACHES, DEBUG=False, THROTTLE_RATES={}):
+                started = time.monotonic()
+                dataset = self.seed()
+                self.stdout.write(f'Набор данных создан за {time.monotonic() - started:.1f} с: {dataset}')
+                routes = self.run_cases()
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        result = {'meta': self.get_meta(dataset), 'routes': routes}
+        self.print_table(routes)
+        if options['output']:
+            self.write_json(options['output'], result)
+        if options['save_baseline']:
+            self.write_json(options['baseline'], result)
+            self.stdout.write(self.style.SUCCESS(f'Базовый замер сохранен: {options["baseline"]}'))
+        elif os.path.exists(options['baseline']):
+            self.compare(result, options['baseline'])
+
+    # Набор данных
+
+    def seed(self):
+        """Генерация JSONL в формате export_blog и загрузка через import_blog
+        (bulk_create, перестройка деревьев, счетчики, поисковый индекс, похожие записи)"""
+        options = self.options
+        rnd = random.Random(options['seed'])
+        base_time = timezone.now().replace(microsecond=0) - timezone.timedelta(days=30)
+        password = make_password('benchmark')
+        users = [User(username=f'bench-user-{index}', password=password, is_staff=index == 0,
+                      is_superuser=index == 0) for index in range(max(options['users'], 1))]
+        User.objects.bulk_create(users)
+        users = list(User.objects.order_by('pk'))
+        Profile.objects.bulk_create([Profile(user=user, slug=user.username) for user in users])
+
+        records = []
+        categories = []
+        for index in range(options['categories']):
+            parents = [category for category in categories if category['level'] < options['category_depth'] - 1]
+            parent = rnd.choice(parents) if parents and rnd.random() < 0.7 else None
+            category = {'id': index + 1, 'level': parent['level'] + 1 if parent else 0}
+            categories.append(category)
+            records.append({'type': 'category', 'id': category['id'], 'title': f'Категория {index}',
+                            'slug': f'category-{index}', 'description': 'Описание категории',
+                            'parent': parent['id'] if parent else None})
+        words = ['django', 'python', 'запрос', 'кэш', 'индекс', 'шаблон', 'сервер', 'данные', 'страница', 'дерево']
+        tag_names = [f'tag-{index}' for index in range(options['tags'])]
+        comment_id = 0
+        ratings = []
+        for index in range(options['posts']):
+            created = (base_time + timezone.timedelta(minutes=index * 7)).isoformat()
+            text = ' '.join(rnd.choice(words) for _ in range(200))
+            records.append({
+                'type': 'post', 'id': index + 1, 'title': f'Запись {index} {rnd.choice(words)}',
+                'slug': f'post-{index}', 'description': f'<p>{text[:200]}</p>', 'text': f'<p>{text}</p>',
+                'category': rnd.choice(categories)['id'], 'thumbnail': 'default.jpg',
+                'status': 'published' if rnd.random() < 0.9 else 'draft', 'create': created, 'update': created,
+                'fixed': index % 50 == 0, 'author_username': users[0].username if index % 3 == 0
+                else rnd.choice(users).username, 'updater_username': None,
+                'tags': rnd.sample(tag_names, min(options['tags_per_post'], len(tag_names))),
+            })
+            post_comments = []
+            for number in range(options['comments_per_post']):
+                comment_id += 1
+                if number < options['comment_depth'] and index == 0:
+                    # У первой записи одна длинная ветка максимальной глубины
+                    parent = post_comments[-1] if post_comments else None
+                else:
+                    parent = rnd.choice(post_comments) if post_comments and rnd.random() < 0.6 else None
+                post_comments.append(comment_id)
+                records.append({'type': 'comment', 'id': comment_id, 'post': index + 1, 'parent': parent,
+                                'content': ' '.join(rnd.choice(words) for _ in range(20)), 'status': 'published',
+                                'time_create': created, 'time_update': created,
+                                'author_username': rnd.choice(users).username})
+            for number in range(options['ratings_per_post']):
+                ratings.append({'type': 'rating', 'id': len(ratings) + 1, 'post': index + 1,
+                                'value': 1 if rnd.random() < 0.7 else -1, 'time_create': created,
+                                'ip_address': f'10.{index // 256 % 256}.{index % 256}.{number}',
+                                'user_username': None})
+        # Комментарии загружаются после всех записей, голоса - в конце, как в выгрузке export_blog
+        records.sort(key=lambda record: ('category', 'post', 'comment').index(record['type']))
+        records.extend(ratings)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', encoding='utf-8', delete=False) as dump:
+            for record in records:
+                dump.write(json.dumps(record, ensure_ascii=False))
+                dump.write('\n')
+        try:
+            call_command('import_blog', dump.name, stdout=StringIO())
+        finally:
+            os.unlink(dump.name)
+        return {'users': len(users), 'categories': Category.objects.count(), 'posts': Post.objects.count(),
+                'comments': Comment.objects.count(), 'tags': len(tag_names),
+                'ratings': sum(Post.objects.values_list('like_count', flat=True))
+                + sum(Post.objects.values_list('dislike_count', flat=True))}
+
+    # Маршруты
+
+    def get_cases(self):
+        """Запросы для каждого маршрута: (метка, имя маршрута, kwargs, query, метод, данные, пользователь, AJAX)"""
+        admin = User.objects.get(username='bench-user-0')
+        reader = User.objects.filter(is_staff=False).order_by('pk').first() or admin
+        post = Post.custom.annotate(comment_count=Count('comments')) \
+            .filter(author=admin).order_by('-comment_count', 'pk').first()
+        deep_comment = Comment.objects.filter(post=post).order_by('-level').first()
+        root_comment = Comment.objects.filter(post=post, level=0).order_by('tree_id').first()
+        category = Category.objects.filter(children__isnull=False).order_by('tree_id', 'lft').first() \
+            or Category.objects.first()
+        tags = list(post.tags.order_by('slug').values_list('slug', flat=True))
+        rating_values = iter(int(1 - 2 * (index % 2)) for index in range(10 ** 6))
+        return [
+            ('home', 'home', {}, '', 'get', None, None, False),
+            ('home-trending', 'home', {}, 'sort=trending', 'get', None, None, False),
+            ('home-page-5', 'home', {}, 'page=5', 'get', None, None, False),
+            ('post_detail', 'post_detail', {'slug': post.slug}, '', 'get', None, None, False),
+            ('post_detail-auth', 'post_detail', {'slug': post.slug}, '', 'get', None, reader, False),
+            ('post_create', 'post_create', {}, '', 'get', None, admin, False),
+            ('post_update', 'post_update', {'slug': post.slug}, '', 'get', None, admin, False),
+            ('comment_list_view', 'comment_list_view', {'pk': post.pk}, f'after={root_comment.tree_id}', 'get',
+             None, None, True),
+            ('comment_list_view-node', 'comment_list_view', {'pk': post.pk}, f'node={deep_comment.pk}', 'get',
+             None, None, True),
+            ('comment_create_view', 'comment_create_view', {'pk': post.pk}, '', 'post',
+             lambda: {'content': 'Комментарий из замера', 'parent': root_comment.pk}, reader, True),
+            ('post_by_tags', 'post_by_tags', {'tag': tags[0]}, '', 'get', None, None, False),
+            ('post_by_tags_filter', 'post_by_tags_filter', {}, '&'.join(f'tag={tag}' for tag in tags[:2]), 'get',
+             None, None, False),
+            ('post_by_tags_filter-any', 'post_by_tags_filter', {},
+             '&'.join(f'tag={tag}' for tag in tags[:2]) + '&match=any', 'get', None, None, False),
+            ('post_by_category', 'post_by_category', {'slug': category.slug}, '', 'get', None, None, False),
+            ('rating', 'rating', {}, '', 'post', lambda: {'post_id': post.pk, 'value': next(rating_values)},
+             None, True),
+            ('profile_detail', 'profile_detail', {'slug': admin.profile.slug}, '', 'get', None, None, False),
+            ('profile_edit', 'profile_edit', {}, '', 'get', None, reader, False),
+            ('register', 'register', {}, '', 'get', None, None, False),
+            ('login', 'login', {}, '', 'get', None, None, False),
+            ('logout', 'logout', {}, '', 'post', lambda: {}, reader, False),
+            ('search', 'search', {}, 'q=django+кэш', 'get', None, None, False),
+            ('latest_post_feed', 'latest_post_feed', {}, '', 'get', None, None, False),
+            ('category_post_feed', 'category_post_feed', {'slug': category.slug}, '', 'get', None, None, False),
+            ('tag_post_feed', 'tag_post_feed', {'tag': tags[0]}, '', 'get', None, None, False),
+        ]
+
+    def get_route_names(self):
+        """Имена всех маршрутов, которые должны быть замерены"""
+        names = set(COVERED_FEEDS)
+        for pattern in get_resolver().url_patterns:
+            if isinstance(pattern, URLResolver) and getattr(pattern.urlconf_module, '__name__', '') in COVERED_URLCONFS:
+                names.update(item.name for item in pattern.url_patterns if isinstance(item, URLPattern) and item.name)
+        return names
+
+    def run_cases(self):
+        cases = self.get_cases()
+        missing = self.get_route_names() - {case[1] for case in cases} - set(SKIPPED_ROUTES)
+        if missing:
+            raise CommandError(f'Нет замеров для маршрутов: {", ".join(sorted(missing))}')
+        routes = {}
+        for label, name, kwargs, query, method, data, user, ajax in cases:
+            url = reverse(name, kwargs=kwargs) + (f'?{query}' if query else '')
+            routes[label] = self.measure(url, method, data, user, ajax)
+            self.stdout.write(f'{label}: {routes[label]}')
+        for name, reason in SKIPPED_ROUTES.items():
+            routes[name] = {'skipped': reason}
+        return routes
+
+    def measure(self, url, method, data, user, ajax):
+        client = Client()
+        headers = {'X-Requested-With': 'XMLHttpRequest'} if ajax else {}
+
+        def request():
+            # Выход завершает сессию, поэтому пользователь авторизуется перед каждым запросом (вне замера)
+            if user is not None and '_auth_user_id' not in client.session:
+                client.force_login(user)
+            if method == 'post':
+                return client.post(url, data(), headers=headers)
+            return client.get(url, headers=headers)
+
+        caches['default'].clear()
+        # Журнал запросов ограничен по длине и мог заполниться при создании БД
+        reset_queries()
+        with capture_queries() as cold:
+            response = request()
+        status, cold_queries = response.status_code, cold[0]
+        for _ in range(self.options['warmup']):
+            request()
+        latencies, query_counts = [], []
+        # Сборщик мусора отключается на время замера, чтобы его паузы не попадали в p95
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(self.options['iterations']):
+                with capture_queries() as queries:
+                    started = time.perf_counter()
+                    request()
+                    latencies.append((time.perf_counter() - started) * 1000)
+                query_counts.append(queries[0])
+        finally:
+            gc.enable()
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        request()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        latencies.sort()
+        return {
+            'url': url, 'method': method.upper(), 'status': status,
+            'queries_cold': cold_queries, 'queries': int(statistics.median(query_counts)),
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(latencies[max(int(len(latencies) * 0.95) - 1, 0)], 3),
+            'alloc_peak_kb': round(peak / 1024, 1),
+        }
+
+    # Результаты
+
+    def get_meta(self, dataset):
+        options = self.options
+        return {
+            'created': timezone.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'django': django.get_version(), 'platform': platform.platform(),
+            'database': connection.vendor, 'iterations': options['iterations'], 'seed': options['seed'],
+            'dataset': dataset,
+        }
+
+    def write_json(self, path, result):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as output:
+            json.dump(result, output, ensure_ascii=False, indent=2)
+            output.write('\n')
+
+    def print_table(self, routes):
+        self.stdout.write(f'{"маршрут":32} {"код":>4} {"запр.":>6} {"холод.":>6} {"p50 мс":>8} {"p95 мс":>8} '
+                          f'{"память КБ":>10}')
+        for label, route in routes.items():
+            if 'skipped' in route:
+                self.stdout.write(f'{label:32} пропущен: {route["skipped"]}')
+                continue
+            self.stdout.write(f'{label:32} {route["status"]:>4} {route["queries"]:>6} {route["queries_cold"]:>6} '
+                              f'{route["p50_ms"]:>8.2f} {route["p95_ms"]:>8.2f} {route["alloc_peak_kb"]:>10.1f}')
+
+    def compare(self, result, baseline_path):
+        """Сравнение с базовым замером, регрессии завершают команду с ошибкой"""
+        with open(baseline_path, encoding='utf-8') as source:
+            baseline = json.load(source)
+        options = self.options
+        if baseline.get('meta', {}).get('dataset') != result['meta']['dataset']:
+            self.stderr.write('Набор данных отличается от базового замера, сравнение может быть некорректным')
+        regressions = []
+        for label, route in result['routes'].items():
+            base = baseline.get('routes', {}).get(label)
+            if not base or 'skipped' in route or 'skipped' in base:
+                continue
+            for field in ('queries', 'queries_cold'):
+                if route[field] > base[field] + options['query_threshold']:
+                    regressions.append(f'{label}: {field} {base[field]} -> {route[field]}')
+            for field, threshold in (('p50_ms', options['latency_threshold']), ('p95_ms', options['p95_threshold'])):
+                growth = route[field] - base[field]
+                if growth > options['latency_floor'] and growth > base[field] * threshold:
+                    regressions.append(f'{label}: {field} {base[field]} -> {route[field]}')
+            if route['alloc_peak_kb'] > base['alloc_peak_kb'] * (1 + options['alloc_threshold']):
+                regressions.append(f'{label}: alloc_peak_kb {base["alloc_peak_kb"]} -> {route["alloc_peak_kb"]}')
+            if route['status'] != base['status']:
+                regressions.append(f'{label}: status {base["status"]} -> {route["status"]}')
+        if regressions:
+            raise CommandError('Регрессии относительно базового замера:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f'Регрессий относительно {baseline_path} нет'))
@@ -0,0 +1,120 @@
+import asyncio
+import ipaddress
+import json
+import statistics
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+
+from apps.blog import views
+from apps.blog.models import Post, Comment, Rating
+
+# Диапазон адресов для тестов производительности (RFC 2544), по нему удаляются голоса после замера
+BENCHMARK_NETWORK = ipaddress.ip_network('198.18.0.0/15')
+
+
+class Command(BaseCommand):
+    """Локальный замер пропускной способности синхронных и асинхронных представлений голосования и комментариев.
+    Запросы выполняются в процессе с заданной конкурентностью так же, как их обрабатывает ASGI:
+    синхронное представление - через sync_to_async(thread_sensitive=True), асинхронное - напрямую в цикле событий.
+    Созданные голоса и комментарии удаляются после замера, счетчики пересчитываются.
+    Пример: python manage.py benchmark_write_views --requests 500 --concurrency 50"""
+    help = 'Сравнивает производительность синхронных и асинхронных представлений записи'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300, help='Количество запросов на каждый замер')
+        parser.add_argument('--concurrency', type=int, default=20, help='Количество одновременных запросов')
+        parser.add_argument('--post', type=int, help='id записи (по умолчанию последняя опубликованная)')
+        parser.add_argument('--username', help='Автор комментариев (по умолчанию первый суперпользователь)')
+
+    def handle(self, *args, **options):
+        post = (Post.objects.filter(pk=options['post']) if options['post']
+                else Post.custom.order_by('-pk')).first()
+        if post is None:
+            raise CommandError('Нет записи для замера')
+        users = User.objects.filter(username=options['username']) if options['username'] \
+            else User.objects.filter(is_superuser=True).order_by('pk')
+        user = users.select_related('profile').first()
+        if user is None:
+            raise CommandError('Пользователь для комментариев не найден')
+        self.post, self.user = post, user
+        self.ip_offset = 0
+        self.comment_ids = []
+
+        endpoints = [
+            ('rating', views.RatingCreateView.as_view(), views.AsyncRatingCreateView.as_view(), self.rating_request),
+            ('comment', views.CommentCreateView.as_view(), views.AsyncCommentCreateView.as_view(),
+             self.comment_request),
+        ]
+        self.stdout.write(f'Запись: {post.pk}, запросов: {options["requests"]}, '
+                          f'конкурентность: {options["concurrency"]}')
+        try:
+            # Все запросы идут от одного пользователя: ограничение частоты отключается на время замера.
+            # Адрес фабрики запросов считается прокси, чтобы учитывался X-Forwarded-For голосов
+            with override_settings(THROTTLE_RATES={}, TRUSTED_PROXIES=['127.0.0.1']):
+                for name, sync_view, async_view, make_request in endpoints:
+                    for mode, view in (('sync', sync_view), ('async', async_view)):
+                        result = asyncio.run(self.run(view, mode, make_request, options['requests'],
+                                                      options['concurrency']))
+                        self.report(name, mode, result)
+        finally:
+            self.cleanup()
+
+    def rating_request(self, factory):
+        """Каждый запрос голосует с нового адреса, чтобы замерять создание голоса, а не конфликт"""
+        self.ip_offset += 1
+        # Адрес передается в X-Forwarded-For: заголовок одинаково задается для WSGI и ASGI запросов
+        request = factory.post('/rating/', {'post_id': self.post.pk, 'value': 1},
+                               headers={'X-Forwarded-For': str(BENCHMARK_NETWORK[self.ip_offset])})
+        return request, {}
+
+    def comment_request(self, factory):
+        request = factory.post(f'/post/{self.post.pk}/comments/create/', {'content': 'benchmark'},
+                               headers={'X-Requested-With': 'XMLHttpRequest'})
+        return request, {'pk': self.post.pk}
+
+    async def run(self, view, mode, make_request, total, concurrency):
+        factory = AsyncRequestFactory() if mode == 'async' else RequestFactory()
+        handler = view if mode == 'async' else sync_to_async(view, thread_sensitive=True)
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, errors = [], 0
+
+        async def auser():
+            return self.user
+
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                request, kwargs = make_request(factory)
+                request.user, request.auser = self.user, auser
+                started = time.perf_counter()
+                response = await handler(request, **kwargs)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+                elif make_request == self.comment_request:
+                    self.comment_ids.append(json.loads(response.content)['id'])
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return time.perf_counter() - started, sorted(latencies), errors
+
+    def report(self, name, mode, result):
+        elapsed, latencies, errors = result
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        self.stdout.write(f'{name:8} {mode:5}: {len(latencies) / elapsed:8.1f} запросов/с, '
+                          f'p50 {statistics.median(latencies) * 1000:7.1f} мс, p95 {p95 * 1000:7.1f} мс, '
+                          f'ошибок: {errors}')
+
+    def cleanup(self):
+        benchmark_ips = [str(BENCHMARK_NETWORK[offset]) for offset in range(1, self.ip_offset + 1)]
+        for start in range(0, len(benchmark_ips), 500):
+            Rating.objects.filter(post=self.post, ip_address__in=benchmark_ips[start:start + 500]).delete()
+        for comment in Comment.objects.filter(pk__in=self.comment_ids):
+            comment.delete()
+        call_command('recount_ratings', stdout=self.stdout)
+        call_command('update_trending', rebuild_buckets=True, stdout=self.stdout)
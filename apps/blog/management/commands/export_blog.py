@@ -0,0 +1,98 @@
+import sys
+import time
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from taggit.models import TaggedItem
+
+from apps.blog.models import Category, Post, Comment, Rating
+
+
+def iterate_batches(queryset, batch_size):
+    """Постраничный обход values()-выборки по первичному ключу (keyset), память ограничена размером пачки"""
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1]['id']
+
+
+class Command(BaseCommand):
+    """Потоковая выгрузка категорий, записей, комментариев и рейтинга в JSONL (одна запись на строку).
+    Пример: python manage.py export_blog --output blog.jsonl --batch-size 1000"""
+    help = 'Выгружает содержимое блога в формате JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help='Файл для выгрузки, по умолчанию stdout')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество записей в одной выборке')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        output = sys.stdout if options['output'] == '-' else open(options['output'], 'w', encoding='utf-8')
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+        started = time.monotonic()
+        total = 0
+        try:
+            for kind, records in (('category', self.categories()),
+                                  ('post', self.posts()),
+                                  ('comment', self.comments()),
+                                  ('rating', self.ratings())):
+                count = 0
+                for record in records:
+                    output.write(encoder.encode({'type': kind, **record}))
+                    output.write('\n')
+                    count += 1
+                    if count % self.batch_size == 0:
+                        self.report(kind, count, started)
+                total += count
+                self.report(kind, count, started)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        elapsed = time.monotonic() - started
+        self.stderr.write(self.style.SUCCESS(f'Выгружено объектов: {total} за {elapsed:.1f} с'))
+
+    def report(self, kind, count, started):
+        """Прогресс выводится в stderr, чтобы не смешиваться с данными в stdout"""
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stderr.write(f'{kind}: {count} ({count / elapsed:.0f} объектов/с с начала выгрузки)')
+
+    def categories(self):
+        """Категории в порядке дерева (tree_id, lft): родитель всегда выгружается раньше потомков"""
+        queryset = Category.objects.order_by('tree_id', 'lft').values('id', 'title', 'slug', 'description', 'parent')
+        yield from queryset.iterator(chunk_size=self.batch_size)
+
+    def posts(self):
+        content_type = ContentType.objects.get_for_model(Post)
+        queryset = Post.objects.values(
+            'id', 'title', 'slug', 'description', 'text', 'category', 'thumbnail', 'status', 'create', 'update',
+            'fixed', author_username=F('author__username'), updater_username=F('updater__username'),
+        )
+        for batch in iterate_batches(queryset, self.batch_size):
+            # Теги всей пачки одним запросом
+            tags = {}
+            tagged = TaggedItem.objects.filter(content_type=content_type,
+                                               object_id__in=[post['id'] for post in batch])
+            for object_id, name in tagged.values_list('object_id', 'tag__name'):
+                tags.setdefault(object_id, []).append(name)
+            for post in batch:
+                post['tags'] = tags.get(post['id'], [])
+                yield post
+
+    def comments(self):
+        """Комментарии в порядке дерева: родительский комментарий выгружается раньше ответов"""
+        queryset = Comment.objects.order_by('tree_id', 'lft').values(
+            'id', 'post', 'content', 'time_create', 'time_update', 'status', 'parent',
+            author_username=F('author__username'),
+        )
+        yield from queryset.iterator(chunk_size=self.batch_size)
+
+    def ratings(self):
+        queryset = Rating.objects.values('id', 'post', 'value', 'time_create', 'ip_address',
+                                         user_username=F('user__username'))
+        for batch in iterate_batches(queryset, self.batch_size):
+            yield from batch
@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from apps.accounts.models import Profile
+from apps.blog.models import Post
+from apps.services.images import generate_variants
+
+
+class Command(BaseCommand):
+    """Создание уменьшенных копий и WebP для уже загруженных изображений записей и аватаров.
+    Список файлов берется из БД (distinct), каждый файл обрабатывается один раз в пуле потоков.
+    Пример: python manage.py generate_image_variants --workers 4 --kind thumbnail"""
+    help = 'Создает адаптивные варианты изображений записей и аватаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Количество потоков')
+        parser.add_argument('--kind', choices=('thumbnail', 'avatar'), help='Только изображения записей или аватары')
+        parser.add_argument('--force', action='store_true', help='Пересоздать существующие варианты')
+
+    def handle(self, *args, **options):
+        sources = {'thumbnail': Post.objects.values_list('thumbnail', flat=True),
+                   'avatar': Profile.objects.values_list('avatar', flat=True)}
+        if options['kind']:
+            sources = {options['kind']: sources[options['kind']]}
+        tasks = [(name, kind) for kind, queryset in sources.items()
+                 for name in queryset.exclude(**{kind: ''}).order_by().distinct()]
+        started = time.monotonic()
+        done = failed = missing = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {executor.submit(self.process, name, kind, options['force']): name for name, kind in tasks}
+            for future in as_completed(futures):
+                try:
+                    if future.result():
+                        done += 1
+                    else:
+                        missing += 1
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{futures[future]}: {error}')
+                processed = done + failed + missing
+                if processed % 100 == 0:
+                    self.stdout.write(f'Обработано: {processed} из {len(tasks)} '
+                                      f'({processed / max(time.monotonic() - started, 1e-6):.1f} файлов/с)')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done}, файлов нет в хранилище: {missing}, ошибок: {failed} '
+            f'за {time.monotonic() - started:.1f} с'))
+
+    @staticmethod
+    def process(name, kind, force):
+        if not default_storage.exists(name):
+            return False
+        generate_variants(name, kind, force=force)
+        return True
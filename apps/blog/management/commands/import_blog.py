@@ -0,0 +1,272 @@
+import json
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from taggit.models import Tag, TaggedItem
+
+from apps.blog.models import Category, Post, Comment, Rating
+from apps.blog.rendering import render_post
+from apps.services.cache import bump_cache_version
+from apps.services.utils import allocate_unique_slugs
+
+# Границы узлов MPTT заполняются заглушками и пересчитываются в конце импорта только в созданных деревьях.
+# tree_id назначается при вставке: новый для корня, родительский для остальных узлов
+MPTT_PLACEHOLDERS = {'lft': 0, 'rght': 0, 'level': 0}
+
+
+@contextmanager
+def keep_timestamps(*fields):
+    """Временное отключение auto_now/auto_now_add, чтобы bulk_create сохранил даты из выгрузки"""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def to_datetime(value):
+    return parse_datetime(value) if value else timezone.now()
+
+
+class Command(BaseCommand):
+    """Потоковая загрузка JSONL, созданного export_blog: записи читаются построчно,
+    вставляются через bulk_create пачками, id связей пересчитываются на новые.
+    Пример: python manage.py import_blog blog.jsonl --batch-size 500 --default-author admin"""
+    help = 'Загружает содержимое блога из JSONL'
+    tree_references = {'category': 'parent', 'comment': 'parent'}
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Файл JSONL, "-" для чтения из stdin')
+        parser.add_argument('--batch-size', type=int, default=500, help='Количество объектов в одном bulk_create')
+        parser.add_argument('--default-author', help='Пользователь для записей, автор которых не найден')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        # Соответствие id из выгрузки новым id (для связей между объектами)
+        self.id_map = {'category': {}, 'post': {}, 'comment': {}}
+        # Деревья импортированных узлов (новый id -> tree_id) и следующий свободный tree_id
+        self.node_trees = {'category': {}, 'comment': {}}
+        self.next_tree_id = {}
+        self.user_ids = {}
+        self.default_author_id = None
+        if options['default_author']:
+            self.default_author_id = self.resolve_users([options['default_author']]).get(options['default_author'])
+            if self.default_author_id is None:
+                raise CommandError(f'Пользователь {options["default_author"]} не найден')
+        self.counts = {kind: 0 for kind in ('category', 'post', 'comment', 'rating', 'skipped')}
+        self.started = time.monotonic()
+
+        source = sys.stdin if options['input'] == '-' else open(options['input'], encoding='utf-8')
+        timestamps = [Post._meta.get_field('create'), Post._meta.get_field('update'),
+                      Comment._meta.get_field('time_create'), Comment._meta.get_field('time_update'),
+                      Rating._meta.get_field('time_create')]
+        try:
+            with transaction.atomic(), keep_timestamps(*timestamps), \
+                    Category.objects.disable_mptt_updates(), Comment.objects.disable_mptt_updates():
+                for kind, model in (('category', Category), ('comment', Comment)):
+                    self.next_tree_id[kind] = (model.objects.aggregate(value=Max('tree_id'))['value'] or 0) + 1
+                for kind, batch in self.read_batches(source):
+                    getattr(self, f'import_{kind}')(batch)
+                    self.report(kind)
+                # Границы пересчитываются один раз и только в созданных импортом деревьях:
+                # существующие деревья не перенумеровываются, время не зависит от размера таблицы
+                self.rebuild_trees(Category, set(self.node_trees['category'].values()))
+                self.rebuild_trees(Comment, set(self.node_trees['comment'].values()))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        self.finalize()
+        elapsed = time.monotonic() - self.started
+        imported = sum(count for kind, count in self.counts.items() if kind != 'skipped')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено объектов: {imported} за {elapsed:.1f} с ({imported / max(elapsed, 1e-6):.0f} объектов/с), '
+            f'пропущено: {self.counts["skipped"]}'))
+
+    def read_batches(self, lines):
+        """Генератор пачек (тип, записи): пачка закрывается при смене типа, по размеру,
+        а также если объект ссылается на родителя из еще не сохраненной пачки"""
+        kind, batch, pending_ids = None, [], set()
+        for line in lines:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            record_kind = record.pop('type')
+            parent_field = self.tree_references.get(record_kind)
+            if batch and (record_kind != kind or len(batch) >= self.batch_size
+                          or (parent_field and record.get(parent_field) in pending_ids)):
+                yield kind, batch
+                batch, pending_ids = [], set()
+            kind = record_kind
+            batch.append(record)
+            pending_ids.add(record.get('id'))
+        if batch:
+            yield kind, batch
+
+    def report(self, kind):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        total = sum(count for name, count in self.counts.items() if name != 'skipped')
+        self.stdout.write(f'{kind}: {self.counts[kind]}, всего {total} ({total / elapsed:.0f} объектов/с)')
+
+    def resolve_users(self, usernames):
+        """id пользователей по username, недостающие загружаются одним запросом"""
+        missing = {name for name in usernames if name and name not in self.user_ids}
+        if missing:
+            found = dict(User.objects.filter(username__in=missing).values_list('username', 'id'))
+            for name in missing:
+                self.user_ids[name] = found.get(name)
+        return {name: self.user_ids.get(name) for name in usernames if name}
+
+    def get_tree_id(self, kind, parent_id):
+        """tree_id нового узла: следующий свободный для корня, дерево родителя для остальных"""
+        if parent_id is not None:
+            return self.node_trees[kind][parent_id]
+        tree_id = self.next_tree_id[kind]
+        self.next_tree_id[kind] += 1
+        return tree_id
+
+    def rebuild_trees(self, model, tree_ids):
+        """Пересчет lft, rght и level в деревьях tree_ids: узлы читаются пачками деревьев,
+        обходятся в порядке order_insertion_by (или вставки) и сохраняются bulk_update"""
+        ordering = (*model._mptt_meta.order_insertion_by, 'pk')
+        tree_ids = sorted(tree_ids)
+        for start in range(0, len(tree_ids), self.batch_size):
+            nodes = list(model.objects.filter(tree_id__in=tree_ids[start:start + self.batch_size])
+                         .order_by(*ordering).only('pk', 'parent_id', 'tree_id'))
+            children = defaultdict(list)
+            for node in nodes:
+                children[node.parent_id].append(node)
+            for root in children[None]:
+                # Обход в глубину без рекурсии: глубина веток комментариев не ограничена
+                counter, stack = 1, [(root, 0, False)]
+                while stack:
+                    node, level, closed = stack.pop()
+                    if closed:
+                        node.rght = counter
+                    else:
+                        node.lft, node.level = counter, level
+                        stack.append((node, level, True))
+                        stack.extend((child, level + 1, False) for child in reversed(children[node.pk]))
+                    counter += 1
+            model.objects.bulk_update(nodes, ['lft', 'rght', 'level'], batch_size=self.batch_size)
+
+    def import_category(self, batch):
+        category_map = self.id_map['category']
+        objects = []
+        for record in batch:
+            parent_id = category_map.get(record['parent'])
+            objects.append(Category(title=record['title'], slug=record['slug'], description=record['description'],
+                                    parent_id=parent_id, tree_id=self.get_tree_id('category', parent_id),
+                                    **MPTT_PLACEHOLDERS))
+        allocate_unique_slugs(objects, 'title')
+        Category.objects.bulk_create(objects)
+        for record, obj in zip(batch, objects):
+            category_map[record['id']] = obj.pk
+            self.node_trees['category'][obj.pk] = obj.tree_id
+        self.counts['category'] += len(objects)
+
+    def import_post(self, batch):
+        users = self.resolve_users([record.get('author_username') for record in batch]
+                                   + [record.get('updater_username') for record in batch])
+        records, objects = [], []
+        for record in batch:
+            author_id = users.get(record.get('author_username')) or self.default_author_id
+            category_id = self.id_map['category'].get(record['category'])
+            if author_id is None or category_id is None:
+                self.counts['skipped'] += 1
+                continue
+            records.append(record)
+            objects.append(Post(
+                title=record['title'], slug=record['slug'], description=record['description'], text=record['text'],
+                category_id=category_id, thumbnail=record['thumbnail'], status=record['status'],
+                create=to_datetime(record['create']), update=to_datetime(record['update']),
+                author_id=author_id, updater_id=users.get(record.get('updater_username')), fixed=record['fixed'],
+            ))
+        allocate_unique_slugs(objects, 'title')
+        # bulk_create не вызывает save(), производные поля содержимого заполняются здесь
+        for obj in objects:
+            render_post(obj)
+        Post.objects.bulk_create(objects)
+        for record, obj in zip(records, objects):
+            self.id_map['post'][record['id']] = obj.pk
+        self.import_tags([(obj.pk, record.get('tags') or []) for record, obj in zip(records, objects)])
+        self.counts['post'] += len(objects)
+
+    def import_tags(self, post_tags):
+        """Теги пачки записей: существующие выбираются одним запросом, новые и связи создаются bulk_create"""
+        names = {name for _, tags in post_tags for name in tags}
+        if not names:
+            return
+        tag_ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+        new_tags = allocate_unique_slugs([Tag(name=name) for name in names if name not in tag_ids], 'name')
+        for tag in Tag.objects.bulk_create(new_tags):
+            tag_ids[tag.name] = tag.pk
+        content_type = ContentType.objects.get_for_model(Post)
+        TaggedItem.objects.bulk_create([TaggedItem(content_type=content_type, object_id=post_id, tag_id=tag_ids[name])
+                                        for post_id, tags in post_tags for name in tags])
+
+    def import_comment(self, batch):
+        users = self.resolve_users([record.get('author_username') for record in batch])
+        comment_map = self.id_map['comment']
+        records, objects = [], []
+        for record in batch:
+            author_id = users.get(record.get('author_username')) or self.default_author_id
+            post_id = self.id_map['post'].get(record['post'])
+            if author_id is None or post_id is None or (record['parent'] and record['parent'] not in comment_map):
+                self.counts['skipped'] += 1
+                continue
+            records.append(record)
+            parent_id = comment_map.get(record['parent'])
+            objects.append(Comment(
+                post_id=post_id, author_id=author_id, content=record['content'], status=record['status'],
+                time_create=to_datetime(record['time_create']), time_update=to_datetime(record['time_update']),
+                parent_id=parent_id, tree_id=self.get_tree_id('comment', parent_id), **MPTT_PLACEHOLDERS,
+            ))
+        Comment.objects.bulk_create(objects)
+        for record, obj in zip(records, objects):
+            comment_map[record['id']] = obj.pk
+            self.node_trees['comment'][obj.pk] = obj.tree_id
+        self.counts['comment'] += len(objects)
+
+    def import_rating(self, batch):
+        users = self.resolve_users([record.get('user_username') for record in batch])
+        objects = []
+        for record in batch:
+            post_id = self.id_map['post'].get(record['post'])
+            if post_id is None:
+                self.counts['skipped'] += 1
+                continue
+            objects.append(Rating(post_id=post_id, user_id=users.get(record.get('user_username')),
+                                  value=record['value'], ip_address=record['ip_address'],
+                                  time_create=to_datetime(record['time_create'])))
+        # Повторный голос с того же IP (unique_together) пропускается на стороне БД
+        Rating.objects.bulk_create(objects, ignore_conflicts=True)
+        self.counts['rating'] += len(objects)
+
+    def finalize(self):
+        """bulk_create не вызывает save() и сигналы, поэтому производные данные обновляются отдельно"""
+        if self.counts['rating']:
+            call_command('recount_ratings', stdout=self.stdout)
+            call_command('update_trending', rebuild_buckets=True, batch_size=self.batch_size, stdout=self.stdout)
+        if self.counts['category'] or self.counts['post']:
+            bump_cache_version('categories')
+            bump_cache_version('category-counts')
+        if self.counts['post']:
+            call_command('recount_tags', stdout=self.stdout)
+            call_command('rebuild_related_posts', batch_size=self.batch_size, stdout=self.stdout)
+        if self.counts['post'] and apps.is_installed('apps.search'):
+            call_command('rebuild_search_index', batch_size=self.batch_size, stdout=self.stdout)
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.blog import related
+from apps.blog.models import Post, RelatedPost
+
+
+class Command(BaseCommand):
+    """Полный пересчет таблицы похожих записей пачками по первичному ключу.
+    Пример: python manage.py rebuild_related_posts --batch-size 200"""
+    help = 'Пересчитывает похожие записи для всех опубликованных записей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Количество записей в одной пачке')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        # Ссылки черновиков удаляются сразу, пересчитываются только опубликованные записи
+        RelatedPost.objects.exclude(post__status='published').delete()
+        queryset = Post.objects.filter(status='published').order_by('pk').values_list('pk', flat=True)
+        last_pk, total = 0, 0
+        while batch := list(queryset.filter(pk__gt=last_pk)[:batch_size]):
+            related.rebuild(batch)
+            total += len(batch)
+            last_pk = batch[-1]
+            self.stdout.write(f'Пересчитано записей: {total} ({total / max(time.monotonic() - started, 1e-6):.0f}/с)')
+        self.stdout.write(self.style.SUCCESS(f'Похожие записи пересчитаны для записей: {total}'))
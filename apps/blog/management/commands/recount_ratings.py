@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.blog.models import Post
+
+
+class Command(BaseCommand):
+    """Пересчет денормализованных счетчиков рейтинга записей по таблице рейтинга.
+    Используется для исправления расхождений счетчиков: python manage.py recount_ratings"""
+    help = 'Пересчитывает счетчики лайков, дизлайков и суммы рейтинга записей'
+
+    def handle(self, *args, **options):
+        # Один UPDATE с коррелированными подзапросами, без загрузки записей в Python
+        updated = Post.recount_rating_counters()
+        self.stdout.write(self.style.SUCCESS(f'Счетчики рейтинга пересчитаны для записей: {updated}'))
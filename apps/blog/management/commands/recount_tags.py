@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from apps.blog import tag_counts
+
+
+class Command(BaseCommand):
+    """Пересчет количества опубликованных записей по всем тегам.
+    Используется после массовой загрузки или для исправления расхождений: python manage.py recount_tags"""
+    help = 'Пересчитывает количество записей по тегам'
+
+    def handle(self, *args, **options):
+        count = tag_counts.recount()
+        self.stdout.write(self.style.SUCCESS(f'Количество записей пересчитано для тегов: {count}'))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.blog.models import Post
+from apps.blog.rendering import RENDERED_FIELDS, render_post
+from apps.services.cache import bump_cache_version
+
+
+class Command(BaseCommand):
+    """Заполнение очищенного HTML, анонса и времени чтения для сохраненных записей пачками по первичному ключу.
+    Записи с неизменившимся хэшем содержимого пропускаются (после изменения RENDER_VERSION пересчитываются все).
+    Пример: python manage.py render_posts --batch-size 500"""
+    help = 'Пересчитывает производные поля содержимого записей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Количество записей в одной пачке')
+        parser.add_argument('--force', action='store_true', help='Пересчитать и записи с актуальным хэшем')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        queryset = Post.objects.order_by('pk').only('pk', 'description', 'text', 'content_hash')
+        last_pk, total, updated = 0, 0, 0
+        while batch := list(queryset.filter(pk__gt=last_pk)[:batch_size]):
+            changed = [post for post in batch if render_post(post, force=options['force'])]
+            Post.objects.bulk_update(changed, RENDERED_FIELDS)
+            total += len(batch)
+            updated += len(changed)
+            last_pk = batch[-1].pk
+            self.stdout.write(f'Обработано записей: {total}, обновлено: {updated} '
+                              f'({total / max(time.monotonic() - started, 1e-6):.0f}/с)')
+        if updated:
+            bump_cache_version('content')
+        self.stdout.write(self.style.SUCCESS(f'Обновлено записей: {updated} из {total}'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from apps.blog import trending
+
+
+class Command(BaseCommand):
+    """Пересчет очков популярности записей по почасовым итогам голосования.
+    Запускается периодически (например, cron раз в час): python manage.py update_trending
+    После миграции или импорта итоги строятся заново из голосов: python manage.py update_trending --rebuild-buckets"""
+    help = 'Пересчитывает рейтинг популярности записей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Количество записей в одном UPDATE')
+        parser.add_argument('--rebuild-buckets', action='store_true', help='Построить почасовые итоги из голосов')
+
+    def handle(self, *args, **options):
+        if options['rebuild_buckets']:
+            buckets = trending.rebuild_buckets(batch_size=options['batch_size'])
+            self.stdout.write(f'Почасовых итогов построено: {buckets}')
+        count = trending.recompute(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Рейтинг популярности пересчитан, записей: {count}'))
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.14 on 2026-10-18 06:32
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_rating_counters(apps, schema_editor):
+    # Копия Post.recount_rating_counters(): миграция не зависит от кода моделей
+    Post = apps.get_model('blog', 'Post')
+    Rating = apps.get_model('blog', 'Rating')
+    ratings = Rating.objects.filter(post=OuterRef('pk')).order_by().values('post')
+    Post.objects.update(
+        like_count=Coalesce(Subquery(ratings.filter(value=1).annotate(c=Count('pk')).values('c'),
+                                     output_field=IntegerField()), 0),
+        dislike_count=Coalesce(Subquery(ratings.filter(value=-1).annotate(c=Count('pk')).values('c'),
+                                        output_field=IntegerField()), 0),
+        rating_sum=Coalesce(Subquery(ratings.annotate(s=Sum('value')).values('s'),
+                                     output_field=IntegerField()), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='dislike_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество дизлайков'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество лайков'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='rating_sum',
+            field=models.IntegerField(default=0, verbose_name='Сумма рейтинга'),
+        ),
+        migrations.RunPython(fill_rating_counters, migrations.RunPython.noop),
+    ]
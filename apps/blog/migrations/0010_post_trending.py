@@ -0,0 +1,53 @@
+# Generated by Django 5.0.14 on 2026-10-18 06:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_post_status_update_index'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostRatingBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('likes', models.IntegerField(default=0, verbose_name='Лайки')),
+                ('dislikes', models.IntegerField(default=0, verbose_name='Дизлайки')),
+            ],
+            options={
+                'verbose_name': 'Итоги голосования за час',
+                'verbose_name_plural': 'Итоги голосования по часам',
+                'db_table': 'blog_post_rating_bucket',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='trending_score',
+            field=models.FloatField(default=0, verbose_name='Популярность'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-trending_score'], name='blog_post_trending_idx'),
+        ),
+        migrations.AddField(
+            model_name='postratingbucket',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rating_buckets', to='blog.post', verbose_name='Запись'),
+        ),
+        migrations.AddIndex(
+            model_name='postratingbucket',
+            index=models.Index(fields=['hour'], name='blog_post_r_hour_e07f40_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='postratingbucket',
+            unique_together={('post', 'hour')},
+        ),
+    ]
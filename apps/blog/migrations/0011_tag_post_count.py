@@ -0,0 +1,46 @@
+# Generated by Django 5.0.14 on 2026-10-18 06:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_tag_post_counts(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Post = apps.get_model('blog', 'Post')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    TagPostCount = apps.get_model('blog', 'TagPostCount')
+    content_type = ContentType.objects.filter(app_label='blog', model='post').first()
+    if content_type is None:
+        return
+    counts = (TaggedItem.objects.filter(content_type=content_type,
+                                        object_id__in=Post.objects.filter(status='published').values('pk'))
+              .order_by().values('tag_id').annotate(n=Count('object_id')).values_list('tag_id', 'n'))
+    TagPostCount.objects.bulk_create([TagPostCount(tag_id=tag_id, post_count=n) for tag_id, n in counts],
+                                     batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_post_trending'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagPostCount',
+            fields=[
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='post_count', serialize=False, to='taggit.tag', verbose_name='Тег')),
+                ('post_count', models.PositiveIntegerField(default=0, verbose_name='Количество записей')),
+            ],
+            options={
+                'verbose_name': 'Количество записей по тегу',
+                'verbose_name_plural': 'Количество записей по тегам',
+                'db_table': 'blog_tag_post_count',
+                'indexes': [models.Index(fields=['-post_count'], name='blog_tag_post_count_idx')],
+            },
+        ),
+        migrations.RunPython(fill_tag_post_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.14 on 2026-10-18 06:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_tag_post_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0, verbose_name='Оценка сходства')),
+                ('position', models.PositiveSmallIntegerField(default=0, verbose_name='Позиция')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='blog.post', verbose_name='Запись')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='referenced_by', to='blog.post', verbose_name='Похожая запись')),
+            ],
+            options={
+                'verbose_name': 'Похожая запись',
+                'verbose_name_plural': 'Похожие записи',
+                'db_table': 'blog_related_post',
+                'indexes': [models.Index(fields=['post', 'position'], name='blog_related_post_position_idx')],
+                'unique_together': {('post', 'related')},
+            },
+        ),
+    ]
@@ -1,12 +1,23 @@
 from django.db import models
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.core.validators import FileExtensionValidator
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
 from django.urls import reverse
+from django.core.cache import cache
+from django.utils.functional import cached_property
 from mptt.models import MPTTModel, TreeForeignKey   # Приложение для создания древовидной модели в админке
+from mptt.managers import TreeManager
+from apps.services.cache import get_cache_version
+from apps.services.images import get_variant_url
 from apps.services.utils import unique_slugify      # Генератор уникальных SLUG для моделей, в случае существования такого SLUG.
 from taggit.managers import TaggableManager         # Приложение для реализации функции тегов
+from taggit.models import Tag, TaggedItem
 from ckeditor.fields import RichTextField           # HTML-редактор
 
+from .rendering import render_post, RENDERED_FIELDS
+
 
 class PostManager(models.Manager):
     """Кастомный менеджер для модели постов"""
@@ -15,6 +26,17 @@ class PostManager(models.Manager):
         """Список постов (SQL запрос с фильтрацией по статусу опубликовано)"""
         return super().get_queryset().select_related('author', 'category').filter(status='published')
 
+    def by_tags(self, slugs, match_all=True):
+        """Опубликованные записи с несколькими тегами: все теги (match_all) или любой из них.
+        Связи тегов группируются в одном подзапросе по object_id вместо JOIN на каждый тег."""
+        slugs = set(slugs)
+        tagged = (TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(self.model),
+                                            tag__slug__in=slugs)
+                  .order_by().values('object_id'))
+        if match_all:
+            tagged = tagged.annotate(matched=models.Count('tag', distinct=True)).filter(matched=len(slugs))
+        return self.get_queryset().filter(pk__in=tagged.values('object_id'))
+
 
 class Post(models.Model):
     """Модель поста для приложения Блог"""
@@ -46,6 +68,19 @@ class Post(models.Model):
     updater = models.ForeignKey(to=User, verbose_name='Обновил', on_delete=models.SET_NULL, null=True,
                                 related_name='updater_posts', blank=True)
     fixed = models.BooleanField(verbose_name='Прикреплено', default=False)
+    # Денормализованные счетчики рейтинга, обновляются атомарно при голосовании (см. update_rating_counters)
+    like_count = models.PositiveIntegerField(verbose_name='Количество лайков', default=0)
+    dislike_count = models.PositiveIntegerField(verbose_name='Количество дизлайков', default=0)
+    rating_sum = models.IntegerField(verbose_name='Сумма рейтинга', default=0)
+    # Рейтинг популярности с затуханием по времени (см. apps.blog.trending)
+    trending_score = models.FloatField(verbose_name='Популярность', default=0)
+    # Производные поля содержимого, заполняются при сохранении (см. apps.blog.rendering)
+    description_html = models.TextField(verbose_name='Очищенное описание', blank=True, editable=False)
+    text_html = models.TextField(verbose_name='Очищенный текст', blank=True, editable=False)
+    excerpt = models.TextField(verbose_name='Анонс', blank=True, editable=False)
+    word_count = models.PositiveIntegerField(verbose_name='Количество слов', default=0, editable=False)
+    reading_time = models.PositiveSmallIntegerField(verbose_name='Время чтения (мин)', default=0, editable=False)
+    content_hash = models.CharField(verbose_name='Хэш содержимого', max_length=64, blank=True, editable=False)
     # Установка кастомного менеджера для модели
     objects = models.Manager()
     custom = PostManager()
@@ -56,13 +91,33 @@ class Post(models.Model):
         db_table = 'blog_post'
         ordering = ['-fixed', '-create']
         # Индексирование полей, чтобы ускорить результаты сортировки
-        indexes = [models.Index(fields=['-fixed', '-create', 'status'])]
+        indexes = [models.Index(fields=['-fixed', '-create', 'status']),
+                   # Индекс keyset-пагинации опубликованных записей: фильтр по статусу и порядок
+                   # (-fixed, -create, -id) без временной сортировки, в обе стороны обхода
+                   models.Index(fields=['status', '-fixed', '-create', '-id'], name='blog_post_status_cursor_idx'),
+                   # Индекс для RSS лент: последние обновленные опубликованные записи и дата последнего изменения
+                   models.Index(fields=['status', '-update'], name='blog_post_status_update_idx'),
+                   # Индекс для выборки самых популярных записей без сортировки всей таблицы
+                   models.Index(fields=['-trending_score'], name='blog_post_trending_idx')]
         verbose_name = 'Статья'
         verbose_name_plural = 'Статьи'
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминаем загруженные категорию и статус, чтобы сигналы могли определить их изменение без запроса"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {name: value for name, value in zip(field_names, values)
+                                   if name in ('category_id', 'status')}
+        return instance
+
+    def has_changed(self, field_name):
+        """Изменилось ли поле (category_id или status) с момента загрузки записи из БД"""
+        loaded_values = getattr(self, '_loaded_values', {})
+        return field_name not in loaded_values or loaded_values[field_name] != getattr(self, field_name)
+
     def get_absolute_url(self):
         """Получаем прямую ссылку на статью.
         Данный метод позволяет получать прямую ссылку на статью, без вызова {% url '' %}
@@ -71,13 +126,87 @@ class Post(models.Model):
         return reverse('post_detail', kwargs={'slug': self.slug})
 
     def save(self, *args, **kwargs):
-        """При сохранении генерируем слаг и проверяем на уникальность"""
+        """При сохранении генерируем слаг и проверяем на уникальность,
+        очищенный HTML и анонс пересчитываются только при изменении описания или текста"""
         self.slug = unique_slugify(self, self.title)
+        update_fields = kwargs.get('update_fields')
+        if render_post(self) and update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, *RENDERED_FIELDS}
         super().save(*args, **kwargs)
 
+    def get_related_posts(self):
+        """Похожие записи из предрассчитанной таблицы RelatedPost одним запросом по индексу (post, position)"""
+        return [link.related for link in self.related_links.select_related('related')
+                .filter(related__status='published').order_by('position')]
+
     def get_sum_rating(self):
-        """Функция подсчета суммы рейтинга"""
-        return sum([rating.value for rating in self.ratings.all()])
+        """Сумма рейтинга (хранится в записи, без дополнительных запросов к таблице рейтинга)"""
+        return self.rating_sum
+
+    @classmethod
+    def get_rating_counter_updates(cls, added=None, removed=None):
+        """F-выражения изменения счетчиков рейтинга для UPDATE.
+        added - значение добавленного голоса, removed - значение отозванного голоса (1 или -1)."""
+        likes = int(added == 1) - int(removed == 1)
+        dislikes = int(added == -1) - int(removed == -1)
+        total = (added or 0) - (removed or 0)
+        counters = {}
+        if likes:
+            counters['like_count'] = F('like_count') + likes
+        if dislikes:
+            counters['dislike_count'] = F('dislike_count') + dislikes
+        if total:
+            counters['rating_sum'] = F('rating_sum') + total
+        return counters
+
+    @classmethod
+    def update_rating_counters(cls, post_id, added=None, removed=None):
+        """Атомарное обновление счетчиков рейтинга на стороне БД через F-выражения.
+        Возвращает количество обновленных записей (0, если записи нет)"""
+        counters = cls.get_rating_counter_updates(added, removed)
+        return cls.objects.filter(pk=post_id).update(**counters) if counters else 0
+
+    @classmethod
+    def recount_rating_counters(cls, queryset=None):
+        """Пересчет счетчиков рейтинга по таблице рейтинга одним UPDATE с коррелированными подзапросами.
+        Возвращает количество обновленных записей"""
+        queryset = cls.objects.all() if queryset is None else queryset
+        ratings = Rating.objects.filter(post=OuterRef('pk')).order_by().values('post')
+        return queryset.update(
+            like_count=Coalesce(Subquery(ratings.filter(value=1).annotate(c=Count('pk')).values('c'),
+                                         output_field=IntegerField()), 0),
+            dislike_count=Coalesce(Subquery(ratings.filter(value=-1).annotate(c=Count('pk')).values('c'),
+                                            output_field=IntegerField()), 0),
+            rating_sum=Coalesce(Subquery(ratings.annotate(s=Sum('value')).values('s'),
+                                         output_field=IntegerField()), 0),
+        )
+
+    @classmethod
+    async def aupdate_rating_counters(cls, post_id, added=None, removed=None):
+        """Асинхронный вариант update_rating_counters()"""
+        counters = cls.get_rating_counter_updates(added, removed)
+        if counters:
+            await cls.objects.filter(pk=post_id).aupdate(**counters)
+
+
+class CategoryManager(TreeManager):
+    """Менеджер категорий"""
+
+    def get_tree_with_post_counts(self):
+        """Дерево категорий с количеством опубликованных записей во всем поддереве (post_count).
+        Подсчет выполняется в том же запросе подзапросом по границам lft/rght."""
+        return self.add_related_count(self.all(), Post, 'category', 'post_count', cumulative=True,
+                                      extra_filters={'status': 'published'})
+
+    def get_cached_by_slug(self, slug):
+        """Категория по slug из кэша (ключ зависит от версии дерева категорий), None если категории нет"""
+        cache_key = f'category-slug-{get_cache_version("categories")}-{slug}'
+        category = cache.get(cache_key)
+        if category is None:
+            # False кэшируется для несуществующего slug, чтобы не повторять запрос
+            category = self.filter(slug=slug).first() or False
+            cache.set(cache_key, category, 60 * 60)
+        return category or None
 
 
 class Category(MPTTModel):
@@ -94,6 +223,8 @@ class Category(MPTTModel):
                             verbose_name='Родительская категория'
                             )
 
+    objects = CategoryManager()
+
     class MPTTMeta:
         """Сортировка по вложенности"""
         order_insertion_by = ('title',)
@@ -103,16 +234,97 @@ class Category(MPTTModel):
         verbose_name = 'Категория'
         verbose_name_plural = 'Категории'
         db_table = 'app_categories'
+        # Индекс для выборки поддерева по диапазону lft/rght внутри дерева
+        indexes = [models.Index(fields=['tree_id', 'lft'], name='app_categories_tree_lft_idx')]
 
     def get_absolute_url(self):
         """Получаем прямую ссылку на категорию (нужно для упрощенного получения ссылки в templates)"""
         return reverse('post_by_category', kwargs={'slug': self.slug})
 
+    def get_posts(self):
+        """Опубликованные записи категории и всех ее потомков одним запросом (JOIN по диапазону tree_id/lft/rght)"""
+        return Post.custom.filter(category__tree_id=self.tree_id,
+                                  category__lft__gte=self.lft,
+                                  category__lft__lte=self.rght)
+
     def __str__(self):
         """Возвращение заголовка категории"""
         return self.title
 
 
+class CommentTreePage:
+    """Страница дерева комментариев с ограничением глубины.
+    Запрос выполняется лениво при первом обращении, поэтому при попадании в кэш фрагмента запросов нет."""
+
+    def __init__(self, queryset, max_level, limit=None):
+        self.queryset = queryset
+        self.max_level = max_level
+        self.limit = limit
+
+    @cached_property
+    def _page(self):
+        """Узлы дерева; при выборке limit + 1 корней лишнее дерево отбрасывается и служит признаком следующей страницы"""
+        nodes = list(self.queryset)
+        if self.limit is not None:
+            tree_ids = sorted({node.tree_id for node in nodes})
+            if len(tree_ids) > self.limit:
+                next_cursor = tree_ids[self.limit - 1]
+                return [node for node in nodes if node.tree_id <= next_cursor], next_cursor
+        return nodes, None
+
+    @property
+    def nodes(self):
+        return self._page[0]
+
+    @property
+    def next_cursor(self):
+        """tree_id последнего корня страницы, если есть следующая страница"""
+        return self._page[1]
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+class CommentManager(TreeManager):
+    """Менеджер древовидных комментариев"""
+    # Количество корневых комментариев на странице и глубина ответов, загружаемых сразу
+    page_size = 20
+    depth = 2
+
+    def get_post_tree(self, post_id):
+        """Все дерево комментариев записи одним запросом: автор и профиль подгружаются через JOIN,
+        порядок tree_id/lft нужен для построения дерева без дополнительных запросов (recursetree)"""
+        return self.filter(post_id=post_id).select_related('author', 'author__profile').order_by('tree_id', 'lft')
+
+    def get_root_page(self, post_id, after=None, limit=None, depth=None):
+        """Страница корневых комментариев (у каждого корня свой tree_id) вместе с ответами до заданной глубины.
+        Корни выбираются подзапросом по tree_id, поэтому вся страница загружается одним запросом."""
+        limit = limit or self.page_size
+        depth = self.depth if depth is None else depth
+        roots = self.filter(post_id=post_id, level=0).order_by('tree_id')
+        if after is not None:
+            roots = roots.filter(tree_id__gt=after)
+        queryset = self.get_post_tree(post_id).filter(
+            tree_id__in=roots.values('tree_id')[:limit + 1],
+            level__lte=depth,
+        )
+        return CommentTreePage(queryset, max_level=depth, limit=limit)
+
+    def get_subtree_page(self, node, depth=None):
+        """Потомки комментария до заданной глубины одним запросом по диапазону tree_id/lft/rght"""
+        depth = self.depth if depth is None else depth
+        queryset = self.get_post_tree(node.post_id).filter(
+            tree_id=node.tree_id,
+            lft__gt=node.lft,
+            rght__lt=node.rght,
+            level__lte=node.level + depth,
+        )
+        return CommentTreePage(queryset, max_level=node.level + depth)
+
+
 class Comment(MPTTModel):
     """Модель древовидных комментариев"""
 
@@ -135,6 +347,8 @@ class Comment(MPTTModel):
                             related_name='children',
                             on_delete=models.CASCADE)
 
+    objects = CommentManager()
+
     class MTTMeta:
         """Сортировка по вложенности"""
         order_insertion_by = ('-time_create')
@@ -142,12 +356,30 @@ class Comment(MPTTModel):
     class Meta:
         """Сортировка, название модели в админ панели, таблица с данными"""
         ordering = ['-time_create']
+        # Индекс для выборки дерева и поддеревьев комментариев записи по диапазону lft/rght
+        indexes = [models.Index(fields=['post', 'tree_id', 'lft'], name='blog_comment_post_tree_idx'),
+                   # Индексы для списка комментариев в админке: сортировка и фильтры по статусу и дате
+                   models.Index(fields=['-time_create'], name='blog_comment_time_idx'),
+                   models.Index(fields=['status', '-time_create'], name='blog_comment_status_time_idx')]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
     def __str__(self):
         return f'{self.author}: {self.content}'
 
+    def get_json_data(self):
+        """Данные комментария для AJAX-ответов (формат, который ожидает comments.js)"""
+        return {
+            'is_child': self.is_child_node(),
+            'id': self.id,
+            'author': self.author.username,
+            'parent_id': self.parent_id,
+            'time_create': self.time_create.strftime('%Y-%m-%d %H:%M:%S'),
+            'avatar': get_variant_url(self.author.profile.avatar.name, 'avatar', 120),
+            'content': self.content,
+            'get_absolute_url': self.author.profile.get_absolute_url()
+        }
+
 
 class Rating(models.Model):
     """Модель рейтинга: Лайк - Дизлайк"""
@@ -170,3 +402,59 @@ class Rating(models.Model):
 
     def __str__(self):
         return self.post.title
+
+
+class PostRatingBucket(models.Model):
+    """Почасовые итоги голосования по записи: поддерживаются инкрементально при голосовании
+    и используются для расчета популярности без просмотра всей таблицы рейтинга"""
+    post = models.ForeignKey(to=Post, verbose_name='Запись', on_delete=models.CASCADE, related_name='rating_buckets')
+    hour = models.DateTimeField(verbose_name='Час')
+    likes = models.IntegerField(verbose_name='Лайки', default=0)
+    dislikes = models.IntegerField(verbose_name='Дизлайки', default=0)
+
+    class Meta:
+        db_table = 'blog_post_rating_bucket'
+        unique_together = ('post', 'hour')
+        indexes = [models.Index(fields=['hour'])]
+        verbose_name = 'Итоги голосования за час'
+        verbose_name_plural = 'Итоги голосования по часам'
+
+    def __str__(self):
+        return f'{self.post_id}: {self.hour:%Y-%m-%d %H:00}'
+
+
+class TagPostCount(models.Model):
+    """Количество опубликованных записей по тегу для облака тегов.
+    Поддерживается сигналами при изменении тегов, статуса и удалении записи (см. apps.blog.tag_counts)"""
+    tag = models.OneToOneField(to=Tag, verbose_name='Тег', on_delete=models.CASCADE, primary_key=True,
+                               related_name='post_count')
+    post_count = models.PositiveIntegerField(verbose_name='Количество записей', default=0)
+
+    class Meta:
+        db_table = 'blog_tag_post_count'
+        indexes = [models.Index(fields=['-post_count'], name='blog_tag_post_count_idx')]
+        verbose_name = 'Количество записей по тегу'
+        verbose_name_plural = 'Количество записей по тегам'
+
+    def __str__(self):
+        return f'{self.tag_id}: {self.post_count}'
+
+
+class RelatedPost(models.Model):
+    """Предрассчитанные похожие записи (top-K по общим тегам и близости категорий в дереве).
+    Пересчитываются для затронутых записей при изменении тегов, категории или статуса (см. apps.blog.related)"""
+    post = models.ForeignKey(to=Post, verbose_name='Запись', on_delete=models.CASCADE, related_name='related_links')
+    related = models.ForeignKey(to=Post, verbose_name='Похожая запись', on_delete=models.CASCADE,
+                                related_name='referenced_by')
+    score = models.FloatField(verbose_name='Оценка сходства', default=0)
+    position = models.PositiveSmallIntegerField(verbose_name='Позиция', default=0)
+
+    class Meta:
+        db_table = 'blog_related_post'
+        unique_together = ('post', 'related')
+        indexes = [models.Index(fields=['post', 'position'], name='blog_related_post_position_idx')]
+        verbose_name = 'Похожая запись'
+        verbose_name_plural = 'Похожие записи'
+
+    def __str__(self):
+        return f'{self.post_id} -> {self.related_id}'
@@ -0,0 +1,142 @@
+"""Предрассчитанные похожие записи (таблица RelatedPost).
+
+Сходство = количество общих тегов + CATEGORY_WEIGHT / (1 + расстояние между категориями в дереве),
+где расстояние - число ребер между категориями через ближайшего общего предка (категории разных
+деревьев не сближают записи). Кандидаты выбираются двумя ограниченными запросами: сгруппированным
+по общим тегам и последними записями из поддерева родительской категории.
+
+При изменении записи пересчитываются только затронутые записи: сама запись, записи, которые
+сейчас ссылаются на нее, и ее новые похожие записи. Пересчет откладывается до фиксации
+транзакции и выполняется один раз для всех изменений транзакции."""
+import threading
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Category, Post, RelatedPost, TaggedItem
+
+CATEGORY_WEIGHT = 1.5
+# Сколько кандидатов каждого вида рассматривается для одной записи
+CANDIDATES_LIMIT = 50
+
+_pending = threading.local()
+
+
+def get_limit():
+    return getattr(settings, 'RELATED_POSTS_LIMIT', 5)
+
+
+class CategoryDistance:
+    """Расстояние между категориями по загруженному один раз дереву (категорий немного)"""
+
+    def __init__(self):
+        self.parents = dict(Category.objects.values_list('pk', 'parent_id'))
+        self._ancestors = {}
+
+    def ancestors(self, category_id):
+        """Цепочка от категории до корня (включая саму категорию)"""
+        chain = self._ancestors.get(category_id)
+        if chain is None:
+            chain, current = [], category_id
+            while current is not None:
+                chain.append(current)
+                current = self.parents.get(current)
+            self._ancestors[category_id] = chain
+        return chain
+
+    def __call__(self, first, second):
+        if first == second:
+            return 0
+        first_chain, second_chain = self.ancestors(first), self.ancestors(second)
+        positions = {category_id: index for index, category_id in enumerate(first_chain)}
+        for index, category_id in enumerate(second_chain):
+            if category_id in positions:
+                return positions[category_id] + index
+        return None
+
+
+def get_tagged_items():
+    return TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(Post))
+
+
+def compute(post, distance, tagged_items):
+    """Список (оценка, id похожей записи) для одной записи, лучшие get_limit() штук"""
+    scores = {}
+    tag_ids = [tag_id for tag_id, object_id in tagged_items if object_id == post.pk]
+    if tag_ids:
+        shared = (get_tagged_items().filter(tag_id__in=tag_ids,
+                                            object_id__in=Post.objects.filter(status='published').values('pk'))
+                  .exclude(object_id=post.pk).order_by().values('object_id')
+                  .annotate(shared=Count('tag_id')).order_by('-shared')[:CANDIDATES_LIMIT])
+        for row in shared:
+            scores[row['object_id']] = row['shared']
+    category = post.category
+    scope = category.parent if category.parent_id else category
+    nearby = (scope.get_posts().exclude(pk=post.pk).order_by('-create')
+              .values_list('pk', 'category_id')[:CANDIDATES_LIMIT])
+    category_ids = dict(nearby)
+    if scores:
+        category_ids.update(Post.objects.filter(pk__in=[pk for pk in scores if pk not in category_ids])
+                            .values_list('pk', 'category_id'))
+    for related_id, category_id in category_ids.items():
+        steps = distance(post.category_id, category_id)
+        if steps is not None:
+            scores[related_id] = scores.get(related_id, 0) + CATEGORY_WEIGHT / (1 + steps)
+    # При равной оценке выше более новая запись (больший id)
+    ranked = sorted(((score, related_id) for related_id, score in scores.items()),
+                    key=lambda item: (-item[0], -item[1]))
+    return ranked[:get_limit()]
+
+
+def rebuild(post_ids):
+    """Пересчет похожих записей для записей post_ids. Возвращает множество пересчитанных id."""
+    post_ids = set(post_ids)
+    if not post_ids:
+        return post_ids
+    # Категория и ее родитель нужны compute() для выбора записей-кандидатов
+    posts = list(Post.objects.select_related('category__parent').filter(pk__in=post_ids))
+    distance = CategoryDistance()
+    tagged_items = list(get_tagged_items().filter(object_id__in=[post.pk for post in posts])
+                        .values_list('tag_id', 'object_id'))
+    links = []
+    for post in posts:
+        if post.status != 'published':
+            continue
+        for position, (score, related_id) in enumerate(compute(post, distance, tagged_items)):
+            links.append(RelatedPost(post_id=post.pk, related_id=related_id, score=score, position=position))
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id__in=post_ids).delete()
+        RelatedPost.objects.bulk_create(links)
+    return post_ids
+
+
+def update_for(post_id):
+    """Пересчет после изменения записи: сама запись, ссылающиеся на нее записи и ее новые похожие записи"""
+    referrers = set(RelatedPost.objects.filter(related_id=post_id).values_list('post_id', flat=True))
+    rebuild({post_id} | referrers)
+    neighbours = set(RelatedPost.objects.filter(post_id=post_id).values_list('related_id', flat=True))
+    rebuild(neighbours - referrers)
+
+
+def schedule(post_id, referrers=()):
+    """Отложенный до фиксации транзакции пересчет, несколько изменений одной записи объединяются:
+    первый выполненный обработчик забирает все накопленные id, остальные ничего не делают.
+    referrers - записи, которые ссылались на удаленную запись (пересчитываются напрямую)."""
+    if not hasattr(_pending, 'post_ids'):
+        _pending.post_ids, _pending.referrers = set(), set()
+    _pending.post_ids.add(post_id)
+    _pending.referrers.update(referrers)
+    transaction.on_commit(_flush)
+
+
+def _flush():
+    post_ids, referrers = _pending.post_ids, _pending.referrers
+    if not post_ids and not referrers:
+        return
+    _pending.post_ids, _pending.referrers = set(), set()
+    existing = set(Post.objects.filter(pk__in=post_ids).values_list('pk', flat=True))
+    for post_id in existing:
+        update_for(post_id)
+    rebuild(referrers - existing)
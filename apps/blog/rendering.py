@@ -0,0 +1,47 @@
+"""Подготовка содержимого записи при сохранении: очищенный HTML описания и текста, анонс простым текстом,
+количество слов и время чтения.
+
+Результат привязан к хэшу исходного описания, текста и RENDER_VERSION: если содержимое не менялось,
+повторное сохранение не выполняет обработку. При изменении правил обработки увеличивается
+RENDER_VERSION, и команда render_posts пересчитывает сохраненные записи."""
+import hashlib
+import math
+import re
+
+from django.utils.text import Truncator
+
+from apps.services.sanitizer import html_to_text, sanitize_html
+
+RENDER_VERSION = 1
+RENDERED_FIELDS = ('description_html', 'text_html', 'excerpt', 'word_count', 'reading_time', 'content_hash')
+EXCERPT_WORDS = 40
+WORDS_PER_MINUTE = 200
+
+
+def get_content_hash(description, text):
+    data = f'{RENDER_VERSION}\0{description or ""}\0{text or ""}'
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def render_content(description, text):
+    """Производные поля записи из исходного HTML"""
+    description_text = html_to_text(description)
+    text_text = html_to_text(text)
+    word_count = len(re.findall(r'\w+', f'{description_text} {text_text}'))
+    return {
+        'description_html': sanitize_html(description),
+        'text_html': sanitize_html(text),
+        'excerpt': Truncator(description_text or text_text).words(EXCERPT_WORDS, truncate='…'),
+        'word_count': word_count,
+        'reading_time': max(1, math.ceil(word_count / WORDS_PER_MINUTE)),
+        'content_hash': get_content_hash(description, text),
+    }
+
+
+def render_post(post, force=False):
+    """Заполняет производные поля записи, если содержимое изменилось. Возвращает True, если поля обновлены"""
+    if not force and post.content_hash == get_content_hash(post.description, post.text):
+        return False
+    for name, value in render_content(post.description, post.text).items():
+        setattr(post, name, value)
+    return True
@@ -0,0 +1,130 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from mptt.signals import node_moved
+
+from apps.services.cache import bump_cache_version
+from apps.services.images import schedule_variants
+from . import live, related, tag_counts
+from .models import Post, Category, Comment, Rating
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(node_moved, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    """Сброс кэша дерева категорий при изменении, перемещении или удалении категории"""
+    bump_cache_version('categories')
+
+
+@receiver(post_save, sender=Post)
+def invalidate_category_counts(sender, instance, created, **kwargs):
+    """Количество записей в категориях пересчитывается только при смене категории или статуса записи"""
+    if created:
+        changed = instance.status == 'published'
+    else:
+        changed = instance.has_changed('category_id') or instance.has_changed('status')
+    if changed:
+        bump_cache_version('category-counts')
+
+
+@receiver(post_save, sender=Post)
+def update_tag_counts_on_status(sender, instance, created, **kwargs):
+    """Публикация или снятие с публикации меняет количество записей у всех тегов записи"""
+    if not created and instance.has_changed('status'):
+        tag_counts.recount(tag_counts.get_post_tag_ids(instance))
+
+
+@receiver(post_save, sender=Post)
+def update_related_posts(sender, instance, created, **kwargs):
+    """Похожие записи пересчитываются при публикации новой записи, смене категории или статуса"""
+    if (created and instance.status == 'published') or \
+            (not created and (instance.has_changed('category_id') or instance.has_changed('status'))):
+        related.schedule(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def create_thumbnail_variants(sender, instance, **kwargs):
+    """Уменьшенные копии и WebP изображения записи создаются в фоне, если еще не готовы"""
+    schedule_variants(instance.thumbnail.name, 'thumbnail')
+
+
+@receiver(post_save, sender=Post)
+def remember_loaded_values(sender, instance, **kwargs):
+    """Новые значения становятся исходными для следующего сохранения того же объекта.
+    Регистрируется последним среди обработчиков post_save записи, которые используют has_changed()"""
+    instance._loaded_values = {'category_id': instance.category_id, 'status': instance.status}
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_category_counts_on_delete(sender, instance, **kwargs):
+    if instance.status == 'published':
+        bump_cache_version('category-counts')
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def update_tag_counts(sender, instance, action, pk_set, **kwargs):
+    """Пересчет счетчиков только для добавленных или удаленных тегов опубликованной записи.
+    При очистке тегов (pk_set=None) их id запоминаются до удаления.
+    Похожие записи пересчитываются после фиксации транзакции."""
+    if not isinstance(instance, Post) or instance.status != 'published':
+        return
+    if action == 'pre_clear':
+        instance._cleared_tag_ids = tag_counts.get_post_tag_ids(instance)
+    elif action == 'post_clear':
+        tag_counts.recount(instance.__dict__.pop('_cleared_tag_ids', set()))
+    elif action in ('post_add', 'post_remove'):
+        tag_counts.recount(pk_set)
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        related.schedule(instance.pk)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_deleted_post_tags(sender, instance, **kwargs):
+    """Связи тегов удаляются вместе с записью, поэтому их id запоминаются до удаления"""
+    if instance.status == 'published':
+        instance._deleted_tag_ids = tag_counts.get_post_tag_ids(instance)
+        # Записи, у которых удаляемая запись была в похожих, пересчитываются после удаления
+        related.schedule(instance.pk, referrers=instance.referenced_by.values_list('post_id', flat=True))
+
+
+@receiver(post_delete, sender=Post)
+def update_tag_counts_on_delete(sender, instance, **kwargs):
+    tag_counts.recount(instance.__dict__.pop('_deleted_tag_ids', set()))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_page_cache(sender, **kwargs):
+    """Сброс кэша страниц для анонимных пользователей после фиксации транзакции,
+    чтобы страница не закэшировалась со старыми данными под новой версией"""
+    transaction.on_commit(lambda: bump_cache_version('content'))
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def invalidate_page_cache_ratings(sender, **kwargs):
+    """Голосование не сбрасывает кэш страниц сразу, а помечает счетчики рейтинга как устаревшие
+    (см. PAGE_CACHE_RATING_STALENESS)"""
+    transaction.on_commit(lambda: bump_cache_version('ratings'))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(node_moved, sender=Comment)
+def invalidate_comments_tree(sender, instance, **kwargs):
+    """Сброс кэша отрендеренного дерева комментариев записи при добавлении, изменении (в том числе
+    модерации в админке), перемещении или удалении комментария"""
+    post_id = instance.post_id
+    transaction.on_commit(lambda: bump_cache_version(f'comments-{post_id}'))
+
+
+@receiver(post_save, sender=Comment)
+def publish_new_comment(sender, instance, created, **kwargs):
+    """Новый комментарий отправляется подписчикам страницы записи после фиксации транзакции"""
+    if created:
+        transaction.on_commit(lambda: live.publish_comment(instance))
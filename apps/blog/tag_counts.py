@@ -0,0 +1,55 @@
+"""Денормализованное количество опубликованных записей по тегам (таблица TagPostCount).
+
+Счетчики пересчитываются только для затронутых тегов одним сгруппированным запросом,
+поэтому не расходятся при повторных или параллельных изменениях. Облако тегов читает
+готовые значения по индексу post_count, отрендеренный блок кэширует шаблонный тег tag_cloud
+по версии "tag-counts", которую увеличивает recount()."""
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count
+
+from apps.services.cache import bump_cache_version
+from .models import Post, TagPostCount, TaggedItem
+
+CLOUD_WEIGHTS = 5
+
+
+def get_post_tag_ids(post):
+    """id тегов записи (без загрузки самих тегов)"""
+    return set(TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(Post), object_id=post.pk)
+               .values_list('tag_id', flat=True))
+
+
+def recount(tag_ids=None):
+    """Пересчет количества опубликованных записей для тегов tag_ids (None - для всех тегов).
+    Возвращает количество тегов с записями."""
+    if tag_ids is not None and not tag_ids:
+        return 0
+    tagged = TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(Post),
+                                       object_id__in=Post.objects.filter(status='published').values('pk'))
+    stale = TagPostCount.objects.all()
+    if tag_ids is not None:
+        tagged = tagged.filter(tag_id__in=tag_ids)
+        stale = stale.filter(tag_id__in=tag_ids)
+    counts = [TagPostCount(tag_id=tag_id, post_count=post_count)
+              for tag_id, post_count in tagged.order_by().values('tag_id').annotate(n=Count('object_id'))
+              .values_list('tag_id', 'n')]
+    with transaction.atomic():
+        stale.exclude(tag_id__in=[count.tag_id for count in counts]).delete()
+        TagPostCount.objects.bulk_create(counts, update_conflicts=True, unique_fields=['tag'],
+                                         update_fields=['post_count'])
+    transaction.on_commit(lambda: bump_cache_version('tag-counts'))
+    return len(counts)
+
+
+def get_tag_cloud(limit=30):
+    """Самые используемые теги с весом от 1 до CLOUD_WEIGHTS, отсортированные по названию"""
+    counts = list(TagPostCount.objects.select_related('tag').filter(post_count__gt=0)
+                  .order_by('-post_count', 'tag__name')[:limit])
+    if not counts:
+        return []
+    low, high = counts[-1].post_count, counts[0].post_count
+    spread = max(high - low, 1)
+    return sorted(({'name': count.tag.name, 'slug': count.tag.slug, 'post_count': count.post_count,
+                    'weight': 1 + (count.post_count - low) * (CLOUD_WEIGHTS - 1) // spread}
+                   for count in counts), key=lambda item: item['name'].lower())
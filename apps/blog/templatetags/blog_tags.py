@@ -0,0 +1,46 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from apps.services.cache import get_cache_version
+from .. import tag_counts, trending
+from ..models import Category
+
+register = template.Library()
+
+
+@register.simple_tag
+def category_tree():
+    """Дерево категорий для сайдбара с количеством записей.
+    HTML кэшируется по версиям структуры дерева и счетчиков записей, которые сбрасываются сигналами."""
+    cache_key = f'sidebar-category-tree-{get_cache_version("categories")}-{get_cache_version("category-counts")}'
+    html = cache.get(cache_key)
+    if html is None:
+        categories = Category.objects.get_tree_with_post_counts()
+        html = render_to_string('blog/includes/category_tree.html', {'categories': categories})
+        cache.set(cache_key, html, 60 * 60 * 24)
+    return mark_safe(html)
+
+
+@register.simple_tag
+def trending_posts(limit=5):
+    """Блок популярных записей для сайдбара, кэшируется на несколько минут"""
+    cache_key = f'sidebar-trending-{limit}'
+    html = cache.get(cache_key)
+    if html is None:
+        html = render_to_string('blog/includes/trending_posts.html', {'posts': trending.get_trending_posts(limit)})
+        cache.set(cache_key, html, 60 * 5)
+    return mark_safe(html)
+
+
+@register.simple_tag
+def tag_cloud(limit=30):
+    """Облако тегов для сайдбара по таблице количества записей.
+    Единственный уровень кэша: HTML по версии счетчиков "tag-counts", которую увеличивает tag_counts.recount()"""
+    cache_key = f'sidebar-tag-cloud-{get_cache_version("tag-counts")}-{limit}'
+    html = cache.get(cache_key)
+    if html is None:
+        html = render_to_string('blog/includes/tag_cloud.html', {'tags': tag_counts.get_tag_cloud(limit)})
+        cache.set(cache_key, html, 60 * 60 * 24)
+    return mark_safe(html)
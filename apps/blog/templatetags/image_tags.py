@@ -0,0 +1,24 @@
+from django import template
+
+from apps.services.images import build_srcset, fallback_extension
+
+register = template.Library()
+
+
+@register.simple_tag
+def srcset(image, kind, extension=None):
+    """Атрибут srcset готовых вариантов изображения: {% srcset post.thumbnail 'thumbnail' 'webp' %}"""
+    if not image:
+        return ''
+    return build_srcset(image.name, kind, extension or fallback_extension(image.name))
+
+
+@register.inclusion_tag('includes/picture.html')
+def picture(image, kind, alt='', sizes='100vw', css_class='', style=''):
+    """<picture> с WebP и запасным форматом: {% picture post.thumbnail 'thumbnail' alt=post.title sizes='33vw' %}
+    Пока варианты не созданы, выводится исходное изображение."""
+    context = {'src': image.url if image else '', 'alt': alt, 'sizes': sizes, 'css_class': css_class, 'style': style}
+    if image:
+        context['webp_srcset'] = build_srcset(image.name, kind, 'webp')
+        context['srcset'] = build_srcset(image.name, kind, fallback_extension(image.name))
+    return context
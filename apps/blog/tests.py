@@ -1,3 +1,721 @@
-from django.test import TestCase
+import os
+import tempfile
+from unittest import mock
+from datetime import datetime, timedelta, timezone
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.template import Context, Template
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from taggit.models import Tag
+
+from apps.services.pagination import CursorPaginator
+from apps.services import images, throttle
+from apps.services.cache import get_cache_version
+from apps.services.sanitizer import clean_style, clean_url, html_to_text, sanitize_html
+from apps.services.utils import allocate_unique_slugs, unique_slugify
+from .models import Category, Comment, Post, Rating, TagPostCount, TaggedItem
+
+# Тесты не используют файловый кэш проекта
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-shared'},
+}
+# Без вариантов изображений: обработчики post_save не пишут файлы в MEDIA_ROOT проекта
+TEST_SETTINGS = {'CACHES': TEST_CACHES, 'IMAGE_VARIANT_WIDTHS': {}}
+
+
+def create_posts(count, title=None, **fields):
+    """Опубликованные записи одного автора в одной категории (без title - с разными заголовками)"""
+    author = User.objects.get_or_create(username='author')[0]
+    category = Category.objects.get_or_create(slug='category', defaults={'title': 'Категория',
+                                                                         'description': 'Описание'})[0]
+    fields = {'description': '<p>Описание</p>', 'text': '<p>Текст</p>', 'author': author, 'category': category,
+              **fields}
+    return [Post.objects.create(title=title or f'Запись {index}', **fields) for index in range(count)]
+
+
+class SanitizerTests(SimpleTestCase):
+    """Очистка HTML записи: векторы XSS и сохранение разрешенной разметки"""
+
+    def assertSafe(self, html, expected):
+        self.assertEqual(sanitize_html(html), expected)
+
+    def test_script_and_embedded_content_removed_with_content(self):
+        self.assertSafe('<script>alert(1)</script>ok', 'ok')
+        self.assertSafe('<p>a<style>p{}</style><iframe src="https://evil">x</iframe>b</p>', '<p>ab</p>')
+        self.assertSafe('<SCRIPT SRC=//evil/x.js></SCRIPT>ok', 'ok')
+        self.assertNotIn('<script', sanitize_html('<scr<script>ipt>alert(1)</script>'))
+
+    def test_event_handler_attributes_removed(self):
+        self.assertSafe('<img src="a.png" onerror="alert(1)">', '<img src="a.png">')
+        self.assertSafe('<p onclick="alert(1)" ONMOUSEOVER="alert(2)">x</p>', '<p>x</p>')
+        self.assertSafe('<svg onload=alert(1)><b>x</b></svg>', '<b>x</b>')
+
+    def test_dangerous_url_schemes_removed(self):
+        for href in ('javascript:alert(1)', ' JaVaScRiPt:alert(1)', 'jav&#x09;ascript:alert(1)',
+                     'java\nscript:alert(1)', '&#106;avascript:alert(1)', 'data:text/html;base64,PHNjcmlwdD4=',
+                     'vbscript:msgbox(1)'):
+            with self.subTest(href=href):
+                self.assertSafe(f'<a href="{href}">x</a>', '<a>x</a>')
+        self.assertSafe('<img src="javascript:alert(1)">', '<img>')
+
+    def test_safe_urls_kept(self):
+        self.assertSafe('<a href="https://example.com/?a=1&amp;b=2">x</a>',
+                        '<a href="https://example.com/?a=1&amp;b=2">x</a>')
+        self.assertSafe('<a href="/post/slug/">x</a>', '<a href="/post/slug/">x</a>')
+        self.assertEqual(clean_url('mailto:user@example.com'), 'mailto:user@example.com')
+        self.assertIsNone(clean_url('javascript:void(0)'))
+
+    def test_attribute_values_cannot_break_out_of_quotes(self):
+        self.assertSafe('<p title=\'" onmouseover="alert(1)\'>x</p>',
+                        '<p title="&quot; onmouseover=&quot;alert(1)">x</p>')
+
+    def test_style_filtered_by_property_and_value(self):
+        self.assertEqual(clean_style('color: red; background: url(javascript:alert(1)); position: fixed'),
+                         'color: red')
+        self.assertIsNone(clean_style('width: expression(alert(1))'))
+        self.assertSafe('<span style="background-color: url(x)">x</span>', '<span>x</span>')
+
+    def test_text_escaped_and_tags_closed(self):
+        self.assertSafe('&lt;script&gt;alert(1)&lt;/script&gt;', '&lt;script&gt;alert(1)&lt;/script&gt;')
+        self.assertSafe('<b><i>x', '<b><i>x</i></b>')
+        self.assertSafe('<p>a</b>b</p>', '<p>ab</p>')
+
+    def test_target_blank_links_get_noopener(self):
+        self.assertSafe('<a href="https://example.com" target="_blank" rel="opener">x</a>',
+                        '<a href="https://example.com" target="_blank" rel="noopener noreferrer">x</a>')
+
+    def test_html_to_text(self):
+        self.assertEqual(html_to_text('<p>a&amp;b</p><p>c</p><script>secret</script>'), 'a&b c')
+
+
+@override_settings(**TEST_SETTINGS)
+class RenderPostsTests(TestCase):
+    """Заполнение производных полей записей командой render_posts (миграция 0013 меняет только схему)"""
+
+    def test_existing_posts_backfilled(self):
+        post = create_posts(1)[0]
+        Post.objects.update(description_html='', text_html='', excerpt='', word_count=0, content_hash='')
+        call_command('render_posts', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual((post.description_html, post.text_html, post.excerpt, post.word_count),
+                         ('<p>Описание</p>', '<p>Текст</p>', 'Описание', 2))
+        self.assertTrue(post.content_hash)
+
+
+@override_settings(**TEST_SETTINGS, THROTTLE_RATES={}, TRUSTED_PROXIES=[])
+class RatingCounterTests(TestCase):
+    """Денормализованные счетчики рейтинга записи совпадают с агрегатами таблицы рейтинга"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.post = create_posts(1)[0]
+
+    def vote(self, value, ip_address='10.0.0.1', post_id=None):
+        return self.client.post('/rating/', {'post_id': post_id or self.post.pk, 'value': value},
+                                REMOTE_ADDR=ip_address)
+
+    def assertCountersMatchRatings(self):
+        self.post.refresh_from_db()
+        expected = Rating.objects.filter(post=self.post).aggregate(
+            like_count=Count('pk', filter=Q(value=1)), dislike_count=Count('pk', filter=Q(value=-1)),
+            rating_sum=Sum('value', default=0))
+        self.assertEqual({name: getattr(self.post, name) for name in expected}, expected)
+
+    def test_vote_created_flipped_and_withdrawn(self):
+        steps = [(1, '10.0.0.1', 'created', 1), (1, '10.0.0.2', 'created', 2), (-1, '10.0.0.3', 'created', 1),
+                 (-1, '10.0.0.1', 'updated', -1), (-1, '10.0.0.1', 'deleted', 0), (1, '10.0.0.3', 'updated', 2)]
+        for value, ip_address, status, rating_sum in steps:
+            with self.subTest(value=value, ip_address=ip_address):
+                response = self.vote(value, ip_address)
+                self.assertEqual(response.json(), {'status': status, 'rating_sum': rating_sum})
+                self.assertCountersMatchRatings()
+
+    def test_invalid_votes_rejected_without_changes(self):
+        for data in ({'post_id': self.post.pk, 'value': 2}, {'post_id': self.post.pk, 'value': 'x'},
+                     {'post_id': 'x', 'value': 1}, {'value': 1}):
+            with self.subTest(data=data):
+                self.assertEqual(self.client.post('/rating/', data).status_code, 400)
+        self.assertEqual(self.vote(1, post_id=self.post.pk + 1000).status_code, 404)
+        self.assertFalse(Rating.objects.exists())
+        self.assertCountersMatchRatings()
+
+    def test_recount_ratings_fixes_drift(self):
+        for ip_address in ('10.0.0.1', '10.0.0.2'):
+            self.vote(1, ip_address)
+        self.vote(-1, '10.0.0.3')
+        Post.objects.update(like_count=100, dislike_count=0, rating_sum=-5)
+        call_command('recount_ratings', stdout=StringIO())
+        self.assertCountersMatchRatings()
+        self.assertEqual((self.post.like_count, self.post.dislike_count, self.post.rating_sum), (2, 1, 1))
+
+
+@override_settings(**TEST_SETTINGS)
+class CommentTreeTests(TestCase):
+    """Подгрузка дерева комментариев с ограничением глубины: страницы корней, ответы узла, некорректный курсор"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.post, cls.other_post = create_posts(2)
+        author = User.objects.get(username='author')
+        roots = [Comment.objects.create(post=cls.post, author=author, content=f'Корень {index}') for index in range(3)]
+        # Страницы корней идут по tree_id
+        cls.roots = sorted(roots, key=lambda comment: comment.tree_id)
+        # Цепочка ответов первого корня: уровни 1-4
+        cls.chain, parent = [], cls.roots[0]
+        for level in range(1, 5):
+            parent = Comment.objects.create(post=cls.post, author=author, content=f'Ответ {level}', parent=parent)
+            cls.chain.append(parent)
+
+    def setUp(self):
+        self.enterContext(mock.patch.object(Comment.objects, 'page_size', 2))
+
+    def get_page(self, **params):
+        response = self.client.get(f'/post/{self.post.pk}/comments/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def ids(self, data):
+        return {comment['id'] for comment in data['comments']}
+
+    def test_first_page_limited_by_roots_and_depth(self):
+        data = self.get_page()
+        self.assertEqual(self.ids(data), {self.roots[0].pk, self.roots[1].pk, self.chain[0].pk, self.chain[1].pk})
+        self.assertEqual(data['next'], self.roots[1].tree_id)
+        # Ответы глубже max_level не выводятся, вместо них кнопка с количеством
+        self.assertIn(f'data-comment-id="{self.chain[1].pk}">Показать ответы (2)', data['html'])
+        self.assertNotIn('Ответ 3', data['html'])
+
+    def test_next_page(self):
+        data = self.get_page(after=self.get_page()['next'])
+        self.assertEqual(self.ids(data), {self.roots[2].pk})
+        self.assertIsNone(data['next'])
+
+    def test_depth_zero_shows_button_on_root(self):
+        data = self.get_page(depth=0)
+        self.assertEqual(self.ids(data), {self.roots[0].pk, self.roots[1].pk})
+        self.assertIn(f'data-comment-id="{self.roots[0].pk}">Показать ответы (4)', data['html'])
+
+    def test_node_replies(self):
+        data = self.get_page(node=self.chain[1].pk)
+        self.assertEqual(self.ids(data), {self.chain[2].pk, self.chain[3].pk})
+        self.assertNotIn('Показать ответы', data['html'])
+        data = self.get_page(node=self.chain[1].pk, depth=1)
+        self.assertEqual(self.ids(data), {self.chain[2].pk})
+        self.assertIn(f'data-comment-id="{self.chain[2].pk}">Показать ответы (1)', data['html'])
+
+    def test_tampered_cursor(self):
+        first = self.get_page()
+        for params in ({'after': 'abc'}, {'node': 'abc'}, {'depth': 'abc'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.ids(self.get_page(**params)), self.ids(first))
+        # Комментарий другой записи и несуществующий комментарий
+        self.assertEqual(self.client.get(f'/post/{self.other_post.pk}/comments/',
+                                         {'node': self.roots[0].pk}).status_code, 404)
+        self.assertEqual(self.client.get(f'/post/{self.post.pk}/comments/', {'node': 0}).status_code, 404)
+        data = self.get_page(after=10 ** 6)
+        self.assertEqual((data['comments'], data['next']), ([], None))
+
+
+@override_settings(**TEST_SETTINGS)
+class PageCacheInvalidationTests(TestCase):
+    """Сброс версий кэша сигналами после фиксации транзакции и повторный рендер кэшированных страниц"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.post = create_posts(1)[0]
+        cls.author = User.objects.get(username='author')
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def assertBumped(self, name, action):
+        version = get_cache_version(name)
+        with self.captureOnCommitCallbacks(execute=True):
+            action()
+        self.assertGreater(get_cache_version(name), version)
+
+    def test_writes_bump_versions(self):
+        comment = Comment(post=self.post, author=self.author, content='Комментарий')
+        self.assertBumped('content', self.post.save)
+        self.assertBumped('content', comment.save)
+        self.assertBumped(f'comments-{self.post.pk}', comment.save)
+        self.assertBumped(f'comments-{self.post.pk}', comment.delete)
+        self.assertBumped('ratings', lambda: Rating.objects.create(post=self.post, ip_address='10.0.0.1', value=1))
+
+    def test_anonymous_page_rerendered_after_post_saved(self):
+        url = self.post.get_absolute_url()
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+        self.post.text = '<p>Новый текст</p>'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Новый текст')
+
+    @override_settings(PAGE_CACHE_RATING_STALENESS=0)
+    def test_anonymous_page_rerendered_after_vote(self):
+        url = self.post.get_absolute_url()
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.create(post=self.post, ip_address='10.0.0.1', value=1)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'MISS')
+
+    def test_comments_fragment_rerendered_after_comment_saved(self):
+        # Для авторизованного пользователя страница не кэшируется целиком, кэшируется только фрагмент комментариев
+        self.client.force_login(self.author)
+        url = self.post.get_absolute_url()
+        comment = Comment.objects.create(post=self.post, author=self.author, content='Первая версия')
+        self.assertContains(self.client.get(url), 'Первая версия')
+        # UPDATE без сигналов: фрагмент остается в кэше
+        Comment.objects.filter(pk=comment.pk).update(content='Без сигнала')
+        self.assertContains(self.client.get(url), 'Первая версия')
+        comment.content = 'Вторая версия'
+        with self.captureOnCommitCallbacks(execute=True):
+            comment.save()
+        response = self.client.get(url)
+        self.assertContains(response, 'Вторая версия')
+        self.assertNotContains(response, 'Первая версия')
+
+
+@override_settings(**TEST_SETTINGS)
+class FeedConditionalGetTests(TestCase):
+    """Условные GET RSS лент: ETag и Last-Modified на ответе 200, ответ 304, смена ETag с новой записью"""
+    url = '/feeds/latest/'
+
+    @classmethod
+    def setUpTestData(cls):
+        create_posts(2)
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_headers_present_on_200(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+        self.assertContains(response, 'Запись 1')
+
+    def test_matching_validators_return_304(self):
+        response = self.client.get(self.url)
+        for headers in ({'HTTP_IF_NONE_MATCH': response['ETag']},
+                        {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']}):
+            with self.subTest(headers=headers):
+                conditional = self.client.get(self.url, **headers)
+                self.assertEqual(conditional.status_code, 304)
+                self.assertEqual(conditional.content, b'')
+                self.assertEqual(conditional['ETag'], response['ETag'])
+
+    def test_new_post_changes_etag(self):
+        response = self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            post = create_posts(1, title='Новая запись')[0]
+        Post.objects.filter(pk=post.pk).update(update=post.update + timedelta(minutes=1))
+        for headers in ({'HTTP_IF_NONE_MATCH': response['ETag']},
+                        {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']}):
+            with self.subTest(headers=headers):
+                fresh = self.client.get(self.url, **headers)
+                self.assertEqual(fresh.status_code, 200)
+                self.assertNotEqual(fresh['ETag'], response['ETag'])
+                self.assertContains(fresh, 'Новая запись')
+
+    def test_category_and_tag_feeds(self):
+        post = Post.objects.first()
+        post.tags.add('джанго')
+        self.assertEqual(self.client.get('/feeds/category/category/').status_code, 200)
+        self.assertEqual(self.client.get('/feeds/category/missing/').status_code, 404)
+        response = self.client.get(f'/feeds/tag/{post.tags.get().slug}/')
+        self.assertContains(response, post.title)
+        self.assertEqual(self.client.get(f'/feeds/tag/{post.tags.get().slug}/',
+                                         HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+@override_settings(**TEST_SETTINGS)
+class TagPostCountTests(TestCase):
+    """Инкрементальные счетчики TagPostCount совпадают с COUNT(*) по опубликованным записям"""
+
+    def assertCountsMatch(self):
+        expected = dict(TaggedItem.objects.filter(object_id__in=Post.objects.filter(status='published').values('pk'))
+                        .order_by().values('tag_id').annotate(n=Count('pk')).values_list('tag_id', 'n'))
+        self.assertEqual(dict(TagPostCount.objects.values_list('tag_id', 'post_count')), expected)
+
+    def test_every_change_path(self):
+        first, second = create_posts(2)
+        draft = create_posts(1, status='draft')[0]
+        steps = [
+            ('add', lambda: first.tags.add('python', 'django')),
+            ('add second', lambda: second.tags.add('python')),
+            ('add to draft', lambda: draft.tags.add('python', 'draft-only')),
+            ('remove', lambda: first.tags.remove('django')),
+            ('set', lambda: second.tags.set(['python', 'orm'])),
+            ('clear', lambda: second.tags.clear()),
+            ('publish', lambda: self.set_status(draft, 'published')),
+            ('unpublish', lambda: self.set_status(first, 'draft')),
+            ('delete', lambda: Post.objects.get(pk=draft.pk).delete()),
+        ]
+        for name, action in steps:
+            with self.subTest(step=name):
+                action()
+                self.assertCountsMatch()
+        self.assertFalse(TagPostCount.objects.exists())
+
+    def set_status(self, post, status):
+        # Запись загружается заново: сигналы сравнивают статус с загруженным из БД
+        post = Post.objects.get(pk=post.pk)
+        post.status = status
+        post.save()
+
+    def test_recount_tags_command_fixes_drift(self):
+        create_posts(1)[0].tags.add('python')
+        TagPostCount.objects.update(post_count=10)
+        call_command('recount_tags', stdout=StringIO())
+        self.assertCountsMatch()
+
+
+@override_settings(**TEST_SETTINGS, RELATED_POSTS_LIMIT=5)
+class RelatedPostTests(TestCase):
+    """Предрассчитанные похожие записи: порядок по общим тегам, исключение черновиков и самой записи,
+    пересчет сигналами после изменения тегов"""
+
+    def create_post(self, title, category, tags=(), status='published'):
+        post = create_posts(1, title=title, category=category, status=status)[0]
+        post.tags.add(*tags)
+        return post
+
+    def related(self, post):
+        return [related.title for related in Post.objects.get(pk=post.pk).get_related_posts()]
+
+    def setUp(self):
+        # Категории разных деревьев не сближают записи, в одной категории запись получает CATEGORY_WEIGHT
+        categories = [Category.objects.create(title=f'Категория {index}', slug=f'category-{index}',
+                                              description='Описание') for index in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post = self.create_post('Основная', categories[0], ['python', 'django', 'orm'])
+            self.three = self.create_post('Три тега', categories[1], ['python', 'django', 'orm'])
+            self.one = self.create_post('Один тег', categories[2], ['python'])
+            self.neighbour = self.create_post('Та же категория', categories[0])
+            self.draft = self.create_post('Черновик', categories[1], ['python', 'django', 'orm'], status='draft')
+            self.create_post('Без общего', categories[2], ['other'])
+
+    def test_ordered_by_shared_tags_and_category(self):
+        self.assertEqual(self.related(self.post), ['Три тега', 'Та же категория', 'Один тег'])
+        # Та же категория (1.5) выше одного общего тега, при равной оценке выше более новая запись
+        self.assertEqual(self.related(self.one), ['Без общего', 'Три тега', 'Основная'])
+
+    def test_rebuilt_after_tags_changed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.three.tags.clear()
+            self.one.tags.add('django', 'orm', 'extra')
+        self.assertEqual(self.related(self.post), ['Один тег', 'Та же категория'])
+        # Запись, ссылавшаяся на измененную, тоже пересчитана
+        self.assertNotIn('Основная', self.related(self.three))
+
+    def test_rebuilt_after_publish_and_unpublish(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            draft = Post.objects.get(pk=self.draft.pk)
+            draft.status = 'published'
+            draft.save()
+        self.assertEqual(self.related(self.post), ['Черновик', 'Три тега', 'Та же категория', 'Один тег'])
+        with self.captureOnCommitCallbacks(execute=True):
+            three = Post.objects.get(pk=self.three.pk)
+            three.status = 'draft'
+            three.save()
+        self.assertNotIn('Три тега', self.related(self.post))
+
+    def test_rebuilt_after_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.three.delete()
+        self.assertEqual(self.related(self.post), ['Та же категория', 'Один тег'])
+
+
+@override_settings(**TEST_SETTINGS)
+class ExportImportTests(TestCase):
+    """Выгрузка export_blog и загрузка import_blog: содержимое, теги и корректность деревьев MPTT"""
+
+    @classmethod
+    def setUpTestData(cls):
+        root = Category.objects.create(title='Корень', slug='root', description='Описание')
+        child = Category.objects.create(title='Дочерняя', slug='child', description='Описание', parent=root)
+        posts = create_posts(2, category=child) + create_posts(1, title='Черновик', status='draft', category=root)
+        posts[0].tags.add('python', 'django')
+        posts[2].tags.add('python')
+        author = User.objects.get(username='author')
+        for post in posts[:2]:
+            first = Comment.objects.create(post=post, author=author, content=f'{post.title}: корень 1')
+            reply = Comment.objects.create(post=post, author=author, content=f'{post.title}: ответ', parent=first)
+            Comment.objects.create(post=post, author=author, content=f'{post.title}: ответ на ответ', parent=reply)
+            Comment.objects.create(post=post, author=author, content=f'{post.title}: второй ответ', parent=first)
+            Comment.objects.create(post=post, author=author, content=f'{post.title}: корень 2')
+        for index, value in enumerate((1, -1, 1)):
+            Rating.objects.create(post=posts[0], ip_address=f'10.0.0.{index}', value=value)
+        Post.recount_rating_counters()
+
+    def export(self):
+        path = self.enterContext(tempfile.TemporaryDirectory()) + '/blog.jsonl'
+        call_command('export_blog', output=path, batch_size=2, stderr=StringIO())
+        return path
+
+    def load(self, path):
+        call_command('import_blog', path, batch_size=2, stdout=StringIO())
+
+    def snapshot(self):
+        """Содержимое без id: дерево категорий, записи с тегами и счетчиками, дерево комментариев"""
+        return {
+            'categories': sorted(Category.objects.values_list('title', 'parent__title', 'level')),
+            'posts': sorted((post.title, post.category.title, post.status, tuple(sorted(post.tags.names())),
+                             post.rating_sum, post.like_count) for post in Post.objects.all()),
+            'comments': sorted(Comment.objects.values_list('post__title', 'content', 'parent__content', 'level')),
+            'ratings': sorted(Rating.objects.values_list('post__title', 'ip_address', 'value')),
+        }
+
+    def assertTreeValid(self, model):
+        """Границы lft/rght каждого дерева - перестановка 1..2n, узел вложен в родителя на уровень глубже"""
+        nodes = {node.pk: node for node in model.objects.all()}
+        trees = {}
+        for node in nodes.values():
+            trees.setdefault(node.tree_id, []).extend((node.lft, node.rght))
+            self.assertLess(node.lft, node.rght)
+            parent = nodes.get(node.parent_id)
+            if parent is None:
+                self.assertEqual((node.level, node.lft), (0, 1))
+            else:
+                self.assertEqual(node.tree_id, parent.tree_id)
+                self.assertEqual(node.level, parent.level + 1)
+                self.assertTrue(parent.lft < node.lft < node.rght < parent.rght)
+        for bounds in trees.values():
+            self.assertEqual(sorted(bounds), list(range(1, len(bounds) + 1)))
+
+    def test_round_trip_into_empty_database(self):
+        expected = self.snapshot()
+        path = self.export()
+        Post.objects.all().delete()
+        Category.objects.all().delete()
+        Tag.objects.all().delete()
+        self.load(path)
+        self.assertEqual(self.snapshot(), expected)
+        self.assertTreeValid(Category)
+        self.assertTreeValid(Comment)
+        self.assertEqual(self.client.get(f'/post/{Post.objects.get(title="Запись 0").pk}/comments/').status_code,
+                         200)
+
+    def test_reimport_keeps_existing_trees(self):
+        path = self.export()
+        before = {model: set(model.objects.values_list('pk', 'tree_id', 'lft', 'rght', 'level'))
+                  for model in (Category, Comment)}
+        counts = {model: model.objects.count() for model in (Category, Post, Comment, Rating)}
+        self.load(path)
+        for model, count in counts.items():
+            self.assertEqual(model.objects.count(), count * 2, model.__name__)
+        for model, nodes in before.items():
+            self.assertLessEqual(nodes, set(model.objects.values_list('pk', 'tree_id', 'lft', 'rght', 'level')))
+            self.assertTreeValid(model)
+        self.assertEqual(len(set(Post.objects.values_list('slug', flat=True))), counts[Post] * 2)
+        self.assertEqual(Tag.objects.count(), 2)
+
+
+@override_settings(**TEST_SETTINGS)
+class CursorPaginatorTests(TestCase):
+    """Keyset-пагинация списка записей при совпадающих значениях ключа сортировки"""
+    ordering = ('-fixed', '-create', '-pk')
+
+    @classmethod
+    def setUpTestData(cls):
+        posts = create_posts(11)
+        # Одинаковое время у всех записей и две закрепленные: порядок внутри групп задает только pk
+        Post.objects.update(create=datetime(2024, 1, 1, tzinfo=timezone.utc))
+        Post.objects.filter(pk__in=[posts[3].pk, posts[7].pk]).update(fixed=True)
+        cls.expected = list(Post.objects.order_by(*cls.ordering).values_list('pk', flat=True))
+
+    def get_paginator(self):
+        return CursorPaginator(Post.objects.all(), 3, self.ordering)
+
+    def walk_forward(self):
+        pages, cursor = [], None
+        while True:
+            page = self.get_paginator().page(cursor)
+            pages.append(page)
+            if not page.has_next():
+                return pages
+            cursor = page.next_cursor
+
+    def test_forward_traversal_returns_every_post_once(self):
+        pages = self.walk_forward()
+        self.assertEqual([post.pk for page in pages for post in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 2])
+        self.assertFalse(pages[0].has_previous())
+        self.assertTrue(all(page.has_previous() for page in pages[1:]))
+
+    def test_backward_traversal_returns_same_pages(self):
+        forward = self.walk_forward()
+        backward, page = [forward[-1]], forward[-1]
+        while page.has_previous():
+            page = self.get_paginator().page(page.previous_cursor)
+            backward.append(page)
+        self.assertEqual([[post.pk for post in page] for page in reversed(backward)],
+                         [[post.pk for post in page] for page in forward])
+        self.assertTrue(backward[-1].has_next())
+        self.assertFalse(backward[-1].has_previous())
+
+    def test_pages_read_in_index_order(self):
+        """Страницы в обе стороны читаются по индексу blog_post_status_cursor_idx без временной сортировки"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN проверяется на SQLite')
+        paginator = CursorPaginator(Post.custom.all(), 3, self.ordering)
+        first = paginator.page()
+        last = paginator.page(paginator.page(first.next_cursor).next_cursor)
+        for cursor in (None, first.next_cursor, last.previous_cursor):
+            with self.subTest(cursor=cursor), CaptureQueriesContext(connection) as queries:
+                list(paginator.page(cursor))
+            with connection.cursor() as db_cursor:
+                db_cursor.execute(f'EXPLAIN QUERY PLAN {queries[-1]["sql"]}')
+                plan = ' '.join(row[-1] for row in db_cursor.fetchall())
+            self.assertIn('USING INDEX blog_post_status_cursor_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_invalid_or_tampered_cursor_returns_first_page(self):
+        first = [post.pk for post in self.get_paginator().page()]
+        cursor = self.get_paginator().page().next_cursor
+        for value in ('garbage', cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B')):
+            with self.subTest(cursor=value):
+                self.assertEqual([post.pk for post in self.get_paginator().page(value)], first)
+
+
+@override_settings(**TEST_SETTINGS)
+class SlugTests(TestCase):
+    """Уникальные slug записей: стабильность при редактировании и выделение пачкой"""
+
+    def test_duplicate_titles_get_numbered_suffixes(self):
+        posts = create_posts(3, title='Новость')
+        self.assertEqual([post.slug for post in posts], ['novost', 'novost-2', 'novost-3'])
+
+    def test_slug_kept_when_post_edited(self):
+        first, second = create_posts(2, title='Новость')
+        second.text = '<p>Новый текст</p>'
+        second.save()
+        # Удаление первой записи не сдвигает slug второй
+        first.delete()
+        second.title = 'Новость'
+        second.save()
+        second.refresh_from_db()
+        self.assertEqual(second.slug, 'novost-2')
+
+    def test_slug_kept_without_queries_when_title_unchanged(self):
+        post = create_posts(1, title='Новость')[0]
+        with self.assertNumQueries(0):
+            self.assertEqual(unique_slugify(post, post.title), 'novost')
+
+    def test_slug_rebuilt_when_title_changed(self):
+        post, other = create_posts(2, title='Новость')
+        other.title = 'Другая новость'
+        other.save()
+        self.assertEqual(other.slug, 'drugaya-novost')
+        post.title = 'Другая новость'
+        post.save()
+        self.assertEqual(post.slug, 'drugaya-novost-2')
+
+    def test_allocate_unique_slugs_accounts_for_existing_and_batch(self):
+        create_posts(1, title='Новость')
+        objects = allocate_unique_slugs([Post(title='Новость'), Post(title='Новость'), Post(title='Статья')], 'title')
+        self.assertEqual([obj.slug for obj in objects], ['novost-2', 'novost-3', 'statya'])
+
+
+@override_settings(**TEST_SETTINGS, THROTTLE_CACHE='default', THROTTLE_RATES={'rating': '3/min'}, TRUSTED_PROXIES=[])
+class ThrottleTests(TestCase):
+    """Token bucket: пополнение корзины и ответ 429 при превышении частоты"""
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_bucket_empties_and_refills(self):
+        self.assertEqual([throttle.consume('rating', 'client', now=100) for _ in range(3)], [0, 0, 0])
+        # 3 токена в минуту: следующий токен появится через 20 секунд
+        self.assertAlmostEqual(throttle.consume('rating', 'client', now=100), 20)
+        self.assertAlmostEqual(throttle.consume('rating', 'client', now=110), 10)
+        self.assertEqual(throttle.consume('rating', 'client', now=120), 0)
+        self.assertGreater(throttle.consume('rating', 'client', now=120), 0)
+        # Корзина не наполняется больше емкости
+        results = [throttle.consume('rating', 'client', now=1000) for _ in range(4)]
+        self.assertEqual(results[:3], [0, 0, 0])
+        self.assertGreater(results[3], 0)
+
+    def test_clients_and_scopes_counted_separately(self):
+        for _ in range(3):
+            throttle.consume('rating', 'client', now=100)
+        self.assertEqual(throttle.consume('rating', 'other', now=100), 0)
+        self.assertEqual(throttle.consume('comment', 'client', now=100), 0)
+
+    def test_rating_returns_429_with_retry_after(self):
+        post = create_posts(1)[0]
+        for value in (1, -1, 1):
+            self.assertEqual(self.client.post('/rating/', {'post_id': post.pk, 'value': value}).status_code, 200)
+        response = self.client.post('/rating/', {'post_id': post.pk, 'value': -1})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '20')
+        self.assertEqual(response.json()['retry_after'], 20)
+
+    def test_forwarded_for_ignored_from_untrusted_client(self):
+        post = create_posts(1)[0]
+        for index in range(3):
+            self.client.post('/rating/', {'post_id': post.pk, 'value': 1}, HTTP_X_FORWARDED_FOR=f'10.0.0.{index}')
+        response = self.client.post('/rating/', {'post_id': post.pk, 'value': 1}, HTTP_X_FORWARDED_FOR='10.0.0.9')
+        self.assertEqual(response.status_code, 429)
+
+
+@override_settings(CACHES=TEST_CACHES, IMAGE_VARIANT_WIDTHS={'thumbnail': (320, 640, 960)})
+class ImageVariantTests(SimpleTestCase):
+    """Варианты изображений во временном MEDIA_ROOT и srcset тега {% picture %}"""
+
+    def setUp(self):
+        self.media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        caches['default'].clear()
+
+    def save_image(self, name, width, height):
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), 'red').save(buffer, 'JPEG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def test_variants_created_without_upscaling(self):
+        name = self.save_image('images/thumbnails/photo.jpg', 800, 400)
+        self.assertEqual(images.generate_variants(name, 'thumbnail'), [320, 640])
+        for width in (320, 640):
+            for extension in ('webp', 'jpg'):
+                path = os.path.join(self.media_root, images.variant_name(name, width, extension))
+                with self.subTest(path=path), Image.open(path) as variant:
+                    self.assertEqual(variant.size, (width, width // 2))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, images.variant_name(name, 960, 'webp'))))
+
+    def test_small_image_keeps_its_own_width(self):
+        name = self.save_image('images/thumbnails/small.jpg', 200, 100)
+        self.assertEqual(images.generate_variants(name, 'thumbnail'), [200])
+
+    def test_missing_source_cached_as_empty(self):
+        self.assertEqual(images.generate_variants('images/thumbnails/missing.jpg', 'thumbnail'), [])
+        self.assertEqual(images.get_variant_widths('images/thumbnails/missing.jpg', 'thumbnail'), [])
+
+    def test_picture_srcset(self):
+        name = self.save_image('images/thumbnails/photo.jpg', 800, 400)
+        image = Post(thumbnail=name).thumbnail
+        template = Template("{% load image_tags %}{% picture image 'thumbnail' alt='Фото' sizes='50vw' %}")
+        html = template.render(Context({'image': image}))
+        self.assertNotIn('srcset', html)
+        self.assertIn('src="/media/images/thumbnails/photo.jpg"', html)
+
+        images.generate_variants(name, 'thumbnail')
+        html = template.render(Context({'image': image}))
+        self.assertInHTML('<source type="image/webp" sizes="50vw" srcset="/media/images/variants/images/thumbnails/'
+                          'photo-320w.webp 320w, /media/images/variants/images/thumbnails/photo-640w.webp 640w">', html)
+        self.assertIn('srcset="/media/images/variants/images/thumbnails/photo-320w.jpg 320w, '
+                      '/media/images/variants/images/thumbnails/photo-640w.jpg 640w"', html)
@@ -0,0 +1,127 @@
+"""Рейтинг популярности записей с экспоненциальным затуханием.
+
+Голос весит 2 ** ((час голоса - T) / период полураспада), где T - время последнего пересчета.
+Так как все веса отсчитываются от одного T, относительный порядок записей не меняется со временем,
+и новый голос просто прибавляется к Post.trending_score. Команда update_trending периодически
+пересчитывает очки по почасовым итогам за окно TRENDING_WINDOW_HOURS и сдвигает T на текущее время,
+чтобы веса оставались небольшими. Топ записей читается по индексу trending_score за O(N)."""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Count, Q
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Post, PostRatingBucket, Rating
+
+COMPUTED_AT_KEY = 'trending-computed-at'
+
+
+def get_half_life():
+    return timezone.timedelta(hours=getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 24))
+
+
+def get_window_start(now=None):
+    return (now or timezone.now()) - timezone.timedelta(hours=getattr(settings, 'TRENDING_WINDOW_HOURS', 24 * 7))
+
+
+def truncate_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def get_computed_at():
+    """Время последнего пересчета (точка отсчета весов)"""
+    computed_at = cache.get(COMPUTED_AT_KEY)
+    if computed_at is None:
+        cache.add(COMPUTED_AT_KEY, timezone.now(), None)
+        computed_at = cache.get(COMPUTED_AT_KEY, timezone.now())
+    return computed_at
+
+
+def weight(hour, computed_at):
+    return 2 ** ((hour - computed_at) / get_half_life())
+
+
+def get_vote_changes(added=None, removed=None):
+    """Изменение количества лайков и дизлайков от добавленного и отозванного голоса"""
+    return int(added == 1) - int(removed == 1), int(added == -1) - int(removed == -1)
+
+
+def record_vote(post_id, voted_at, added=None, removed=None):
+    """Учет изменения голоса в почасовых итогах и в очках популярности записи.
+    voted_at - время создания голоса, added/removed - добавленное и отозванное значение (1 или -1)."""
+    likes, dislikes = get_vote_changes(added, removed)
+    if not likes and not dislikes:
+        return
+    hour = truncate_hour(voted_at)
+    counters = {'likes': F('likes') + likes, 'dislikes': F('dislikes') + dislikes}
+    if not PostRatingBucket.objects.filter(post_id=post_id, hour=hour).update(**counters):
+        try:
+            with transaction.atomic():
+                PostRatingBucket.objects.create(post_id=post_id, hour=hour, likes=likes, dislikes=dislikes)
+        except IntegrityError:
+            # Итоги за этот час создал параллельный запрос
+            PostRatingBucket.objects.filter(post_id=post_id, hour=hour).update(**counters)
+    if hour >= get_window_start():
+        Post.objects.filter(pk=post_id).update(
+            trending_score=F('trending_score') + (likes - dislikes) * weight(hour, get_computed_at()))
+
+
+async def arecord_vote(post_id, voted_at, added=None, removed=None):
+    """Асинхронный вариант record_vote() для асинхронных представлений (вне транзакции:
+    каждый UPDATE атомарен сам по себе, расхождения исправляет update_trending --rebuild-buckets)"""
+    likes, dislikes = get_vote_changes(added, removed)
+    if not likes and not dislikes:
+        return
+    hour = truncate_hour(voted_at)
+    counters = {'likes': F('likes') + likes, 'dislikes': F('dislikes') + dislikes}
+    buckets = PostRatingBucket.objects.filter(post_id=post_id, hour=hour)
+    if not await buckets.aupdate(**counters):
+        try:
+            await PostRatingBucket.objects.acreate(post_id=post_id, hour=hour, likes=likes, dislikes=dislikes)
+        except IntegrityError:
+            await buckets.aupdate(**counters)
+    if hour >= get_window_start():
+        computed_at = await cache.aget(COMPUTED_AT_KEY) or await sync_to_async(get_computed_at)()
+        await Post.objects.filter(pk=post_id).aupdate(
+            trending_score=F('trending_score') + (likes - dislikes) * weight(hour, computed_at))
+
+
+def rebuild_buckets(batch_size=500):
+    """Заполнение почасовых итогов заново из таблицы голосов (после миграции или импорта).
+    Группировка выполняется в БД одним запросом. Возвращает количество итогов."""
+    rows = (Rating.objects.annotate(hour=TruncHour('time_create')).values('post_id', 'hour')
+            .annotate(likes=Count('pk', filter=Q(value=1)), dislikes=Count('pk', filter=Q(value=-1)))
+            .order_by())
+    with transaction.atomic():
+        PostRatingBucket.objects.all().delete()
+        buckets = (PostRatingBucket(post_id=row['post_id'], hour=row['hour'], likes=row['likes'],
+                                    dislikes=row['dislikes']) for row in rows.iterator(chunk_size=batch_size))
+        count = 0
+        while batch := [bucket for _, bucket in zip(range(batch_size), buckets)]:
+            PostRatingBucket.objects.bulk_create(batch)
+            count += len(batch)
+    return count
+
+
+def recompute(batch_size=500):
+    """Пересчет очков по итогам за окно и сдвиг точки отсчета на текущее время.
+    Возвращает количество записей с ненулевыми очками."""
+    now = timezone.now()
+    scores = {}
+    buckets = (PostRatingBucket.objects.filter(hour__gte=get_window_start(now))
+               .values_list('post_id', 'hour', 'likes', 'dislikes'))
+    for post_id, hour, likes, dislikes in buckets.iterator(chunk_size=batch_size):
+        scores[post_id] = scores.get(post_id, 0) + (likes - dislikes) * weight(hour, now)
+    with transaction.atomic():
+        Post.objects.exclude(trending_score=0).update(trending_score=0)
+        posts = [Post(pk=post_id, trending_score=score) for post_id, score in scores.items()]
+        Post.objects.bulk_update(posts, ['trending_score'], batch_size=batch_size)
+        cache.set(COMPUTED_AT_KEY, now, None)
+    return len(scores)
+
+
+def get_trending_posts(limit=5):
+    """Самые популярные опубликованные записи (чтение по индексу trending_score)"""
+    return Post.custom.filter(trending_score__gt=0).order_by('-trending_score', '-pk')[:limit]
@@ -1,14 +1,25 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Асинхронные представления записи голосов и комментариев (под ASGI не занимают поток на время запросов к БД)
+if getattr(settings, 'ASYNC_WRITE_VIEWS', False):
+    comment_create_view = views.AsyncCommentCreateView
+    rating_create_view = views.AsyncRatingCreateView
+else:
+    comment_create_view = views.CommentCreateView
+    rating_create_view = views.RatingCreateView
 
 urlpatterns = [
     path('', views.PostListView.as_view(), name='home'),
     path('post/create/', views.PostCreateView.as_view(), name='post_create'),
     path('post/<str:slug>/update/', views.PostUpdateView.as_view(), name='post_update'),
     path('post/<str:slug>/', views.PostDetailView.as_view(), name='post_detail'),
-    path('post/<int:pk>/comments/create/', views.CommentCreateView.as_view(), name='comment_create_view'),
+    path('post/<int:pk>/comments/create/', comment_create_view.as_view(), name='comment_create_view'),
+    path('post/<int:pk>/comments/', views.CommentListView.as_view(), name='comment_list_view'),
+    path('post/<int:pk>/events/', views.PostEventsView.as_view(), name='post_events'),
     path('post/tags/<str:tag>/', views.PostByTagListView.as_view(), name='post_by_tags'),
+    path('tags/', views.PostByTagsListView.as_view(), name='post_by_tags_filter'),
     path('category/<str:slug>/', views.PostFromCategory.as_view(), name='post_by_category'),
-    path('rating/', views.RatingCreateView.as_view(), name='rating'),
+    path('rating/', rating_create_view.as_view(), name='rating'),
 ]
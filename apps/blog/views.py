@@ -1,18 +1,36 @@
+import asyncio
+import json
+
 from django.views.generic import (View,
                                   ListView,
                                   DetailView,
                                   CreateView,
                                   UpdateView,
                                   )
-from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.template.response import TemplateResponse
+from django.db import transaction, IntegrityError
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.contrib.auth.models import User
+from asgiref.sync import sync_to_async
 
 # Миксин, который дает возможность работать с материалами только после авторизации пользователя на сайте.
 from django.contrib.auth.mixins import LoginRequiredMixin
 # Миксин уведомления
 from django.contrib.messages.views import SuccessMessageMixin
 # Миксин для добавления возможности редактирования статьи только автором или админом
-from ..services.mixins import AuthorRequiredMixin
+from ..services.mixins import AuthorRequiredMixin, CursorPaginationMixin, AnonymousPageCacheMixin
+# Версионирование ключей кэша
+from ..services.cache import get_cache_version, bump_cache_version
+# Публикация и подписка на события для SSE
+from ..services.pubsub import get_pubsub, SubscriptionLimitError
+# Ограничение частоты изменяющих запросов
+from ..services.throttle import ThrottleMixin
+from ..services.utils import get_client_ip
 # Модель из приложения для реализации функции тегов
 from taggit.models import Tag
 
@@ -21,6 +39,7 @@ from .models import (Post,
                      Comment,
                      Rating,
                      )
+from . import live, trending
 from .forms import (PostCreateForm,
                     PostUpdateForm,
                     CommentCreateForm,
@@ -38,7 +57,7 @@ from .forms import (PostCreateForm,
 #         pass
 
 
-class PostListView(ListView):
+class PostListView(AnonymousPageCacheMixin, CursorPaginationMixin, ListView):
     """PostList на основе класса ListView"""
     # Название используемой модели
     model = Post
@@ -50,14 +69,31 @@ class PostListView(ListView):
     context_object_name = 'posts'
     # Ограничение для отображения заданного количества записей на странице
     paginate_by = 10
+    # Keyset-пагинация по индексу (status, -fixed, -create, -id), ссылки ?page=N обрабатываются через OFFSET
+    pagination_mode = 'cursor'
     # Переопределение вызова модели для использования кастомного менеджера
     queryset = Post.custom.all()
 
+    def is_trending(self):
+        """Режим сортировки по популярности: ?sort=trending"""
+        return self.request.GET.get('sort') == 'trending'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.is_trending():
+            queryset = queryset.filter(trending_score__gt=0).order_by('-trending_score', '-pk')
+        return queryset
+
+    def get_cursor_ordering(self):
+        if self.is_trending():
+            return ('-trending_score', '-pk')
+        return super().get_cursor_ordering()
+
     def get_context_data(self, **kwargs):
         """Функция get_context_data может использоваться для передачи содержимого или параметров вне модели в шаблон,
         в нашем случае мы передаем значение заголовка страницы."""
         context = super().get_context_data(**kwargs)
-        context['title'] = 'Главная страница'
+        context['title'] = 'Популярные записи' if self.is_trending() else 'Главная страница'
         return context
 
 
@@ -69,7 +105,7 @@ class PostListView(ListView):
 #         return render(request, 'blog/post_detail.html', context)
 
 
-class PostDetailView(DetailView):
+class PostDetailView(AnonymousPageCacheMixin, DetailView):
     """PostDetail на основе класса DetailView"""
     # Название используемой модели
     model = Post
@@ -85,30 +121,33 @@ class PostDetailView(DetailView):
         context = super().get_context_data(**kwargs)
         context['title'] = self.object.title
         context['form'] = CommentCreateForm()
+        # Первая страница дерева комментариев (вычисляется лениво: при попадании в кэш фрагмента запроса нет),
+        # остальные корни и глубокие ответы подгружаются через CommentListView
+        context['comments'] = Comment.objects.get_root_page(self.object.pk)
+        context['comments_version'] = get_cache_version(f'comments-{self.object.pk}')
+        context['related_posts'] = self.object.get_related_posts()
         return context
 
 
-class PostFromCategory(ListView):
+class PostFromCategory(AnonymousPageCacheMixin, CursorPaginationMixin, ListView):
     """Представление для отображения записей по категориям, на основе класса ListView"""
     template_name = 'blog/post_list.html'
     # Переопределим имя Queryset по умолчанию.
     context_object_name = 'posts'
     # Ограничение для отображения заданного количества записей на странице
     paginate_by = 10
+    pagination_mode = 'cursor'
     # Переменная, по которой мы будем работать
     category = None
 
     def get_queryset(self):
-        """Метод обработки запросов, здесь мы получаем категорию по определенному slug,
-        а после мы фильтруем запросы статей по категории и возвращаем QuerySet.
-        Это работает только для дочерних категорий, если данный объект пустой(при переходе в родительскую категорию),
-        то мы получаем все дочерние категории, и выводим все записи из них."""
-        self.category = Category.objects.get(slug=self.kwargs['slug'])
-        queryset = Post.custom.filter(category__slug=self.category.slug)
-        if not queryset:
-            sub_cat = Category.objects.filter(parent=self.category)
-            queryset = Post.custom.filter(category__in=sub_cat)
-        return queryset
+        """Метод обработки запросов, здесь мы получаем категорию по определенному slug (из кэша),
+        и возвращаем QuerySet записей этой категории и всех ее дочерних категорий любой вложенности.
+        QuerySet не вычисляется здесь, выборка выполняется одним запросом при пагинации."""
+        self.category = Category.objects.get_cached_by_slug(self.kwargs['slug'])
+        if self.category is None:
+            raise Http404('Категория не найдена')
+        return self.category.get_posts()
 
     def get_context_data(self, **kwargs):
         """В этом методе передаем <title></title> категории в наш шаблон"""
@@ -117,17 +156,17 @@ class PostFromCategory(ListView):
         return context
 
 
-class PostByTagListView(ListView):
+class PostByTagListView(AnonymousPageCacheMixin, CursorPaginationMixin, ListView):
     model = Post
     template_name = 'blog/post_list.html'
     context_object_name = 'posts'
     paginate_by = 10
+    pagination_mode = 'cursor'
     tag = None
 
     def get_queryset(self):
-        self.tag = Tag.objects.get(slug=self.kwargs['tag'])
-        queryset = Post.objects.filter(tags__slug=self.tag.slug)
-        return queryset
+        self.tag = get_object_or_404(Tag, slug=self.kwargs['tag'])
+        return Post.custom.by_tags([self.tag.slug])
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -135,6 +174,35 @@ class PostByTagListView(ListView):
         return context
 
 
+class PostByTagsListView(AnonymousPageCacheMixin, CursorPaginationMixin, ListView):
+    """Записи по нескольким тегам: ?tag=python&tag=django&match=any
+    match=all (по умолчанию) - записи со всеми тегами, match=any - хотя бы с одним"""
+    model = Post
+    template_name = 'blog/post_list.html'
+    context_object_name = 'posts'
+    paginate_by = 10
+    pagination_mode = 'cursor'
+    max_tags = 10
+    tags = None
+
+    def get_queryset(self):
+        slugs = list(dict.fromkeys(slug for slug in self.request.GET.getlist('tag') if slug))[:self.max_tags]
+        self.tags = list(Tag.objects.filter(slug__in=slugs).order_by('name'))
+        if not self.tags:
+            raise Http404('Теги не найдены')
+        self.match_all = self.request.GET.get('match') != 'any'
+        # Неизвестный тег при поиске по всем тегам означает пустой результат
+        if self.match_all and len(self.tags) < len(slugs):
+            return Post.custom.none()
+        return Post.custom.by_tags([tag.slug for tag in self.tags], match_all=self.match_all)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        separator = ' и ' if self.match_all else ' или '
+        context['title'] = f'Статьи по тегам: {separator.join(tag.name for tag in self.tags)}'
+        return context
+
+
 class PostCreateView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
     """Представление: создание материалов на сайте"""
     # Указывает модель, с которой будет работать представление PostCreateView.
@@ -184,20 +252,27 @@ class PostUpdateView(AuthorRequiredMixin, SuccessMessageMixin, UpdateView):
         return super().form_valid(form)
 
 
-class CommentCreateView(LoginRequiredMixin, CreateView):
+class CommentCreateView(LoginRequiredMixin, ThrottleMixin, CreateView):
     """Представление на основе класса CreateView,
     которое позволяет обрабатывать форму создания комментария в AJAX"""
     model = Comment
     form_class = CommentCreateForm
+    template_name = 'blog/comment_form.html'
+    throttle_scope = 'comment'
 
     def is_ajax(self):
         """Метод is_ajax() возвращает True, если запрос был сделан через AJAX, и False в противном случае."""
         return self.request.headers.get('X-Requested-With') == 'XMLHttpRequest'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['title'] = 'Добавление комментария'
+        return context
+
     def form_invalid(self, form):
         """Метод form_invalid() вызывается, когда форма создания комментария не проходит валидацию.
         Если запрос был через AJAX, то возвращается JsonResponse с ошибкой,
-        иначе вызывается родительский метод form_invalid()."""
+        иначе вызывается родительский метод form_invalid() (форма с ошибками на странице comment_form.html)."""
         if self.is_ajax():
             return JsonResponse({'error': form.errors}, status=400)
         return super().form_invalid(form)
@@ -214,16 +289,7 @@ class CommentCreateView(LoginRequiredMixin, CreateView):
         comment.save()
 
         if self.is_ajax():
-            return JsonResponse({
-                'is_child': comment.is_child_node(),
-                'id': comment.id,
-                'author': comment.author.username,
-                'parent_id': comment.parent_id,
-                'time_create': comment.time_create.strftime('%Y-%m-%d %H:%M:%S'),
-                'avatar': comment.author.profile.avatar.url,
-                'content': comment.content,
-                'get_absolute_url': comment.author.profile.get_absolute_url()
-            }, status=200)
+            return JsonResponse(comment.get_json_data(), status=200)
 
         return redirect(comment.post.get_absolute_url())
 
@@ -231,34 +297,241 @@ class CommentCreateView(LoginRequiredMixin, CreateView):
         return JsonResponse({'error': 'Необходимо авторизоваться для добавления комментариев'}, status=400)
 
 
-class RatingCreateView(View):
+class CommentListView(View):
+    """Постраничная подгрузка комментариев записи в JSON (данные и готовый HTML):
+    ?after=<tree_id> - следующая страница корневых комментариев,
+    ?node=<id> - ответы на комментарий, ?depth=<n> - глубина загружаемых ответов."""
+    template_name = 'blog/comments/comments_tree.html'
+    max_depth = 5
+
+    def get_int_param(self, name):
+        try:
+            return int(self.request.GET[name])
+        except (KeyError, ValueError):
+            return None
+
+    def get(self, request, *args, **kwargs):
+        depth = self.get_int_param('depth')
+        if depth is not None:
+            depth = max(0, min(depth, self.max_depth))
+        node_id = self.get_int_param('node')
+        if node_id is not None:
+            node = get_object_or_404(Comment.objects.only('post_id', 'tree_id', 'lft', 'rght', 'level'),
+                                     pk=node_id, post_id=kwargs['pk'])
+            page = Comment.objects.get_subtree_page(node, depth=depth)
+        else:
+            page = Comment.objects.get_root_page(kwargs['pk'], after=self.get_int_param('after'), depth=depth)
+        return JsonResponse({
+            'html': render_to_string(self.template_name, {'comments': page}, request=request),
+            'comments': [comment.get_json_data() for comment in page],
+            'next': page.next_cursor,
+        })
+
+
+class PostEventsView(View):
+    """Поток событий записи (Server-Sent Events, только под ASGI): новые комментарии и итог рейтинга.
+    Количество подключений ограничено на запись и на процесс (PUBSUB_OPTIONS), соединение
+    закрывается через SSE_MAX_DURATION секунд или при переполнении буфера медленного клиента,
+    EventSource в браузере переподключается автоматически."""
+
+    async def get(self, request, *args, **kwargs):
+        if not isinstance(request, ASGIRequest):
+            return HttpResponse('Поток событий доступен только при запуске под ASGI', status=501)
+        post_id = self.kwargs['pk']
+        if not await Post.custom.filter(pk=post_id).aexists():
+            raise Http404('Запись не найдена')
+        # Лимит проверяется до ответа, а подписка создается в stream(), внутри try/finally
+        if not get_pubsub().can_subscribe(live.get_channel(post_id)):
+            return HttpResponse('Слишком много подключений', status=503, headers={'Retry-After': '30'})
+        response = StreamingHttpResponse(self.stream(post_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Отключение буферизации ответа в nginx
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, post_id):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + getattr(settings, 'SSE_MAX_DURATION', 600)
+        heartbeat = getattr(settings, 'SSE_HEARTBEAT', 15)
+        # Подписка создается при первой итерации ответа: если ответ не начал отправляться
+        # (клиент отключился раньше), подписки нет и освобождать нечего
+        try:
+            subscription = get_pubsub().subscribe(live.get_channel(post_id))
+        except SubscriptionLimitError:
+            # Лимит заполнился после проверки в get(): клиент переподключится позже
+            yield 'retry: 30000\n\n'
+            return
+        try:
+            yield f'retry: {getattr(settings, "SSE_RETRY", 5) * 1000}\n\n'
+            while loop.time() < deadline:
+                message = await subscription.get(timeout=min(heartbeat, max(deadline - loop.time(), 0)))
+                if message is None:
+                    # Комментарий SSE поддерживает соединение через прокси
+                    yield ': ping\n\n'
+                    continue
+                yield f'event: {message["event"]}\ndata: {json.dumps(message["data"], cls=DjangoJSONEncoder)}\n\n'
+                if message['event'] == 'overflow':
+                    break
+        finally:
+            # При отключении клиента задача ответа отменяется, подписка освобождается здесь
+            subscription.close()
+
+
+class RatingCreateView(ThrottleMixin, View):
     """Представление для работы с рейтингом"""
     model = Rating
+    throttle_scope = 'rating'
 
     def post(self, request, *args, **kwargs):
-        post_id = request.POST.get('post_id')
-        value = int(request.POST.get('value'))
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        ip = x_forwarded_for.split(',')[0] if x_forwarded_for else request.META.get('REMOTE_ADDR')
-        ip_address = ip
+        try:
+            post_id = int(request.POST.get('post_id'))
+            value = int(request.POST.get('value'))
+        except (TypeError, ValueError):
+            value = None
+        # Счетчики лайков и дизлайков записи согласованы с rating_sum только для голосов +1 и -1
+        if value not in (1, -1):
+            return JsonResponse({'error': 'Некорректный голос'}, status=400)
+        ip_address = get_client_ip(request)
         user = request.user if request.user.is_authenticated else None
 
-        rating, created = self.model.objects.get_or_create(
-            post_id=post_id,
-            ip_address=ip_address,
-            defaults={'value': value, 'user': user},
-        )
-
-        if not created:
-            if rating.value == value:
-                rating.delete()
-                return JsonResponse({'status': 'deleted', 'rating_sum': rating.post.get_sum_rating()})
-            else:
-                rating.value = value
-                rating.user = user
-                rating.save()
-                return JsonResponse({'status': 'updated', 'rating_sum': rating.post.get_sum_rating()})
-        return JsonResponse({'status': 'created', 'rating_sum': rating.post.get_sum_rating()})
+        # Голос и счетчики записи изменяются в одной транзакции, счетчики увеличиваются на стороне БД.
+        # Несуществующая запись не проверяется отдельным запросом: UPDATE счетчиков не изменит ни одной строки
+        # (проверка внешнего ключа отложена до фиксации и внутри внешней транзакции не срабатывает)
+        try:
+            with transaction.atomic():
+                rating, created = self.model.objects.select_for_update().get_or_create(
+                    post_id=post_id,
+                    ip_address=ip_address,
+                    defaults={'value': value, 'user': user},
+                )
+
+                if created:
+                    status = 'created'
+                    added, removed = value, None
+                elif rating.value == value:
+                    status = 'deleted'
+                    rating.delete()
+                    added, removed = None, value
+                else:
+                    status = 'updated'
+                    added, removed = value, rating.value
+                    rating.value = value
+                    rating.user = user
+                    rating.save()
+                if not Post.update_rating_counters(post_id, added=added, removed=removed):
+                    raise Post.DoesNotExist
+                # Почасовые итоги и очки популярности для блока "Популярное"
+                trending.record_vote(post_id, rating.time_create, added=added, removed=removed)
+        except (IntegrityError, Post.DoesNotExist):
+            return JsonResponse({'error': 'Запись не найдена'}, status=404)
+
+        rating_sum = Post.objects.filter(pk=post_id).values_list('rating_sum', flat=True).first()
+        live.publish_rating(post_id, rating_sum)
+        return JsonResponse({'status': status, 'rating_sum': rating_sum})
+
+
+class AsyncCommentCreateView(ThrottleMixin, View):
+    """Асинхронное добавление комментария (ASGI): воркер не занимается на время запросов к БД.
+    Ответы совпадают с CommentCreateView (JSON комментария для comments.js или редирект на запись)."""
+    form_class = CommentCreateForm
+    template_name = CommentCreateView.template_name
+    throttle_scope = 'comment'
+
+    def is_ajax(self):
+        return self.request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+    async def post(self, request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({'error': 'Необходимо авторизоваться для добавления комментариев'}, status=400)
+        post = await Post.objects.only('slug').filter(pk=self.kwargs['pk']).afirst()
+        if post is None:
+            raise Http404('Запись не найдена')
+        form = self.form_class(request.POST)
+        if not form.is_valid():
+            if self.is_ajax():
+                return JsonResponse({'error': form.errors}, status=400)
+            # Как в CommentCreateView.form_invalid(): форма с ошибками на отдельной странице
+            return TemplateResponse(request, self.template_name,
+                                    {'form': form, 'view': self, 'title': 'Добавление комментария'})
+        parent_id = form.cleaned_data.get('parent')
+        if parent_id and not await Comment.objects.filter(pk=parent_id, post_id=post.pk).aexists():
+            return JsonResponse({'error': {'parent': ['Комментарий для ответа не найден']}}, status=400)
+
+        comment = form.save(commit=False)
+        comment.post_id = post.pk
+        # Автор с профилем загружается заранее: get_json_data() использует аватар
+        comment.author = await User.objects.select_related('profile').aget(pk=user.pk)
+        comment.parent_id = parent_id
+        # Вставка узла MPTT пересчитывает границы дерева и не имеет асинхронного API
+        # Кэш дерева комментариев записи сбрасывает обработчик сигнала post_save
+        await sync_to_async(comment.save)()
+
+        if self.is_ajax():
+            return JsonResponse(comment.get_json_data(), status=200)
+        return redirect(post.get_absolute_url())
+
+
+class AsyncRatingCreateView(ThrottleMixin, View):
+    """Асинхронное голосование (ASGI) с ответом как у RatingCreateView.
+    Асинхронный ORM не поддерживает транзакции, поэтому голос меняется условными запросами
+    (по текущему значению голоса): параллельный голос с того же IP не будет учтен дважды,
+    при конфликте попытка повторяется. Счетчики записи изменяются отдельным атомарным UPDATE,
+    расхождения после сбоя между запросами исправляет команда recount_ratings."""
+    model = Rating
+    throttle_scope = 'rating'
+    max_attempts = 3
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            post_id = int(request.POST.get('post_id'))
+            value = int(request.POST.get('value'))
+        except (TypeError, ValueError):
+            value = None
+        if value not in (1, -1):
+            return JsonResponse({'error': 'Некорректный голос'}, status=400)
+        if not await Post.objects.filter(pk=post_id).aexists():
+            return JsonResponse({'error': 'Запись не найдена'}, status=404)
+        ip_address = get_client_ip(request)
+        user = await request.auser()
+        user = user if user.is_authenticated else None
+
+        for _ in range(self.max_attempts):
+            result = await self.apply_vote(post_id, ip_address, value, user)
+            if result is not None:
+                break
+        else:
+            return JsonResponse({'error': 'Голос изменяется параллельным запросом'}, status=409)
+        status, added, removed, voted_at = result
+
+        await Post.aupdate_rating_counters(post_id, added=added, removed=removed)
+        await trending.arecord_vote(post_id, voted_at, added=added, removed=removed)
+        if status == 'updated':
+            # UPDATE не отправляет сигнал post_save, версия рейтингов для кэша страниц меняется явно
+            await sync_to_async(bump_cache_version)('ratings')
+
+        rating_sum = await Post.objects.filter(pk=post_id).values_list('rating_sum', flat=True).afirst()
+        live.publish_rating(post_id, rating_sum)
+        return JsonResponse({'status': status, 'rating_sum': rating_sum})
+
+    async def apply_vote(self, post_id, ip_address, value, user):
+        """Одна попытка изменить голос: (статус, добавленное значение, отозванное значение, время голоса),
+        None - голос одновременно изменил другой запрос"""
+        votes = self.model.objects.filter(post_id=post_id, ip_address=ip_address)
+        rating = await votes.only('pk', 'value', 'time_create').afirst()
+        if rating is None:
+            try:
+                rating = await self.model.objects.acreate(post_id=post_id, ip_address=ip_address,
+                                                          value=value, user=user)
+            except IntegrityError:
+                return None
+            return 'created', value, None, rating.time_create
+        if rating.value == value:
+            deleted, _ = await votes.filter(pk=rating.pk, value=value).adelete()
+            return ('deleted', None, value, rating.time_create) if deleted else None
+        if await votes.filter(pk=rating.pk, value=rating.value).aupdate(value=value, user=user):
+            return 'updated', value, rating.value, rating.time_create
+        return None
 
 
 def tr_handler404(request, exception):
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class SearchConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.search'
+    verbose_name = 'Поиск'
+
+    def ready(self):
+        """Регистрация сигналов синхронизации поискового индекса с записями блога"""
+        import apps.search.signals
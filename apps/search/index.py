@@ -0,0 +1,113 @@
+import re
+
+from django.core import signing
+from django.db import connection
+from django.utils.html import escape
+
+from apps.services.pagination import CursorPage, CursorSerializer
+from apps.services.sanitizer import html_to_text
+
+INDEX_TABLE = 'search_post_index'
+# Веса колонок для BM25: совпадение в заголовке важнее, чем в описании и тексте
+COLUMN_WEIGHTS = (10.0, 5.0, 1.0)
+# Служебные символы подсветки, заменяются на <mark> после экранирования HTML
+MARK_START, MARK_END = '\x02', '\x03'
+CURSOR_SALT = 'apps.search.index.cursor'
+
+
+def is_supported():
+    """Полнотекстовый индекс доступен только на SQLite (FTS5)"""
+    return connection.vendor == 'sqlite'
+
+
+def index_posts(rows):
+    """Добавление (замена) записей в индексе, rows - кортежи (id, title, description, text)"""
+    rows = [(pk, html_to_text(title), html_to_text(description), html_to_text(text))
+            for pk, title, description, text in rows]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(f'INSERT INTO {INDEX_TABLE} (rowid, title, description, text) VALUES (%s, %s, %s, %s)',
+                           rows)
+
+
+def remove_posts(post_ids):
+    """Удаление записей из индекса"""
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [(pk,) for pk in post_ids])
+
+
+def clear_index():
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {INDEX_TABLE}')
+
+
+def optimize_index():
+    """Слияние сегментов индекса FTS5 после массовой загрузки"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {INDEX_TABLE} ({INDEX_TABLE}) VALUES ('optimize')")
+
+
+def build_match_query(query):
+    """Запрос пользователя в синтаксис MATCH: каждое слово в кавычках (без операторов FTS5) и с поиском по префиксу"""
+    terms = re.findall(r'\w+', query or '')
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def highlight(value):
+    """Экранирование фрагмента и замена служебных символов на теги подсветки"""
+    return escape(value).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def encode_cursor(rank, post_id, backwards=False):
+    return signing.dumps([rank, post_id, backwards], salt=CURSOR_SALT, serializer=CursorSerializer)
+
+
+def decode_cursor(cursor):
+    """Позиция (score, rowid, обход назад) или None для первой страницы"""
+    if not cursor:
+        return None
+    try:
+        rank, post_id, *rest = signing.loads(cursor, salt=CURSOR_SALT, serializer=CursorSerializer)
+        return float(rank), int(post_id), bool(rest and rest[0])
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+
+
+def search(query, limit=10, cursor=None):
+    """Поиск с ранжированием BM25 и keyset-пагинацией по паре (score, rowid) в обе стороны.
+    Возвращает CursorPage словарей с id, rank, title, snippet и токенами следующей и предыдущей страниц."""
+    match = build_match_query(query)
+    if not match:
+        return CursorPage([], False, False)
+    sql = (f'SELECT rowid, bm25({INDEX_TABLE}, %s, %s, %s) AS score, '
+           f'highlight({INDEX_TABLE}, 0, %s, %s), '
+           f"snippet({INDEX_TABLE}, -1, %s, %s, '…', 32) "
+           f'FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s')
+    params = [*COLUMN_WEIGHTS, MARK_START, MARK_END, MARK_START, MARK_END, match]
+    position = decode_cursor(cursor)
+    backwards = position is not None and position[2]
+    if position is not None:
+        operator = '<' if backwards else '>'
+        sql += f' AND (score {operator} %s OR (score = %s AND rowid {operator} %s))'
+        params += [position[0], position[0], position[1]]
+    sql += ' ORDER BY score DESC, rowid DESC LIMIT %s' if backwards else ' ORDER BY score, rowid LIMIT %s'
+    params.append(limit + 1)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, position is not None
+    if not rows:
+        return CursorPage([], False, False)
+    results = [{'id': pk, 'rank': rank, 'title': highlight(title), 'snippet': highlight(snippet)}
+               for pk, rank, title, snippet in rows]
+    return CursorPage(results, has_next, has_previous,
+                      next_cursor=encode_cursor(rows[-1][1], rows[-1][0]),
+                      previous_cursor=encode_cursor(rows[0][1], rows[0][0], backwards=True))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.blog.models import Post
+from apps.search import index
+
+
+class Command(BaseCommand):
+    """Полная переиндексация опубликованных записей: python manage.py rebuild_search_index --batch-size 500"""
+    help = 'Перестраивает полнотекстовый индекс записей блога'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Количество записей в одной пачке')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        last_pk = 0
+        with transaction.atomic():
+            index.clear_index()
+            # Записи читаются пачками по первичному ключу, в памяти одновременно не больше batch_size записей
+            while True:
+                rows = list(Post.objects.filter(status='published', pk__gt=last_pk).order_by('pk')
+                            .values_list('pk', 'title', 'description', 'text')[:batch_size])
+                if not rows:
+                    break
+                index.index_posts(rows)
+                total += len(rows)
+                last_pk = rows[-1][0]
+                self.stdout.write(f'Проиндексировано записей: {total}')
+        index.optimize_index()
+        self.stdout.write(self.style.SUCCESS(f'Поисковый индекс перестроен, записей: {total}'))
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.blog.models import Post
+from . import index
+
+
+@receiver(post_save, sender=Post)
+def update_post_index(sender, instance, raw=False, **kwargs):
+    """Опубликованная запись добавляется в поисковый индекс, черновик из него удаляется"""
+    if raw or not index.is_supported():
+        return
+    if instance.status == 'published':
+        index.index_posts([(instance.pk, instance.title, instance.description, instance.text)])
+    else:
+        index.remove_posts([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def delete_post_index(sender, instance, **kwargs):
+    """Удаление записи из поискового индекса"""
+    if index.is_supported():
+        index.remove_posts([instance.pk])
@@ -0,0 +1,58 @@
+from django.test import TestCase, override_settings
+
+from apps.blog.tests import TEST_SETTINGS, create_posts
+from . import index
+
+
+@override_settings(**TEST_SETTINGS)
+class SearchPaginationTests(TestCase):
+    """Keyset-пагинация результатов поиска при одинаковой оценке BM25"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Одинаковое содержимое: у всех записей одна оценка, порядок задает только rowid
+        create_posts(12)
+
+    def walk_forward(self, limit):
+        pages, cursor = [], None
+        while True:
+            page = index.search('текст', limit=limit, cursor=cursor)
+            pages.append(page)
+            if not page.has_next():
+                return pages
+            cursor = page.next_cursor
+
+    def test_forward_and_backward_traversal(self):
+        forward = self.walk_forward(5)
+        ids = [result['id'] for page in forward for result in page]
+        self.assertEqual(len(ids), 12)
+        self.assertEqual(len(set(ids)), 12)
+        self.assertEqual([len(page) for page in forward], [5, 5, 2])
+
+        backward, page = [forward[-1]], forward[-1]
+        while page.has_previous():
+            page = index.search('текст', limit=5, cursor=page.previous_cursor)
+            backward.append(page)
+        self.assertEqual([[result['id'] for result in page] for page in reversed(backward)],
+                         [[result['id'] for result in page] for page in forward])
+
+    def test_invalid_cursor_returns_first_page(self):
+        first = [result['id'] for result in index.search('текст', limit=5)]
+        self.assertEqual([result['id'] for result in index.search('текст', limit=5, cursor='garbage')], first)
+
+    def test_results_page_links_to_next_and_previous_pages(self):
+        response = self.client.get('/search/', {'q': 'текст'})
+        next_url = response.context['next_page_url']
+        self.assertIsNotNone(next_url)
+        self.assertIsNone(response.context['previous_page_url'])
+        self.assertContains(response, 'Вперед')
+
+        response = self.client.get(f'/search/{next_url}')
+        self.assertIsNotNone(response.context['previous_page_url'])
+        self.assertContains(response, 'Назад')
+
+    def test_indexed_text_matches_sanitized_text(self):
+        post = create_posts(1, title='Заметка', text='<p>Видимый&nbsp;текст</p><script>скрытый</script>')[0]
+        self.assertEqual([result['id'] for result in index.search('видимый')], [post.pk])
+        # Содержимое script удаляется санитайзером и не попадает в индекс
+        self.assertEqual(list(index.search('скрытый')), [])
@@ -0,0 +1,32 @@
+from django.views.generic import TemplateView
+
+from apps.blog.models import Post
+from . import index
+
+
+class SearchView(TemplateView):
+    """Полнотекстовый поиск по записям блога (FTS5, ранжирование BM25, подсветка совпадений)"""
+    template_name = 'search/search_results.html'
+    paginate_by = 10
+
+    def get_cursor_url(self, cursor):
+        """Ссылка на страницу результатов с сохранением запроса"""
+        params = self.request.GET.copy()
+        params['cursor'] = cursor
+        return f'?{params.urlencode()}'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        page = index.search(query, limit=self.paginate_by, cursor=self.request.GET.get('cursor'))
+        # Записи подгружаются одним запросом и выводятся в порядке релевантности
+        posts = Post.custom.in_bulk([result['id'] for result in page])
+        for result in page:
+            result['post'] = posts.get(result['id'])
+        context['title'] = f'Поиск: {query}' if query else 'Поиск'
+        context['query'] = query
+        context['results'] = [result for result in page if result['post'] is not None]
+        context['cursor_page'] = page
+        context['next_page_url'] = self.get_cursor_url(page.next_cursor) if page.has_next() else None
+        context['previous_page_url'] = self.get_cursor_url(page.previous_cursor) if page.has_previous() else None
+        return context
@@ -0,0 +1,57 @@
+"""Общие классы админки для больших таблиц.
+
+Стандартные фильтры по внешнему ключу перечисляют все связанные объекты, а список изменений
+считает строки таблицы дважды (с фильтрами и без). ScalableAdminMixin ограничивает подсчет,
+InputFilter фильтрует по значению из поля ввода (id записи, логин) без выборки вариантов."""
+from django.contrib import admin
+
+from .pagination import LimitedCountPaginator
+
+
+class ScalableAdminMixin:
+    """Список изменений без полного COUNT(*) таблицы: подсчет ограничен LimitedCountPaginator"""
+    paginator = LimitedCountPaginator
+    show_full_result_count = False
+    # Счетчики вариантов фильтров (facets) - те же COUNT(*) по каждому варианту
+    show_facets = admin.ShowFacets.NEVER
+    list_per_page = 50
+
+
+class InputFilter(admin.SimpleListFilter):
+    """Фильтр списка изменений с полем ввода. lookup - условие фильтрации, например 'author__username'"""
+    template = 'admin/input_filter.html'
+    lookup = None
+
+    def lookups(self, request, model_admin):
+        # Фильтр отображается, только если есть варианты выбора
+        return ((None, None),)
+
+    def clean_value(self, value):
+        """Значение для условия фильтрации или None, если значение некорректно"""
+        return value.strip() or None
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        value = self.clean_value(self.value())
+        if value is None:
+            return queryset.none()
+        return queryset.filter(**{self.lookup: value})
+
+    def choices(self, changelist):
+        """Ссылка сброса фильтра и остальные параметры запроса для скрытых полей формы"""
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'query_parts': [(name, value) for name, value in changelist.params.items()
+                            if name != self.parameter_name],
+            'display': 'Все',
+        }
+
+
+class IdInputFilter(InputFilter):
+    """Фильтр по числовому идентификатору"""
+
+    def clean_value(self, value):
+        value = value.strip()
+        return int(value) if value.isdigit() else None
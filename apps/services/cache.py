@@ -0,0 +1,29 @@
+import time
+
+from django.core.cache import cache
+
+
+def _initial_version():
+    """Начальная версия берется из времени, чтобы после вытеснения ключа не вернуться к старой версии"""
+    return int(time.time() * 1000)
+
+
+def get_cache_version(name):
+    """Текущая версия набора данных, используется как часть ключей кэша"""
+    key = f'cache-version-{name}'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key, _initial_version())
+    return version
+
+
+def bump_cache_version(name):
+    """Увеличение версии набора данных: все ключи, построенные на старой версии, становятся неактуальными"""
+    key = f'cache-version-{name}'
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _initial_version()
+        cache.set(key, version, None)
+        return version
@@ -0,0 +1,184 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+from .instrumentation import record_cache
+
+# Хранилища первого уровня и счетчики общие для всех потоков процесса (Django создает экземпляр кэша на поток)
+_stores = {}
+_stats = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+class TwoTierCache(BaseCache):
+    """Двухуровневый кэш: L1 - ограниченный LRU в памяти процесса с коротким TTL,
+    L2 - общий кэш из CACHES (алиас в LOCATION), например FileBasedCache или Redis.
+
+    Чтение сначала идет в L1, при промахе - в L2 с заполнением L1. Запись и удаление
+    обновляют оба уровня. Другие процессы видят изменение после истечения L1_TIMEOUT,
+    поэтому L1_TIMEOUT - максимальное время устаревания данных между процессами.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'apps.services.cache_backends.TwoTierCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {'L1_MAX_ENTRIES': 1000, 'L1_TIMEOUT': 5},
+        },
+        'shared': {...},
+    }
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = location or 'shared'
+        self._l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self._l1_timeout = float(options.get('L1_TIMEOUT', 5))
+        with _registry_lock:
+            self._store = _stores.setdefault(self._l2_alias, OrderedDict())
+            self._stats = _stats.setdefault(self._l2_alias, {'l1_hits': 0, 'l2_hits': 0, 'misses': 0, 'evictions': 0})
+            self._lock = _locks.setdefault(self._l2_alias, threading.Lock())
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def get_stats(self):
+        """Счетчики попаданий, промахов и вытеснений L1 для текущего процесса"""
+        with self._lock:
+            return dict(self._stats, l1_size=len(self._store))
+
+    def _count(self, name, amount=1):
+        self._stats[name] += amount
+
+    def _l1_expiry(self, timeout):
+        """Срок жизни записи в L1 не больше L1_TIMEOUT и не больше срока жизни в L2"""
+        expiry = time.monotonic() + self._l1_timeout
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is not None:
+            expiry = min(expiry, time.monotonic() + timeout)
+        return expiry
+
+    def _l1_get(self, key):
+        """(найдено, значение) из L1 с продвижением записи в LRU"""
+        with self._lock:
+            entry = self._store.get(key)
+            if entry is None:
+                return False, None
+            expiry, data = entry
+            if expiry <= time.monotonic():
+                del self._store[key]
+                return False, None
+            self._store.move_to_end(key)
+            self._count('l1_hits')
+        return True, pickle.loads(data)
+
+    def _l1_set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._store[key] = (self._l1_expiry(timeout), data)
+            self._store.move_to_end(key)
+            while len(self._store) > self._l1_max_entries:
+                self._store.popitem(last=False)
+                self._count('evictions')
+
+    def _l1_delete(self, key):
+        with self._lock:
+            self._store.pop(key, None)
+
+    def get(self, key, default=None, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        found, value = self._l1_get(l1_key)
+        if found:
+            record_cache(hits=1)
+            return value
+        sentinel = object()
+        value = self.l2.get(key, sentinel, version=version)
+        if value is sentinel:
+            with self._lock:
+                self._count('misses')
+            record_cache(misses=1)
+            return default
+        with self._lock:
+            self._count('l2_hits')
+        record_cache(hits=1)
+        self._l1_set(l1_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        result = {}
+        missing = []
+        for key in keys:
+            found, value = self._l1_get(self.make_and_validate_key(key, version=version))
+            if found:
+                result[key] = value
+            else:
+                missing.append(key)
+        if missing:
+            fetched = self.l2.get_many(missing, version=version)
+            with self._lock:
+                self._count('l2_hits', len(fetched))
+                self._count('misses', len(missing) - len(fetched))
+            for key, value in fetched.items():
+                self._l1_set(self.make_and_validate_key(key, version=version), value)
+            result.update(fetched)
+        record_cache(hits=len(result), misses=len(keys) - len(result))
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout=timeout, version=version)
+        self._l1_set(self.make_and_validate_key(key, version=version), value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout=timeout, version=version)
+        if added:
+            self._l1_set(self.make_and_validate_key(key, version=version), value, timeout)
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout=timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self._l1_set(self.make_and_validate_key(key, version=version), value, timeout)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l1_delete(self.make_and_validate_key(key, version=version))
+        return self.l2.touch(key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._l1_delete(self.make_and_validate_key(key, version=version))
+        return self.l2.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._l1_delete(self.make_and_validate_key(key, version=version))
+        self.l2.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        found, _ = self._l1_get(self.make_and_validate_key(key, version=version))
+        return found or self.l2.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарность обеспечивает L2, значение в L1 сбрасывается"""
+        self._l1_delete(self.make_and_validate_key(key, version=version))
+        return self.l2.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        self._l1_delete(self.make_and_validate_key(key, version=version))
+        return self.l2.decr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._store.clear()
+        self.l2.clear()
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
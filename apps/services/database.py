@@ -0,0 +1,118 @@
+"""Настройка соединений с БД и распределение запросов между основной БД и репликой.
+
+При каждом подключении к SQLite выполняются PRAGMA из DATABASES[alias]['PRAGMAS'] поверх SQLITE_PRAGMAS:
+WAL позволяет читателям не ждать писателя, busy_timeout - ждать блокировку вместо ошибки
+"database is locked", synchronous=NORMAL в режиме WAL не теряет целостность при сбое процесса.
+
+PrimaryReplicaRouter отправляет чтение в реплику только в запросах, которые разрешил
+ReplicaRoutingMiddleware (безопасные методы без недавней записи этого клиента). Запись, чтение
+внутри транзакции и весь код вне запросов (команды, фоновые задачи) работают с основной БД.
+После POST клиент получает cookie и DATABASE_PRIMARY_STICKY_SECONDS секунд читает из основной БД,
+поэтому сразу видит свои изменения, даже если реплика отстает."""
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.backends.signals import connection_created
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+    'cache_size': -20000,
+}
+REPLICA_DB_ALIAS = 'replica'
+STICKY_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """PRAGMA для нового соединения SQLite (значения None отключают PRAGMA по умолчанию)"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(SQLITE_PRAGMAS, **connection.settings_dict.get('PRAGMAS', {}))
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            if value is not None:
+                cursor.execute(f'PRAGMA {name} = {value}')
+
+
+connection_created.connect(configure_sqlite, dispatch_uid='configure-sqlite')
+
+
+def get_replica_alias():
+    alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', REPLICA_DB_ALIAS)
+    return alias if alias in settings.DATABASES else None
+
+
+class PrimaryReplicaRouter:
+    """Чтение из реплики в разрешенных запросах, остальное - в основную БД"""
+
+    def db_for_read(self, model, **hints):
+        replica = get_replica_alias()
+        # Внутри транзакции чтение идет через то же соединение, что и запись, иначе изменения не видны
+        if replica is None or not _use_replica.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика содержит те же данные, что и основная БД
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """Разрешает чтение из реплики для безопасных запросов и закрепляет клиента
+    за основной БД на DATABASE_PRIMARY_STICKY_SECONDS секунд после изменяющего запроса"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sticky_seconds = getattr(settings, 'DATABASE_PRIMARY_STICKY_SECONDS', 10)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def can_use_replica(self, request):
+        if request.method not in SAFE_METHODS:
+            return False
+        try:
+            return float(request.COOKIES.get(STICKY_COOKIE, 0)) < time.time()
+        except ValueError:
+            return True
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _use_replica.set(self.can_use_replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        token = _use_replica.set(self.can_use_replica(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 500 and self.sticky_seconds:
+            response.set_cookie(STICKY_COOKIE, str(int(time.time() + self.sticky_seconds)),
+                                max_age=self.sticky_seconds, httponly=True, samesite='Lax')
+        return response
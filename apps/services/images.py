@@ -0,0 +1,172 @@
+"""Адаптивные варианты изображений: уменьшенные копии по ширине в исходном формате и в WebP.
+
+Варианты хранятся рядом с медиафайлами в images/variants/ и создаются вне запроса в пуле потоков
+(Pillow освобождает GIL при декодировании и масштабировании). Список готовых ширин изображения
+кэшируется, поэтому шаблоны строят srcset без обращений к файловой системе.
+
+IMAGE_VARIANT_WIDTHS = {'thumbnail': (320, 640, 960), 'avatar': (64, 128, 256)}"""
+import hashlib
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'images/variants'
+DEFAULT_WIDTHS = {'thumbnail': (320, 640, 960), 'avatar': (64, 128, 256)}
+
+_executor = None
+_executor_lock = threading.Lock()
+# Изображения, которые уже стоят в очереди пула (одно изображение часто сохраняется несколько раз подряд)
+_queued = set()
+
+
+def get_widths(kind):
+    return tuple(getattr(settings, 'IMAGE_VARIANT_WIDTHS', DEFAULT_WIDTHS).get(kind, ()))
+
+
+def get_executor():
+    """Общий пул потоков процесса для генерации вариантов"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'IMAGE_VARIANT_WORKERS', 2),
+                                           thread_name_prefix='image-variants')
+    return _executor
+
+
+def variant_name(name, width, extension):
+    """images/thumbnails/2024/01/01/photo.jpg -> images/variants/images/thumbnails/2024/01/01/photo-640w.webp.
+    width - фактическая ширина варианта"""
+    stem = os.path.splitext(name)[0]
+    return f'{VARIANTS_DIR}/{stem}-{width}w.{extension}'
+
+
+def _stored_widths(name):
+    """Ширины вариантов WebP в хранилище по именам файлов (одно чтение каталога)"""
+    directory = os.path.dirname(variant_name(name, 0, 'webp'))
+    pattern = re.compile(rf'{re.escape(os.path.basename(os.path.splitext(name)[0]))}-(\d+)w\.webp')
+    try:
+        _, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(int(match.group(1)) for match in map(pattern.fullmatch, files) if match)
+
+
+def fallback_extension(name):
+    """Формат варианта для браузеров без WebP: PNG сохраняет прозрачность, остальное сохраняется в JPEG"""
+    extension = os.path.splitext(name)[1].lower().lstrip('.')
+    return 'png' if extension == 'png' else 'jpg'
+
+
+def _cache_key(name):
+    return f'image-variants-{hashlib.md5(name.encode()).hexdigest()}'
+
+
+def get_variant_widths(name, kind):
+    """Ширины готовых вариантов изображения (из кэша, при промахе - по файлам в хранилище).
+    Пустой результат проверки хранилища не кэшируется: варианты могут быть еще не созданы"""
+    if not name:
+        return []
+    widths = cache.get(_cache_key(name))
+    if widths is None:
+        widths = _stored_widths(name)
+        if widths:
+            cache.set(_cache_key(name), widths, 60 * 60 * 24)
+    return widths
+
+
+def generate_variants(name, kind, force=False):
+    """Создание вариантов изображения (без увеличения исходника). Возвращает список фактических ширин.
+    Для отсутствующего исходника (например, изображения по умолчанию вне media) кэшируется пустой список."""
+    widths = get_widths(kind)
+    if not default_storage.exists(name):
+        cache.set(_cache_key(name), [], 60 * 60 * 24)
+        return []
+    with default_storage.open(name, 'rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    fallback = fallback_extension(name)
+    ready = []
+    for width in widths:
+        # Увеличенные копии не создаются: для исходника уже заданной ширины остается вариант
+        # исходной ширины, и в имени файла и srcset указывается фактическая ширина
+        if width >= image.width and ready:
+            break
+        width = min(width, image.width)
+        names = {'webp': variant_name(name, width, 'webp'), fallback: variant_name(name, width, fallback)}
+        if not force and all(default_storage.exists(path) for path in names.values()):
+            ready.append(width)
+            continue
+        resized = image.copy()
+        resized.thumbnail((width, image.height), Image.LANCZOS)
+        for extension, path in names.items():
+            _save(resized, path, extension)
+        ready.append(width)
+    cache.set(_cache_key(name), ready, 60 * 60 * 24)
+    return ready
+
+
+def _save(image, path, extension):
+    buffer = BytesIO()
+    if extension == 'webp':
+        image.save(buffer, 'WEBP', quality=getattr(settings, 'IMAGE_WEBP_QUALITY', 80), method=4)
+    elif extension == 'png':
+        image.save(buffer, 'PNG', optimize=True)
+    else:
+        image.convert('RGB').save(buffer, 'JPEG', quality=85, optimize=True, progressive=True)
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    default_storage.save(path, ContentFile(buffer.getvalue()))
+
+
+def _generate_safely(name, kind):
+    try:
+        return generate_variants(name, kind)
+    except Exception:
+        logger.exception('Не удалось создать варианты изображения %s', name)
+    finally:
+        with _executor_lock:
+            _queued.discard(name)
+
+
+def _submit(name, kind):
+    executor = get_executor()
+    with _executor_lock:
+        if name in _queued:
+            return
+        _queued.add(name)
+    executor.submit(_generate_safely, name, kind)
+
+
+def schedule_variants(name, kind):
+    """Генерация вариантов в пуле потоков после фиксации транзакции, если изображение еще не обработано
+    (результат generate_variants, в том числе пустой, хранится в кэше)"""
+    if not name or not get_widths(kind) or cache.get(_cache_key(name)) is not None:
+        return
+    transaction.on_commit(lambda: _submit(name, kind))
+
+
+def build_srcset(name, kind, extension):
+    """Значение атрибута srcset из готовых вариантов ('' если вариантов еще нет)"""
+    return ', '.join(f'{default_storage.url(variant_name(name, width, extension))} {width}w'
+                     for width in get_variant_widths(name, kind))
+
+
+def get_variant_url(name, kind, width):
+    """URL наименьшего готового варианта не уже width, иначе исходного изображения"""
+    widths = get_variant_widths(name, kind)
+    for variant_width in widths:
+        if variant_width >= width:
+            return default_storage.url(variant_name(name, variant_width, fallback_extension(name)))
+    return default_storage.url(name)
@@ -0,0 +1,266 @@
+"""Легкий замер каждого запроса: количество и время SQL запросов, время рендеринга шаблонов,
+попадания и промахи кэша.
+
+Метрики текущего запроса хранятся в contextvar, поэтому корректно разделяются между потоками
+и асинхронными задачами (sync_to_async копирует контекст, объект метрик общий). Итоги отдаются
+в заголовке Server-Timing и накапливаются в гистограммах по имени маршрута в памяти процесса.
+При нескольких процессах сервера у каждого процесса своя статистика.
+
+Настройки:
+SERVER_TIMING_HEADER - True (всем), False (никому) или 'staff' (DEBUG или сотрудникам, по умолчанию)
+INSTRUMENTATION_ENABLED - включение замеров (по умолчанию True)"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template import base as template_base
+
+_current = ContextVar('request_metrics', default=None)
+
+# Границы корзин гистограмм времени в миллисекундах: от 0.1 мс до ~2 минут с шагом 25%
+TIME_BUCKETS = tuple(round(0.1 * 1.25 ** i, 3) for i in range(64))
+# Количество SQL запросов считается точно до 200, больше - только максимум
+QUERY_BUCKETS = tuple(range(200))
+PERCENTILES = (50, 95, 99)
+
+
+class RequestMetrics:
+    """Счетчики одного запроса"""
+    __slots__ = ('sql_count', 'sql_time', 'template_time', 'template_depth', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class Histogram:
+    """Гистограмма с фиксированными логарифмическими корзинами: память не растет с числом запросов"""
+
+    def __init__(self, buckets=TIME_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, percent):
+        """Верхняя граница корзины, в которую попадает перцентиль (не больше максимума)"""
+        if not self.total:
+            return None
+        rank = self.total * percent / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                value = min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+                return round(value, 3)
+        return round(self.max, 3)
+
+    def summary(self):
+        result = {f'p{percent}': self.percentile(percent) for percent in PERCENTILES}
+        result.update(avg=round(self.sum / self.total, 3) if self.total else None, max=round(self.max, 3))
+        return result
+
+
+class ViewStats:
+    """Накопленные метрики маршрута"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.duration = Histogram()
+        self.sql_time = Histogram()
+        self.template_time = Histogram()
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add(self, duration, metrics, status_code):
+        self.requests += 1
+        if status_code >= 500:
+            self.errors += 1
+        self.duration.add(duration)
+        self.sql_time.add(metrics.sql_time)
+        self.template_time.add(metrics.template_time)
+        self.queries.add(metrics.sql_count)
+        self.cache_hits += metrics.cache_hits
+        self.cache_misses += metrics.cache_misses
+
+    def summary(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'duration_ms': self.duration.summary(),
+            'sql_ms': self.sql_time.summary(),
+            'template_ms': self.template_time.summary(),
+            'queries': self.queries.summary(),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+_installed = False
+_install_lock = threading.Lock()
+
+
+def record_cache(hits=0, misses=0):
+    """Вызывается бэкендом кэша при чтении"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_count += 1
+        metrics.sql_time += (time.perf_counter() - started) * 1000
+
+
+def _add_sql_wrapper(connection, **kwargs):
+    if _sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _sql_wrapper)
+
+
+def _timed_render(render):
+    def wrapper(self, context):
+        metrics = _current.get()
+        if metrics is None:
+            return render(self, context)
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            metrics.template_depth -= 1
+            # Вложенные шаблоны (include, inclusion-теги) уже учтены во времени внешнего шаблона
+            if not metrics.template_depth:
+                metrics.template_time += (time.perf_counter() - started) * 1000
+    wrapper.instrumented = True
+    return wrapper
+
+
+def install():
+    """Подключение замеров SQL ко всем соединениям и рендеринга к шаблонам (один раз на процесс)"""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        connection_created.connect(_add_sql_wrapper, dispatch_uid='instrumentation-sql')
+        for connection in connections.all(initialized_only=True):
+            _add_sql_wrapper(connection)
+        if not getattr(template_base.Template.render, 'instrumented', False):
+            template_base.Template.render = _timed_render(template_base.Template.render)
+        _installed = True
+
+
+def record(view_name, duration, metrics, status_code):
+    with _stats_lock:
+        stats = _stats.get(view_name)
+        if stats is None:
+            stats = _stats[view_name] = ViewStats()
+        stats.add(duration, metrics, status_code)
+
+
+def get_stats():
+    """Сводка по маршрутам, самые медленные (по p95) первыми"""
+    with _stats_lock:
+        summary = {name: stats.summary() for name, stats in _stats.items()}
+    return dict(sorted(summary.items(), key=lambda item: item[1]['duration_ms']['p95'] or 0, reverse=True))
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def format_server_timing(duration, metrics):
+    return ', '.join((
+        f'db;dur={metrics.sql_time:.1f};desc="{metrics.sql_count} SQL"',
+        f'tpl;dur={metrics.template_time:.1f};desc="Templates"',
+        f'cache;desc="hit {metrics.cache_hits} / miss {metrics.cache_misses}"',
+        f'total;dur={duration:.1f}',
+    ))
+
+
+class InstrumentationMiddleware:
+    """Замер запроса: заголовок Server-Timing и гистограммы по имени маршрута.
+    Ставится первым в MIDDLEWARE, чтобы учитывать время остальных middleware."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'INSTRUMENTATION_ENABLED', True)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        if self.enabled:
+            install()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    def show_header(self, request):
+        mode = getattr(settings, 'SERVER_TIMING_HEADER', 'staff')
+        if mode == 'staff':
+            user = getattr(request, 'user', None)
+            return settings.DEBUG or bool(user is not None and user.is_staff)
+        return bool(mode)
+
+    def finish(self, request, response, metrics, started):
+        duration = (time.perf_counter() - started) * 1000
+        # Длительность потокового ответа (SSE) определяется клиентом и не попадает в гистограммы
+        if not response.streaming:
+            match = getattr(request, 'resolver_match', None)
+            view_name = match.view_name if match is not None and match.view_name else '<unresolved>'
+            record(view_name, duration, metrics, response.status_code)
+        if self.show_header(request):
+            response['Server-Timing'] = format_server_timing(duration, metrics)
+        return response
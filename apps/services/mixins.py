@@ -1,7 +1,16 @@
+import hashlib
+import time
+
+from django.conf import settings
 from django.contrib.auth.mixins import AccessMixin
 from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
 from django.shortcuts import redirect
 
+from .cache import get_cache_version
+from .pagination import CursorPage, CursorPaginator
+
 
 class AuthorRequiredMixin(AccessMixin):
     """Миксин для добавления возможности редактирования статьи только автором или админом."""
@@ -14,3 +23,85 @@ class AuthorRequiredMixin(AccessMixin):
                 messages.info(request, 'Изменение статьи доступно только автору!')
                 return redirect('home')
         return super().dispatch(request, *args, **kwargs)
+
+
+class CursorPaginationMixin:
+    """Миксин для ListView: keyset-пагинация по токену ?cursor=...
+    Включается атрибутом pagination_mode = 'cursor', старые ссылки вида ?page=N продолжают работать через OFFSET."""
+    pagination_mode = 'offset'
+    cursor_kwarg = 'cursor'
+    cursor_ordering = ('-fixed', '-create', '-pk')
+
+    def get_cursor_ordering(self):
+        return self.cursor_ordering
+
+    def use_cursor_pagination(self):
+        return self.pagination_mode == 'cursor' and self.page_kwarg not in self.request.GET
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size, self.get_cursor_ordering())
+        page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        return paginator, page, page.object_list, False
+
+    def get_cursor_url(self, cursor):
+        """Ссылка на страницу с сохранением остальных GET-параметров"""
+        params = self.request.GET.copy()
+        params.pop(self.page_kwarg, None)
+        params[self.cursor_kwarg] = cursor
+        return f'?{params.urlencode()}'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context.get('page_obj')
+        if isinstance(page, CursorPage):
+            context['cursor_page'] = page
+            context['next_page_url'] = self.get_cursor_url(page.next_cursor) if page.has_next() else None
+            context['previous_page_url'] = self.get_cursor_url(page.previous_cursor) if page.has_previous() else None
+        return context
+
+
+class AnonymousPageCacheMixin:
+    """Миксин кэширования страниц целиком для анонимных GET-запросов.
+    Ключ строится из URL и версии контента, которую сигналы увеличивают при изменении данных.
+    Изменения рейтинга не сбрасывают кэш сразу: страница с устаревшими счетчиками отдается
+    не дольше PAGE_CACHE_RATING_STALENESS секунд после голосования."""
+    page_cache_version = 'content'
+
+    def is_page_cacheable(self, request):
+        return (request.method in ('GET', 'HEAD')
+                and not request.user.is_authenticated
+                # Страница с flash-сообщениями индивидуальна
+                and not request.COOKIES.get('messages'))
+
+    def get_page_cache_key(self, request):
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        return f'page-{self.page_cache_version}-{get_cache_version(self.page_cache_version)}-{path}'
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.is_page_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+        cache_key = self.get_page_cache_key(request)
+        ratings_version = get_cache_version('ratings')
+        entry = cache.get(cache_key)
+        staleness = getattr(settings, 'PAGE_CACHE_RATING_STALENESS', 30)
+        if entry is not None and (entry['ratings_version'] == ratings_version
+                                  or time.time() - entry['created'] < staleness):
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+            response['X-Page-Cache'] = 'HIT'
+            return response
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200 and hasattr(response, 'add_post_render_callback'):
+            def store(rendered):
+                # Ответы, устанавливающие cookie (в том числе CSRF), не кэшируются
+                if not rendered.cookies and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+                    cache.set(cache_key, {'content': rendered.content,
+                                          'content_type': rendered['Content-Type'],
+                                          'ratings_version': ratings_version,
+                                          'created': time.time()},
+                              getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 15))
+            response.add_post_render_callback(store)
+            response['X-Page-Cache'] = 'MISS'
+        return response
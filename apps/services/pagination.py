@@ -0,0 +1,118 @@
+import json
+
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+
+class CursorPage:
+    """Страница keyset-пагинации (аналог Page, но без подсчета общего количества записей)"""
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor if has_next else None
+        self.previous_cursor = previous_cursor if has_previous else None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset (cursor) пагинация: вместо OFFSET и COUNT(*) страница выбирается условием по ключу сортировки
+    последней записи предыдущей страницы, поэтому глубокие страницы стоят столько же, сколько первая.
+    ordering - поля сортировки, последним должно идти уникальное поле (например, '-pk')."""
+    salt = 'apps.services.pagination.cursor'
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+
+    def _fields(self, backwards=False):
+        """Пары (имя поля, по убыванию) с учетом направления обхода"""
+        return [(name.lstrip('-'), name.startswith('-') != backwards) for name in self.ordering]
+
+    def _to_python(self, name, value):
+        field = self.queryset.model._meta.pk if name == 'pk' else self.queryset.model._meta.get_field(name)
+        return field.to_python(value)
+
+    def encode_cursor(self, obj, backwards=False):
+        """Непрозрачный подписанный токен с позицией записи"""
+        values = [getattr(obj, name) for name, _ in self._fields()]
+        return signing.dumps({'v': values, 'b': backwards}, salt=self.salt, serializer=CursorSerializer)
+
+    def decode_cursor(self, cursor):
+        """Разбор токена, при ошибке возвращаем позицию первой страницы"""
+        if not cursor:
+            return None, False
+        try:
+            data = signing.loads(cursor, salt=self.salt, serializer=CursorSerializer)
+            values = [self._to_python(name, value) for (name, _), value in zip(self._fields(), data['v'], strict=True)]
+        except (signing.BadSignature, ValueError, TypeError, KeyError):
+            return None, False
+        return values, bool(data.get('b'))
+
+    def _position_filter(self, values, backwards):
+        """Лексикографическое условие (a, b, c) < (x, y, z) в виде OR из префиксных равенств"""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self._fields(backwards), values):
+            lookup = 'lt' if descending else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def page(self, cursor=None):
+        """Получение страницы по токену: одна выборка per_page + 1 записей по индексу сортировки"""
+        values, backwards = self.decode_cursor(cursor)
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._position_filter(values, backwards))
+        order = [f'-{name}' if descending else name for name, descending in self._fields(backwards)]
+        rows = list(queryset.order_by(*order)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        if not rows:
+            return CursorPage(rows, False, False)
+        return CursorPage(rows, has_next, has_previous,
+                          next_cursor=self.encode_cursor(rows[-1]),
+                          previous_cursor=self.encode_cursor(rows[0], backwards=True))
+
+
+class LimitedCountPaginator(Paginator):
+    """Paginator с ограниченным подсчетом: COUNT(*) выполняется по подзапросу с LIMIT max_count,
+    поэтому стоимость подсчета не растет с размером таблицы. Страницы дальше max_count недоступны,
+    к ним переходят через фильтры (например, в админке)."""
+    max_count = 10000
+
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet):
+            # Сортировка в подзапросе с LIMIT не нужна для подсчета и потребовала бы сортировки всей выборки
+            return self.object_list.order_by()[:self.max_count].count()
+        return min(len(self.object_list), self.max_count)
+
+
+class CursorSerializer(signing.JSONSerializer):
+    """JSON-сериализатор для signing, даты сохраняются с микросекундами (точное сравнение ключа)"""
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':'), default=lambda value: value.isoformat()).encode('latin-1')
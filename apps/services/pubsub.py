@@ -0,0 +1,168 @@
+"""Публикация событий и подписка на каналы для потоковых ответов (SSE).
+
+Бэкенд задается настройкой PUBSUB_BACKEND (путь к классу), по умолчанию InMemoryPubSub -
+подписчики в памяти процесса. Для нескольких процессов подключается бэкенд с тем же интерфейсом
+поверх внешнего брокера (например, Redis pub/sub).
+
+publish() можно вызывать из синхронного кода любого потока: сообщение передается в цикл событий
+подписчика через call_soon_threadsafe. У каждого подписчика ограниченный буфер: сообщения с ключом
+coalesce (например, итог рейтинга) заменяют еще не отправленное сообщение с тем же ключом, а при
+переполнении буфера медленный подписчик отключается с событием overflow, не задерживая остальных."""
+import asyncio
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class SubscriptionLimitError(Exception):
+    """Превышено количество подписчиков канала или процесса"""
+
+
+class Subscription:
+    """Подписка на канал: асинхронный итератор сообщений с ограниченным буфером"""
+
+    def __init__(self, pubsub, channel, max_queue):
+        self.pubsub = pubsub
+        self.channel = channel
+        self.max_queue = max_queue
+        self.loop = asyncio.get_running_loop()
+        self.buffer = deque()
+        self.pending = {}
+        self.event = asyncio.Event()
+        self.closed = False
+        self.overflowed = False
+
+    def deliver(self, message):
+        """Вызывается в цикле событий подписчика"""
+        if self.closed:
+            return
+        key = message.get('coalesce')
+        if key is not None and key in self.pending:
+            self.pending[key].update(message)
+        elif len(self.buffer) >= self.max_queue:
+            self.overflowed = True
+            self.buffer.clear()
+            self.pending.clear()
+        else:
+            message = dict(message)
+            self.buffer.append(message)
+            if key is not None:
+                self.pending[key] = message
+        self.event.set()
+
+    async def get(self, timeout=None):
+        """Следующее сообщение или None по истечении timeout.
+        При переполнении буфера возвращается событие overflow и подписка закрывается."""
+        while not self.buffer and not self.overflowed:
+            self.event.clear()
+            try:
+                await asyncio.wait_for(self.event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self.overflowed:
+            self.close()
+            return {'event': 'overflow', 'data': {}}
+        message = self.buffer.popleft()
+        self.pending.pop(message.get('coalesce'), None)
+        return message
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.pubsub.unsubscribe(self)
+
+
+class BasePubSub:
+    """Интерфейс бэкенда: publish(channel, event, data, coalesce=None), subscribe(channel)
+    и can_subscribe(channel)"""
+
+    def __init__(self, max_subscribers=1000, max_channel_subscribers=100, max_queue=100):
+        self.max_subscribers = max_subscribers
+        self.max_channel_subscribers = max_channel_subscribers
+        self.max_queue = max_queue
+
+    def publish(self, channel, event, data, coalesce=None):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        raise NotImplementedError
+
+    def can_subscribe(self, channel):
+        """Есть ли место для нового подписчика канала (без создания подписки)"""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class InMemoryPubSub(BasePubSub):
+    """Подписчики в памяти процесса (один процесс ASGI сервера)"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._channels = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event, data, coalesce=None):
+        message = {'event': event, 'data': data, 'coalesce': coalesce}
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # Цикл событий подписчика уже закрыт
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+    def _is_full(self, channel):
+        return (self._count >= self.max_subscribers
+                or len(self._channels.get(channel, ())) >= self.max_channel_subscribers)
+
+    def can_subscribe(self, channel):
+        with self._lock:
+            return not self._is_full(channel)
+
+    def subscribe(self, channel):
+        with self._lock:
+            if self._is_full(channel):
+                raise SubscriptionLimitError(channel)
+            subscribers = self._channels.setdefault(channel, set())
+            subscription = Subscription(self, channel, self.max_queue)
+            subscribers.add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers and subscription in subscribers:
+                subscribers.discard(subscription)
+                self._count -= 1
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def get_stats(self):
+        with self._lock:
+            return {'subscribers': self._count, 'channels': len(self._channels)}
+
+
+_pubsub = None
+_pubsub_lock = threading.Lock()
+
+
+def get_pubsub():
+    """Экземпляр бэкенда процесса из настроек PUBSUB_BACKEND и PUBSUB_OPTIONS"""
+    global _pubsub
+    with _pubsub_lock:
+        if _pubsub is None:
+            backend = import_string(getattr(settings, 'PUBSUB_BACKEND', 'apps.services.pubsub.InMemoryPubSub'))
+            _pubsub = backend(**getattr(settings, 'PUBSUB_OPTIONS', {}))
+    return _pubsub
+
+
+def publish(channel, event, data, coalesce=None):
+    return get_pubsub().publish(channel, event, data, coalesce=coalesce)
@@ -0,0 +1,156 @@
+"""Очистка HTML из редактора по списку разрешенных тегов и атрибутов и получение простого текста.
+
+Используется стандартный html.parser: неизвестные теги удаляются с сохранением содержимого,
+script/style/iframe и подобные - вместе с содержимым, ссылки допускаются только с безопасными схемами,
+из style остаются только свойства оформления без url() и expression()."""
+import re
+from html import escape
+from html.parser import HTMLParser
+
+ALLOWED_TAGS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'caption', 'code', 'del', 'div', 'em', 'figcaption', 'figure',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'img', 'ins', 'li', 'ol', 'p', 'pre', 's', 'small', 'span',
+    'strike', 'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'u', 'ul',
+}
+VOID_TAGS = {'br', 'hr', 'img'}
+# Теги, содержимое которых удаляется вместе с ними
+DROP_CONTENT_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'noscript', 'template', 'textarea', 'select'}
+# Блочные теги разделяют слова при получении простого текста
+BLOCK_TAGS = {
+    'blockquote', 'br', 'caption', 'div', 'figcaption', 'figure', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr',
+    'li', 'ol', 'p', 'pre', 'table', 'td', 'th', 'tr', 'ul',
+}
+ALLOWED_ATTRIBUTES = {
+    '*': {'class', 'style', 'title'},
+    'a': {'href', 'name', 'target', 'rel'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'td': {'colspan', 'rowspan', 'align', 'valign'},
+    'th': {'colspan', 'rowspan', 'align', 'valign', 'scope'},
+    'table': {'border', 'cellpadding', 'cellspacing', 'summary'},
+    'ol': {'start', 'type'},
+}
+URL_ATTRIBUTES = {'href', 'src'}
+ALLOWED_SCHEMES = {'http', 'https', 'mailto', 'tel'}
+ALLOWED_STYLES = {
+    'background-color', 'border', 'border-collapse', 'color', 'float', 'font-family', 'font-size', 'font-style',
+    'font-weight', 'height', 'list-style-type', 'margin', 'margin-left', 'margin-right', 'padding',
+    'text-align', 'text-decoration', 'vertical-align', 'width',
+}
+UNSAFE_STYLE_VALUE = re.compile(r'url\s*\(|expression\s*\(|javascript:|[<>\\]', re.IGNORECASE)
+SCHEME = re.compile(r'^([a-z][a-z0-9+.\-]*):', re.IGNORECASE)
+# Управляющие и пробельные символы, которыми скрывают схему javascript:
+URL_NOISE = re.compile(r'[\x00-\x20\x7f]+')
+
+
+def clean_url(value):
+    """Ссылка без опасной схемы или None"""
+    match = SCHEME.match(URL_NOISE.sub('', value))
+    if match and match.group(1).lower() not in ALLOWED_SCHEMES:
+        return None
+    return value.strip()
+
+
+def clean_style(value):
+    """Только разрешенные CSS свойства с безопасными значениями"""
+    declarations = []
+    for declaration in value.split(';'):
+        name, _, style_value = declaration.partition(':')
+        name, style_value = name.strip().lower(), style_value.strip()
+        if name in ALLOWED_STYLES and style_value and not UNSAFE_STYLE_VALUE.search(style_value):
+            declarations.append(f'{name}: {style_value}')
+    return '; '.join(declarations) or None
+
+
+class _Sanitizer(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.output = []
+        self.text = []
+        self.open_tags = []
+        self.dropping = 0
+
+    def clean_attributes(self, tag, attrs):
+        allowed = ALLOWED_ATTRIBUTES['*'] | ALLOWED_ATTRIBUTES.get(tag, set())
+        result = []
+        for name, value in attrs:
+            name = name.lower()
+            if name not in allowed or value is None:
+                continue
+            if name in URL_ATTRIBUTES:
+                value = clean_url(value)
+            elif name == 'style':
+                value = clean_style(value)
+            if value is not None:
+                result.append(f' {name}="{escape(value)}"')
+        # Ссылки в новом окне не получают доступ к window.opener
+        if tag == 'a' and any(name == 'target' for name, _ in attrs):
+            result = [item for item in result if not item.startswith(' rel=')]
+            result.append(' rel="noopener noreferrer"')
+        return ''.join(result)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if tag not in ALLOWED_TAGS:
+            return
+        self.output.append(f'<{tag}{self.clean_attributes(tag, attrs)}>')
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            return
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self.dropping = max(self.dropping - 1, 0)
+            return
+        if self.dropping:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if tag not in self.open_tags:
+            return
+        # Незакрытые вложенные теги закрываются вместе с внешним
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.output.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self.dropping:
+            return
+        self.output.append(escape(data, quote=False))
+        self.text.append(data)
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self.output.append(f'</{self.open_tags.pop()}>')
+
+
+def _parse(value):
+    parser = _Sanitizer()
+    parser.feed(value or '')
+    parser.close()
+    return parser
+
+
+def sanitize_html(value):
+    """HTML только из разрешенных тегов и атрибутов, все теги закрыты"""
+    return ''.join(_parse(value).output)
+
+
+def html_to_text(value):
+    """Простой текст из HTML: теги удалены, сущности раскрыты, пробелы схлопнуты"""
+    return re.sub(r'\s+', ' ', ''.join(_parse(value).text)).strip()
@@ -0,0 +1,113 @@
+"""Ограничение частоты запросов алгоритмом token bucket.
+
+У каждого клиента (пользователь или IP для анонимных) в каждой области (scope) есть корзина
+на N токенов, которая пополняется со скоростью N токенов за период. Запрос забирает один токен,
+при пустой корзине отклоняется ответом 429 с Retry-After. Состояние корзины (токены, время) хранится
+в кэше THROTTLE_CACHE одним ключом: проверка - одно чтение и одна запись.
+
+Чтение и запись не атомарны, поэтому параллельные запросы одного клиента могут получить на несколько
+токенов больше - для защиты от перегрузки этого достаточно. Для общего учета между процессами
+THROTTLE_CACHE указывает на кэш без локального уровня (L2 двухуровневого кэша).
+
+THROTTLE_RATES = {'rating': '30/min', 'comment': '10/min'}"""
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+from .utils import get_client_ip
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+_rejections = Counter()
+_checks = Counter()
+_stats_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    """'30/min' -> (30 токенов, 60 секунд)"""
+    count, _, period = rate.partition('/')
+    return int(count), PERIODS[period.strip().lower()]
+
+
+def get_rate(scope):
+    rate = getattr(settings, 'THROTTLE_RATES', {}).get(scope)
+    return parse_rate(rate) if rate else None
+
+
+def get_cache():
+    return caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+
+
+def consume(scope, ident, now=None):
+    """Забирает токен из корзины клиента. Возвращает 0, если запрос разрешен,
+    иначе время в секундах до появления токена"""
+    rate = get_rate(scope)
+    if rate is None:
+        return 0
+    capacity, period = rate
+    now = time.time() if now is None else now
+    key = f'throttle-{scope}-{ident}'
+    cache = get_cache()
+    tokens, updated = cache.get(key) or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * capacity / period)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    # Ключ живет, пока корзина не наполнится полностью
+    cache.set(key, (tokens, now), int((capacity - tokens) * period / capacity) + 1)
+    with _stats_lock:
+        _checks[scope] += 1
+        if not allowed:
+            _rejections[scope] += 1
+    return 0 if allowed else (1 - tokens) * period / capacity
+
+
+def get_ident(request, user=None):
+    """Ключ клиента: id пользователя, для анонимных - IP (X-Forwarded-For только от TRUSTED_PROXIES)"""
+    user = request.user if user is None else user
+    if user is not None and user.is_authenticated:
+        return f'user-{user.pk}'
+    return f'ip-{get_client_ip(request)}'
+
+
+def get_stats():
+    """Количество проверок и отклоненных запросов по областям для текущего процесса"""
+    with _stats_lock:
+        return {scope: {'checks': _checks[scope], 'rejected': _rejections[scope]} for scope in _checks}
+
+
+def throttled_response(retry_after):
+    retry_after = max(1, int(retry_after + 0.999))
+    response = JsonResponse({'error': f'Слишком много запросов, повторите через {retry_after} с',
+                             'retry_after': retry_after}, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+class ThrottleMixin:
+    """Миксин для представлений: ограничение частоты изменяющих запросов в области throttle_scope.
+    Работает с синхронными и асинхронными обработчиками (пользователь для async загружается через auser())."""
+    throttle_scope = None
+    throttle_methods = ('POST',)
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.throttle_scope is None or request.method not in self.throttle_methods:
+            return super().dispatch(request, *args, **kwargs)
+        if self.view_is_async:
+            return self.async_dispatch(request, *args, **kwargs)
+        retry_after = consume(self.throttle_scope, get_ident(request))
+        if retry_after:
+            return throttled_response(retry_after)
+        return super().dispatch(request, *args, **kwargs)
+
+    async def async_dispatch(self, request, *args, **kwargs):
+        user = await request.auser()
+        retry_after = await sync_to_async(consume)(self.throttle_scope, get_ident(request, user))
+        if retry_after:
+            return throttled_response(retry_after)
+        return await super().dispatch(request, *args, **kwargs)
@@ -1,11 +1,103 @@
+import ipaddress
+import re
+from functools import reduce
+from operator import or_
 from uuid import uuid4
+
+from django.conf import settings
+from django.db.models import Q
 from pytils.translit import slugify
 
 
-def unique_slugify(instance, slug):
-    """Генератор уникальных SLUG для моделей, в случае существования такого SLUG."""
-    model = instance.__class__
-    unique_slug = slugify(slug)
-    while model.objects.filter(slug=unique_slug).exists():
-        unique_slug = f'{unique_slug}-{uuid4().hex[:8]}'
-    return unique_slug
+def _slug_base(value):
+    """Базовый slug из строки, для строк без букв и цифр используется случайный"""
+    return slugify(value or '') or uuid4().hex[:8]
+
+
+def _is_slug_for(slug, base):
+    """slug совпадает с базой или является ее вариантом с суффиксом (-2, -3... или старым -<uuid>)"""
+    return slug == base or re.fullmatch(rf'{re.escape(base)}-(\d+|[0-9a-f]{{8}})', slug) is not None
+
+
+def _first_free_slug(base, taken):
+    """Первый свободный вариант: base, base-2, base-3..."""
+    if base not in taken:
+        return base
+    number = 2
+    while f'{base}-{number}' in taken:
+        number += 1
+    return f'{base}-{number}'
+
+
+def _taken_slugs(model, bases, slug_field='slug', exclude_pk=None):
+    """Занятые slug, начинающиеся с любой из баз, одним запросом"""
+    queryset = model._default_manager.filter(reduce(or_, (Q(**{f'{slug_field}__startswith': base}) for base in bases)))
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+    return set(queryset.values_list(slug_field, flat=True))
+
+
+def unique_slugify(instance, slug, slug_field='slug'):
+    """Генератор уникальных SLUG для моделей, в случае существования такого SLUG.
+    Если у сохраненного объекта slug уже построен из той же строки, он возвращается без запросов к БД,
+    иначе коллизии разрешаются одним запросом по префиксу."""
+    base = _slug_base(slug)
+    current = getattr(instance, slug_field)
+    if instance.pk and current and _is_slug_for(current, base):
+        return current
+    return _first_free_slug(base, _taken_slugs(instance.__class__, [base], slug_field, exclude_pk=instance.pk))
+
+
+def allocate_unique_slugs(objects, source, slug_field='slug', chunk_size=200):
+    """Назначение уникальных SLUG пачке новых объектов одной модели перед bulk_create.
+    source - имя атрибута или функция, из которой строится slug (уже заполненный slug объекта сохраняется как база).
+    Занятые slug выбираются одним запросом на chunk_size различных баз, коллизии внутри пачки тоже учитываются."""
+    objects = list(objects)
+    if not objects:
+        return objects
+    model = objects[0].__class__
+    get_source = source if callable(source) else (lambda obj: getattr(obj, source))
+    bases = [getattr(obj, slug_field) or _slug_base(get_source(obj)) for obj in objects]
+    unique_bases = list(dict.fromkeys(bases))
+    taken = set()
+    for start in range(0, len(unique_bases), chunk_size):
+        taken |= _taken_slugs(model, unique_bases[start:start + chunk_size], slug_field)
+    for obj, base in zip(objects, bases):
+        slug = _first_free_slug(base, taken)
+        taken.add(slug)
+        setattr(obj, slug_field, slug)
+    return objects
+
+
+def _parse_ip(value):
+    try:
+        return ipaddress.ip_address(value.strip())
+    except ValueError:
+        return None
+
+
+def is_trusted_proxy(address):
+    """Адрес входит в сети доверенных прокси из настройки TRUSTED_PROXIES"""
+    address = _parse_ip(address or '')
+    return address is not None and any(
+        address in ipaddress.ip_network(network, strict=False)
+        for network in getattr(settings, 'TRUSTED_PROXIES', ()))
+
+
+def get_client_ip(request):
+    """IP клиента. Заголовок X-Forwarded-For может подставить сам клиент, поэтому он учитывается,
+    только если запрос пришел от доверенного прокси: адресом клиента считается самый правый адрес
+    цепочки, не принадлежащий доверенным прокси. Иначе используется REMOTE_ADDR"""
+    remote_addr = request.META.get('REMOTE_ADDR')
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if not x_forwarded_for or not is_trusted_proxy(remote_addr):
+        return remote_addr
+    for hop in reversed(x_forwarded_for.split(',')):
+        address = _parse_ip(hop)
+        if address is None:
+            # Некорректная цепочка: левее этого места адресам доверять нельзя
+            return remote_addr
+        if not is_trusted_proxy(str(address)):
+            return str(address)
+    # Все адреса цепочки - доверенные прокси
+    return str(_parse_ip(x_forwarded_for.split(',')[0]))
@@ -0,0 +1,19 @@
+import os
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
+
+from . import instrumentation, throttle
+
+
+@staff_member_required
+@require_http_methods(['GET', 'POST'])
+def performance_stats(request):
+    """Перцентили p50/p95/p99 времени ответа, SQL и шаблонов по маршрутам текущего процесса
+    и количество запросов, отклоненных ограничением частоты. POST сбрасывает статистику маршрутов."""
+    if request.method == 'POST':
+        instrumentation.reset_stats()
+    return JsonResponse({'pid': os.getpid(), 'routes': instrumentation.get_stats(),
+                         'throttle': throttle.get_stats()},
+                        json_dumps_params={'ensure_ascii': False, 'indent': 2})
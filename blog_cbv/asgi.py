@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blog_cbv.settings')
+# Под ASGI голосование и комментарии обрабатываются асинхронными представлениями
+os.environ.setdefault('ASYNC_WRITE_VIEWS', '1')
 
 application = get_asgi_application()
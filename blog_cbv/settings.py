@@ -35,7 +35,6 @@ INSTALLED_APPS = [
 
     'mptt',                             # Приложение для создания древовидной модели в админке
     'django_mptt_admin',                # Приложение для улучшения визуального вида древовидной модели в админке
-    'debug_toolbar',                    # Приложение Django Debug Toolbar для отладки SQL запросов
     'taggit',                           # Приложение для реализации функции тегов
     'django_recaptcha',                 # Приложение reCAPTCHA для защиты от спам ботов
     'ckeditor_uploader',                # HTML-редактор, который встраивается в веб-страницы
@@ -43,10 +42,13 @@ INSTALLED_APPS = [
 
     'apps.blog.apps.BlogConfig',            # Основное приложение Блог
     'apps.accounts.apps.AccountsConfig',    # Приложение для регистрации
+    'apps.search.apps.SearchConfig',        # Полнотекстовый поиск по записям (SQLite FTS5)
                                             # Приложение Блог API
 ]
 
 MIDDLEWARE = [
+    'apps.services.instrumentation.InstrumentationMiddleware',  # Замер SQL, шаблонов и кэша (Server-Timing)
+    'apps.services.database.ReplicaRoutingMiddleware',          # Чтение из реплики для безопасных запросов
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,18 +56,71 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',  # Приложение Django Debug Toolbar для отладки SQL запросов
     'apps.accounts.middleware.ActiveUserMiddleware',    # Middleware для отображения статуса пользователей
 ]
 
-# Файловая система кэширования (для отображения статуса пользователей)
+if DEBUG:
+    # Django Debug Toolbar для отладки SQL запросов только при локальной разработке
+    INSTALLED_APPS.insert(INSTALLED_APPS.index('taggit'), 'debug_toolbar')
+    MIDDLEWARE.insert(MIDDLEWARE.index('apps.accounts.middleware.ActiveUserMiddleware'),
+                      'debug_toolbar.middleware.DebugToolbarMiddleware')
+
+# Заголовок Server-Timing с временем SQL, шаблонов и попаданиями в кэш:
+# True - всем, False - никому, 'staff' - при DEBUG или сотрудникам
+SERVER_TIMING_HEADER = 'staff'
+
+# Двухуровневый кэш: LRU в памяти процесса (L1) перед общим файловым кэшем (L2).
+# L1_TIMEOUT - максимальное время, на которое другие процессы могут увидеть устаревшее значение.
 CACHES = {
     'default': {
+        'BACKEND': 'apps.services.cache_backends.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,
+        },
+    },
+    # Файловая система кэширования (общая для всех процессов)
+    'shared': {
         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
         'LOCATION': (BASE_DIR / 'cache'),
-    }
+    },
 }
 
+# Ограничение частоты голосования и комментариев (token bucket, см. apps.services.throttle):
+# запросов за период на пользователя, для анонимных - на IP. Корзины хранятся в общем кэше
+# без локального уровня, чтобы лимит учитывался всеми процессами.
+THROTTLE_RATES = {
+    'rating': '30/min',
+    'comment': '10/min',
+}
+THROTTLE_CACHE = 'shared'
+# Адреса и сети обратных прокси (например, nginx), которым доверяется заголовок X-Forwarded-For.
+# Без прокси список пуст: адрес клиента берется из REMOTE_ADDR (см. apps.services.utils.get_client_ip)
+TRUSTED_PROXIES = []
+
+# Кэш страниц для анонимных пользователей: время жизни и максимальное время отображения
+# устаревших счетчиков рейтинга после голосования (в секундах)
+PAGE_CACHE_TIMEOUT = 60 * 15
+PAGE_CACHE_RATING_STALENESS = 30
+
+# Популярные записи: период полураспада веса голоса и окно учета голосов (в часах)
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_WINDOW_HOURS = 24 * 7
+# Асинхронные представления голосования и комментариев (см. apps.blog.urls). Под WSGI каждый
+# асинхронный запрос выполняется через async_to_sync и медленнее синхронного, поэтому они
+# включаются только при запуске под ASGI (переменную окружения задает blog_cbv.asgi)
+ASYNC_WRITE_VIEWS = bool(int(os.environ.get('ASYNC_WRITE_VIEWS', 0)))
+# События записи для SSE: бэкенд публикации, ограничения подключений и буфера подписчика,
+# интервал пустых сообщений, максимальная длительность соединения и пауза переподключения (в секундах)
+PUBSUB_BACKEND = 'apps.services.pubsub.InMemoryPubSub'
+PUBSUB_OPTIONS = {'max_subscribers': 1000, 'max_channel_subscribers': 200, 'max_queue': 100}
+SSE_HEARTBEAT = 15
+SSE_MAX_DURATION = 600
+SSE_RETRY = 5
+# Количество похожих записей на странице записи
+RELATED_POSTS_LIMIT = 5
+
 ROOT_URLCONF = 'blog_cbv.urls'
 
 TEMPLATES = [
@@ -86,12 +141,28 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'blog_cbv.wsgi.application'
 
+# PRAGMA при подключении к SQLite задаются в apps.services.database.SQLITE_PRAGMAS
+# (переопределяются ключом PRAGMAS базы). Соединения переиспользуются между запросами.
+# Реплика по умолчанию - тот же файл (в режиме WAL читатели не блокируются писателем),
+# DATABASE_REPLICA_NAME указывает на копию, которую обновляет внешняя репликация.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DATABASE_REPLICA_NAME') or (BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    },
 }
+DATABASE_ROUTERS = ['apps.services.database.PrimaryReplicaRouter']
+# Время чтения из основной БД после изменяющего запроса клиента (в секундах)
+DATABASE_PRIMARY_STICKY_SECONDS = 10
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -123,6 +194,11 @@ STATICFILES_DIRS = [BASE_DIR / 'templates/js/']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = (BASE_DIR / 'media')
 
+# Ширины уменьшенных копий изображений (см. apps.services.images) и размер пула потоков для их создания
+IMAGE_VARIANT_WIDTHS = {'thumbnail': (320, 640, 960), 'avatar': (64, 128, 256)}
+IMAGE_VARIANT_WORKERS = 2
+IMAGE_WEBP_QUALITY = 80
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Google reCAPTCHA
@@ -2,7 +2,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
-from apps.blog.feeds import LatestPostFeed
+from apps.blog.feeds import LatestPostFeed, CategoryPostFeed, TagPostFeed
+from apps.services.views import performance_stats
 
 
 handler403 = 'apps.blog.views.tr_handler403'    # Кастомная обработка ошибки 403
@@ -10,11 +11,15 @@ handler404 = 'apps.blog.views.tr_handler404'    # Кастомная обраб
 handler500 = 'apps.blog.views.tr_handler500'    # Кастомная обработка ошибки 500
 
 urlpatterns = [
+    path('admin/performance/', performance_stats, name='performance_stats'),    # Статистика замеров (для сотрудников)
     path('admin/', admin.site.urls),
     path('', include('apps.blog.urls')),
     path('', include('apps.accounts.urls')),
+    path('', include('apps.search.urls')),
     path('ckeditor/', include('ckeditor_uploader.urls')),               # HTML-редактор
     path('feeds/latest/', LatestPostFeed(), name='latest_post_feed'),   # RSS лента
+    path('feeds/category/<str:slug>/', CategoryPostFeed(), name='category_post_feed'),  # RSS лента категории
+    path('feeds/tag/<str:tag>/', TagPostFeed(), name='tag_post_feed'),                  # RSS лента тега
 ]
 
 if settings.DEBUG:
@@ -1,12 +1,18 @@
 const commentForm = document.forms.commentForm;
-const commentFormContent = commentForm.content;
-const commentFormParentInput = commentForm.parent;
-const commentFormSubmit = commentForm.commentSubmit;
-const commentPostId = commentForm.getAttribute('data-post-id');
+const commentsContainer = document.querySelector('.nested-comments');
+const commentPostId = commentsContainer.getAttribute('data-post-id');
 
-commentForm.addEventListener('submit', createComment);
+// Форма комментария выводится только авторизованным пользователям
+if (commentForm) {
+  var commentFormContent = commentForm.content;
+  var commentFormParentInput = commentForm.parent;
+  var commentFormSubmit = commentForm.commentSubmit;
+  commentForm.addEventListener('submit', createComment);
+}
 
 replyUser()
+loadMoreComments()
+subscribeToPostEvents()
 
 function replyUser() {
   document.querySelectorAll('.btn-reply').forEach(e => {
@@ -14,7 +20,107 @@ function replyUser() {
   });
 }
 
+function loadMoreComments() {
+  // Подгрузка ответов на комментарий и следующих страниц комментариев по запросу
+  document.addEventListener('click', async event => {
+    const repliesButton = event.target.closest('.btn-more-replies');
+    const moreButton = event.target.closest('.btn-more-comments');
+    if (repliesButton) {
+      const data = await fetchComments(`node=${repliesButton.getAttribute('data-comment-id')}`);
+      repliesButton.insertAdjacentHTML('beforebegin', data.html);
+      repliesButton.remove();
+    }
+    else if (moreButton) {
+      const data = await fetchComments(`after=${moreButton.getAttribute('data-after')}`);
+      commentsContainer.insertAdjacentHTML('beforeend', data.html);
+      if (data.next) {
+        moreButton.setAttribute('data-after', data.next);
+      }
+      else {
+        moreButton.remove();
+      }
+    }
+    else {
+      return;
+    }
+    replyUser();
+  });
+}
+
+async function fetchComments(query) {
+  const response = await fetch(`/post/${commentPostId}/comments/?${query}`, {
+    headers: {'X-Requested-With': 'XMLHttpRequest'},
+  });
+  return response.json();
+}
+
+function escapeHtml(value) {
+  const element = document.createElement('div');
+  element.textContent = value;
+  return element.innerHTML;
+}
+
+function renderComment(comment) {
+  const author = escapeHtml(comment.author);
+  return `<ul id="comment-thread-${comment.id}">
+            <li class="card border-0">
+                <div class="row">
+                    <div class="col-md-2">
+                        <img src="${comment.avatar}" style="width: 120px;height: 120px;object-fit: cover;" alt="${author}"/>
+                    </div>
+                    <div class="col-md-10">
+                        <div class="card-body">
+                            <h6 class="card-title">
+                                <a href="${comment.get_absolute_url}">${author}</a>
+                            </h6>
+                            <p class="card-text">
+                                ${escapeHtml(comment.content)}
+                            </p>
+                            <a class="btn btn-sm btn-dark btn-reply" href="#commentForm" data-comment-id="${comment.id}" data-comment-username="${author}">Ответить</a>
+                            <hr/>
+                            <time>${comment.time_create}</time>
+                        </div>
+                    </div>
+                </div>
+            </li>
+        </ul>`;
+}
+
+function insertComment(comment) {
+  // Свой комментарий приходит и в ответе на отправку, и в потоке событий
+  if (document.querySelector(`#comment-thread-${comment.id}`)) {
+    return;
+  }
+  const parentThread = comment.is_child && document.querySelector(`#comment-thread-${comment.parent_id}`);
+  if (comment.is_child && !parentThread) {
+    // Ветка родителя еще не подгружена, ответ появится при ее загрузке
+    return;
+  }
+  (parentThread || commentsContainer).insertAdjacentHTML('beforeend', renderComment(comment));
+  replyUser();
+}
+
+function subscribeToPostEvents() {
+  // Новые комментарии и рейтинг записи без перезагрузки страницы (Server-Sent Events)
+  if (!window.EventSource) {
+    return;
+  }
+  const events = new EventSource(`/post/${commentPostId}/events/`);
+  events.addEventListener('comment', event => insertComment(JSON.parse(event.data)));
+  events.addEventListener('rating', event => {
+    const data = JSON.parse(event.data);
+    document.querySelectorAll(`.rating-buttons`).forEach(buttons => {
+      if (buttons.querySelector(`[data-post="${data.post_id}"]`)) {
+        buttons.querySelector('.rating-sum').textContent = data.rating_sum;
+      }
+    });
+  });
+}
+
 function replyComment() {
+  if (!commentForm) {
+    return;
+  }
   const commentUsername = this.getAttribute('data-comment-username');
   const commentMessageId = this.getAttribute('data-comment-id');
   commentFormContent.value = `${commentUsername}, `;
@@ -34,35 +140,14 @@ async function createComment(event) {
             body: new FormData(commentForm),
         });
         const comment = await response.json();
-
-        let commentTemplate = `<ul id="comment-thread-${comment.id}">
-                                <li class="card border-0">
-                                    <div class="row">
-                                        <div class="col-md-2">
-                                            <img src="${comment.avatar}" style="width: 120px;height: 120px;object-fit: cover;" alt="${comment.author}"/>
-                                        </div>
-                                        <div class="col-md-10">
-                                            <div class="card-body">
-                                                <h6 class="card-title">
-                                                    <a href="${comment.get_absolute_url}">${comment.author}</a>
-                                                </h6>
-                                                <p class="card-text">
-                                                    ${comment.content}
-                                                </p>
-                                                <a class="btn btn-sm btn-dark btn-reply" href="#commentForm" data-comment-id="${comment.id}" data-comment-username="${comment.author}">Ответить</a>
-                                                <hr/>
-                                                <time>${comment.time_create}</time>
-                                            </div>
-                                        </div>
-                                    </div>
-                                </li>
-                            </ul>`;
-        if (comment.is_child) {
-            document.querySelector(`#comment-thread-${comment.parent_id}`).insertAdjacentHTML("beforeend", commentTemplate);
-        }
-        else {
-            document.querySelector('.nested-comments').insertAdjacentHTML("beforeend", commentTemplate)
+        // Слишком много комментариев подряд: показываем сообщение сервера и разрешаем повторить позже
+        if (response.status === 429) {
+            alert(comment.error);
+            commentFormSubmit.disabled = false;
+            commentFormSubmit.innerText = "Добавить комментарий";
+            return;
         }
+        insertComment(comment);
         commentForm.reset()
         commentFormSubmit.disabled = false;
         commentFormSubmit.innerText = "Добавить комментарий";
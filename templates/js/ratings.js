@@ -19,8 +19,13 @@ ratingButtons.forEach(button => {
                 "X-Requested-With": "XMLHttpRequest",
             },
             body: formData
-        }).then(response => response.json())
-        .then(data => {
+        }).then(response => response.json().then(data => ({status: response.status, data})))
+        .then(({status, data}) => {
+            // Слишком много голосов подряд: сервер сообщает, через сколько секунд повторить
+            if (status === 429) {
+                alert(data.error);
+                return;
+            }
             // Обновляем значение на кнопке
             ratingSum.textContent = data.rating_sum;
         })